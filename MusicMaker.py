@@ -7,22 +7,27 @@ via sheet music, and playing melodies within a homophonic texture.
 Python Imaging Library, Pydub, treble clef.png, as well as folders containing Piano Samples,
 Major Chords, and Minor Chords, are all required.
 
-Future developments: More key signature options, incidental notes, GUI for
+Future developments: Incidental notes, GUI for
 selecting notes from a piano, notation improvements (e.g. stem directions,dynamic/tempo marks),
 MIDI support, more time signatures, variable tempo, different instrument samples
 """
 import os
+from itertools import cycle
 from random import *
 from PIL import Image
 from PIL import ImageDraw
 from PIL import ImageFont
 from pydub import AudioSegment #Need pydub folder downloaded to working directory
+from theory import KEY_PITCHES, KEY_CHORDS, KEY_CHORD_DEGREES, KEY_SIGNATURES, STAFF_POSITIONS, SHARP_ORDER, FLAT_ORDER
+from theory import RANDOM_KEYS, RHYTHM_BEATS, key_progressions, sample_chord
+from melody import Melody
+from rendering import DRAFT_FRAME_RATE, AccompanimentCache, ChordTrackBuilder, NoteTable, RenderSession, Scheduler, TempoMap
 
 class Mozart(object) :
     """This class includes methods for choosing a key, choosing a chord progression, and generating a melodies, both from chord tones and stepwise."""
 
     def __init__(self,seed_num=None):
-        """Sets initial seed as well as data structures for keys, rhythms, chord progressions, and pitches."""
+        """Sets initial seed. Keys, rhythms, chord progressions, and pitches are looked up in the tables of the theory module."""
 
         #Mozart can be initialized from given seed in order to generate a particular melody.
         #If no seed is specified, a random seed is selected and displayed, such that the same melody can be produced later.
@@ -31,43 +36,31 @@ class Mozart(object) :
         print(seed_num)
         seed(seed_num)
 
-        #Potential keys in which a melody can be written. More options to be added in future developments.
-        self._key_list = ["C","G"]
-
-        #List of common chord progressions
-        self._common_chord_progs = [["I","IV","V"],["I","V","vi","IV"],["I","IV","vi","V"],["I","V","vi","iii","IV","I","IV","V"],["vi","V","IV","V"],["I","vi","IV","V"],["I","V","IV","V"]]
-
-        #Chord dictionary - associate each chord with scale degrees
-        self._chord_dict = {"I" : [1,3,5,8],"iii" : [3,0,5,7],"V" : [5,0,2,7], "IV" : [4,1,6,8], "vi" : [6,1,3,8]}
-
-        #Key dictionary - for each key, associate scale degree with pitch
-        self._key_dict = {"C" : {0:"B3",1:"C4",2:"D4",3:"E4",4:"F4",5:"G4",6:"A4",7:"B4",8:"C5",9:"D5",10:"E5",11:"F5",12:"G5"},"G" : {-4:"B3",-3:"C4",-2:"D4",-1:"E4",0:"F#4",1:"G4",2:"A4",3:"B4",4:"C5",5:"D5",6:"E5",7:"F#5",8:"G5"}}
-
-        #For each key, associate roman numeral with actual chord
-        self._key_chord_dict = {"C" : {"I" : "C","I7":"C","ii":"Dm","V/V":"D","iii":"Em","V7/vi":"E","IV":"F","iv" : "Fm","V":"G","V7" : "G","vi":"Am","viio":"Bdim"},"G" :{"I" : "G","ii":"Am","iii":"Bm","IV":"C","V":"D","V7" : "D","vi":"Em","viio":"F#dim"}}
-        
-        #Potential rhythms and their associated rhythmic values. Currently, melody is assumed to be 4/4.
-        #Further options for time signatures to be added in future developments.
-        self._rhythm_list = ["eighth","quarter","half","whole"]
-        self._rhythm_dict = {"eighth" : .5,"quarter" : 1,"half" : 2,"whole" : 4}
-
     def choose_key(self,key=None) :
         """Choose a key in which melody will be written. If no key is given, one will be selected randomly.""" 
         if key==None :
-            self._key = choice(self._key_list)
+            self._key = choice(RANDOM_KEYS)
         else :
             self._key = key
         #Select the appropriate dictionary relating scale degrees to pitches within the key.
-        self._pitches = self._key_dict[self._key]
+        self._pitches = KEY_PITCHES[self._key]
 
     def get_key(self) :
         """Returns the key."""
         return self._key
 
+    @staticmethod
+    def all_pitches() :
+        """Returns every pitch that can appear in a melody, across all keys."""
+        pitches = set()
+        for key in KEY_PITCHES :
+            pitches.update(KEY_PITCHES[key].values())
+        return sorted(pitches)
+
     def choose_progression(self,progression = None) :
-        """Choose a chord progression with which melody will be written. If no progression is given, one will be selected randomly."""
+        """Choose a chord progression with which melody will be written. If no progression is given, one will be selected randomly from those for the key chosen (major if none has been)."""
         if progression == None:
-            self._prog = choice(self._common_chord_progs)
+            self._prog = choice(key_progressions(getattr(self,"_key","C")))
         else :
             self._prog = progression
         
@@ -79,7 +72,7 @@ class Mozart(object) :
         """returns the chord list for the given progression"""
         self._chord_list = []
         for chord in self._prog :
-            self._chord_list.append(self._key_chord_dict[self._key][chord])
+            self._chord_list.append(KEY_CHORDS[self._key][chord])
             
         #If a cadence is desired, at the tonic chord to the end of the chord list
         if cadence == True :
@@ -91,13 +84,13 @@ class Mozart(object) :
         self._melody = [] #List that will contain pitch and rhythm pairs
         self._count_list = [] #List holding the counts for the entire melody - appended within generate_rhythm_list method. Useful for knowing when a measure starts.
         for roman_numeral_chord in prog:
-            scale_degree_list = self._chord_dict[roman_numeral_chord] #Potential scale degrees for the chord
+            scale_degree_list = KEY_CHORD_DEGREES[key][roman_numeral_chord] #Potential scale degrees for the chord
             self._rhythm_list=[] #Rhythms for the measure - appended within generate_rhythm_list method
             self.generate_rhythm_list(ct=4)
             for rhythm in self._rhythm_list : #Pick a pitch for each rhythm and add to melody list
                 pitch_rhythm_pair = []
                 scale_degree = choice(scale_degree_list)
-                pitch = self._key_dict[key][scale_degree]
+                pitch = KEY_PITCHES[key][scale_degree]
                 pitch_rhythm_pair.append(pitch)
                 pitch_rhythm_pair.append(rhythm)
                 self._melody.append(pitch_rhythm_pair)
@@ -113,17 +106,19 @@ class Mozart(object) :
         self._rhythm_list = []
         self._count_list = []
         pitch_list = [] #List of scale degrees
-        pitch_list.append(choice(self._chord_dict[prog[0]])) #Adds tonic scale degree
+        pitch_list.append(choice(KEY_CHORD_DEGREES[key][prog[0]])) #Adds tonic scale degree
         for roman_numeral_chord in prog :
             self.generate_rhythm_list(ct=4)
 
-        #Select subsequent pitch based on current pitch
+        #Select subsequent pitch based on current pitch, turning back at the lowest and highest scale degrees of the key
+        lowest = min(KEY_PITCHES[key])
+        highest = max(KEY_PITCHES[key])
         for x in range(len(self._rhythm_list)-1) :
             prev_pitch = pitch_list[x]
             prob = randint(1,100)
-            if (self.get_key() == "C" and prev_pitch == 0) or (self.get_key() == "G" and prev_pitch == -4) :
+            if prev_pitch == lowest :
                 next_pitch = prev_pitch + 1
-            elif (self.get_key() == "C" and prev_pitch == 12) or (self.get_key() == "G" and prev_pitch == 8) :
+            elif prev_pitch == highest :
                 next_pitch = prev_pitch - 1
             elif prob <= 50 :
                 next_pitch = prev_pitch + 1
@@ -136,26 +131,121 @@ class Mozart(object) :
         for x in range(len(pitch_list)) :
             if self._count_list[x] == 1 :
                 measure_num += 1
-                if pitch_list[x] not in self._chord_dict[prog[measure_num]]:
+                if pitch_list[x] not in KEY_CHORD_DEGREES[key][prog[measure_num]]:
                     return self.stepwise_melody(key,prog,cadence) #Otherwise, start over
-            pitch_rhythm_pair = [self._key_dict[self.get_key()][pitch_list[x]],self._rhythm_list[x]]
+            pitch_rhythm_pair = [KEY_PITCHES[key][pitch_list[x]],self._rhythm_list[x]]
             self._melody.append(pitch_rhythm_pair)
             
         if cadence == True:
             self._melody.append([self.tonic_pitch(),"whole"])
             self._count_list.append(1)
 
+    def measures(self,key,prog,melody_type="broken_chord",repeat=True,cadence=True) :
+        """Generates a melody one measure at a time, yielding (pitch and rhythm pairs, count list, roman numeral) for each measure.
+        If repeat is True a progression list is cycled forever, otherwise the melody ends after one pass, with the cadence if desired. Prog may also be any iterable of roman numerals, e.g. a generator that keeps extending the progression.
+        Only the current measure is held, so melodies can go on indefinitely. Without repeat, a broken chord melody matches broken_chord_melody from the same seed."""
+        if melody_type not in ("broken_chord","stepwise") :
+            raise ValueError("melody_type should be \"broken_chord\" or \"stepwise\"")
+        if repeat and isinstance(prog,(list,tuple)) :
+            chords = cycle(prog)
+        else :
+            chords = iter(prog)
+        numeral = next(chords,None)
+        tonic = numeral
+        lowest = min(KEY_PITCHES[key])
+        highest = max(KEY_PITCHES[key])
+        degree = None #Last scale degree of a stepwise melody
+        while numeral != None :
+            next_numeral = next(chords,None) #Looked up ahead so a stepwise measure can lead into the next chord
+            if melody_type == "broken_chord" :
+                self._rhythm_list = []
+                self._count_list = []
+                self.generate_rhythm_list(ct=4)
+                degrees = [choice(KEY_CHORD_DEGREES[key][numeral]) for rhythm in self._rhythm_list]
+            else :
+                degrees = self.stepwise_measure(key,numeral,next_numeral,degree,lowest,highest)
+                degree = degrees[-1]
+            yield ([[KEY_PITCHES[key][degrees[x]],self._rhythm_list[x]] for x in range(len(degrees))],self._count_list,numeral)
+            numeral = next_numeral
+        if cadence == True and tonic != None :
+            yield ([[KEY_PITCHES[key][KEY_CHORD_DEGREES[key][tonic][0]],"whole"]],[1],tonic)
+
+    def stepwise_measure(self,key,numeral,next_numeral,previous,lowest,highest) :
+        """Sets the rhythm and count lists for one measure of a stepwise melody and returns its scale degrees, stepping on from the previous degree, or starting on a chord tone if there is none.
+        Unlike stepwise_melody, only this measure (rhythms included, since they decide which degrees a walk can reach) is redrawn when it does not start on a tone of its chord. It must also end a step away from a tone of the next chord, so the next measure can always start on one."""
+        chord = KEY_CHORD_DEGREES[key][numeral]
+        while True :
+            self._rhythm_list = []
+            self._count_list = []
+            self.generate_rhythm_list(ct=4)
+            if previous == None :
+                degrees = [choice(chord)]
+            else :
+                degrees = [self.step(previous,lowest,highest)]
+            for x in range(len(self._rhythm_list)-1) :
+                degrees.append(self.step(degrees[-1],lowest,highest))
+            if degrees[0] not in chord :
+                continue
+            if next_numeral == None :
+                return degrees
+            last = degrees[-1]
+            neighbours = [degree for degree in (last-1,last+1) if lowest <= degree <= highest]
+            if any(degree in KEY_CHORD_DEGREES[key][next_numeral] for degree in neighbours) :
+                return degrees
+
+    def step(self,degree,lowest,highest) :
+        """Returns the scale degree a step above or below, turning back at the lowest and highest scale degrees of the key."""
+        prob = randint(1,100)
+        if degree == lowest :
+            return degree + 1
+        elif degree == highest :
+            return degree - 1
+        elif prob <= 50 :
+            return degree + 1
+        return degree - 1
+
+    def markov_melody(self,key,prog,model,cadence=True) :
+        """Generates a melody from a trained MelodyModel, choosing each scale degree and rhythm from those that followed the previous notes over the same chord in the model's corpus."""
+        degrees,eighths,measures = model.notes(key,prog,randrange)
+        self.set_notes(key,degrees,eighths,measures,cadence)
+
+    def constrained_melody(self,key,prog,constraints,cadence=True) :
+        """Generates a melody chosen uniformly from every melody meeting a MelodyConstraints, e.g. staying within a range or ending on the tonic."""
+        degrees,eighths,measures = constraints.notes(key,prog,randrange)
+        self.set_notes(key,degrees,eighths,measures,cadence)
+
+    def set_notes(self,key,degrees,eighths,measures,cadence=True) :
+        """Sets the melody and count list from scale degrees, lengths in eighth notes and measure numbers."""
+        self._melody = []
+        self._count_list = []
+        rhythm_names = {1 : "eighth",2 : "quarter",4 : "half",8 : "whole"}
+        position = 0 #Position within the measure, in eighth notes
+        for x in range(len(degrees)) :
+            if x > 0 and measures[x] != measures[x-1] :
+                position = 0
+            self._count_list.append(1+position/2.0)
+            self._melody.append([KEY_PITCHES[key][degrees[x]],rhythm_names[eighths[x]]])
+            position += eighths[x]
+
+        if cadence == True:
+            self._melody.append([self.tonic_pitch(),"whole"])
+            self._count_list.append(1)
+
     def get_melody(self) :
         """Returns the melody list, containing pairs of pitches and rhythms."""
         return self._melody
 
+    def to_melody(self) :
+        """Returns the melody as a Melody."""
+        return Melody.from_pairs(self._melody)
+
     def tonic_pitch(self) :
         """"Returns the pitch of the tonic (first chord in the chord progression)"""
-        return self._key_dict[self._key][self._chord_dict[self._prog[0]][0]]
+        return KEY_PITCHES[self._key][KEY_CHORD_DEGREES[self._key][self._prog[0]][0]]
 
     def tonic_chord(self) :
         """Returns chord of the tonic."""
-        return self._key_chord_dict[self._key][self._prog[0]]
+        return KEY_CHORDS[self._key][self._prog[0]]
 
     def generate_rhythm_list(self,ct=4) :
         """Generate a list of rhythms to fill a measure."""
@@ -166,7 +256,7 @@ class Mozart(object) :
             temp_count_list.append(self._count) #Add the current count
             rhythm = self.random_rhythm() #Choose a random rhythm
             temp_rhythm_list.append(rhythm)
-            rhythmic_value = self._rhythm_dict[rhythm]
+            rhythmic_value = RHYTHM_BEATS[rhythm]
             self._count += rhythmic_value #Augment the count
             if self._count > ct+1 : #If the count is bigger than that allowable for the measure, start over
                 return self.generate_rhythm_list(ct)
@@ -196,24 +286,26 @@ class Mozart(object) :
 class Treble(object) :
     """This class draws a staff with clef and key signature, and includes methods for music notation."""
 
-    def __init__(self,key) :
+    def __init__(self,key,width=1800) :
         """Creates a staff with clef and key signature. Must input key in order to draw key signature."""
         
         #Size of drawing window
-        self._width = 1800
+        self._width = width
         self._height = 200
 
         #Colors used in notation
         self._white = (255, 255, 255)
         self._black = (0, 0, 0)
 
+        self._key = key
+        self.draw_staff()
+
+    def draw_staff(self) :
+        """Starts a new image with an empty staff, clef and key signature."""
         #Initializes the image class
         self._image = Image.new("RGB", (self._width, self._height), self._white)
         self._n = ImageDraw.Draw(self._image)
 
-        #Positions relative to top of staff
-        self._y_position_dict = {"G5":-5,"F#5":0,"F5":0,"E5" : 5,"D5" : 10, "C5" : 15, "B4" : 20, "A4" : 25, "G4" : 30, "F#4" : 35, "F4" : 35,"E4":40,"D4":45,"C4":50,"B3":55}
-
         #Clef
         size = 30,60
         treble_clef = Image.open("treble clef.png") #Image file should be in working directory
@@ -233,9 +325,16 @@ class Treble(object) :
             font = ImageFont.truetype('/Library/Fonts/Arial.ttf', 18)
         elif os.name == 'nt' :
             font = ImageFont.truetype('arial.ttf', 18)
-        if key == "G" :
-            self._n.text((30,self._o-9),"#",fill=self._black,font=font)
-            self._music_start = 55 #initial position
+        accidentals = KEY_SIGNATURES[self._key]
+        if accidentals > 0 :
+            signature = [("#",pitch) for pitch in SHARP_ORDER[:accidentals]]
+        else :
+            signature = [("b",pitch) for pitch in FLAT_ORDER[:-accidentals]]
+        for x in range(len(signature)) :
+            [symbol,pitch] = signature[x]
+            self._n.text((30+8*x,self._o+STAFF_POSITIONS[pitch]-9),symbol,fill=self._black,font=font)
+        if signature :
+            self._music_start = 47+8*len(signature) #initial position
         else :
             self._music_start = 40
         self._cursor = self._music_start #Cursor tracks horizontal position on the page
@@ -246,7 +345,7 @@ class Treble(object) :
     
     def eighth(self,note) :
         """Draws an eighth note for a given pitch."""
-        y_pos = self._y_position_dict[note]
+        y_pos = STAFF_POSITIONS[note]
         self._n.ellipse([(self._cursor,self._o+y_pos-5),(self._cursor+10,self._o+y_pos+5)],self._black,self._black)
         self._n.line([(self._cursor+10,self._o+y_pos),(self._cursor+10,self._o+y_pos-35)],self._black)
         self._n.line([(self._cursor+10,self._o+y_pos-35),(self._cursor+10+8,self._o+y_pos-35+8)],self._black)
@@ -254,28 +353,30 @@ class Treble(object) :
         
     def quarter(self,note) :
         """Draws a quarter note for a given pitch."""
-        y_pos = self._y_position_dict[note]
+        y_pos = STAFF_POSITIONS[note]
         self._n.ellipse([(self._cursor,self._o+y_pos-5),(self._cursor+10,self._o+y_pos+5)],self._black,self._black)
         self._n.line([(self._cursor+10,self._o+y_pos),(self._cursor+10,self._o+y_pos-35)],self._black)    
         self.ledger_line(note,y_pos)
         
     def half(self,note) :
         """Draws a half note for a given pitch."""
-        y_pos = self._y_position_dict[note]
+        y_pos = STAFF_POSITIONS[note]
         self._n.ellipse([(self._cursor,self._o+y_pos-5),(self._cursor+10,self._o+y_pos+5)],outline = self._black)
         self._n.line([(self._cursor+10,self._o+y_pos),(self._cursor+10,self._o+y_pos-35)],self._black)
         self.ledger_line(note,y_pos)
 
     def whole(self,note) :
         """Draws a whole note for a given pitch."""
-        y_pos = self._y_position_dict[note]
+        y_pos = STAFF_POSITIONS[note]
         self._n.ellipse([(self._cursor,self._o+y_pos-5),(self._cursor+15,self._o+y_pos+5)],outline=self._black)
         self.ledger_line(note,y_pos)
         
     def ledger_line(self,note,y_pos) :
-        """If a note is below the staff, adds ledger lines - in future developments, include options for notes above the staff."""
-        if note == "C4" or note == "B3":
+        """If a note is below or above the staff, adds a ledger line."""
+        if y_pos >= 50 : #C4 and below
             self._n.line([(self._cursor-5,self._o+50),(self._cursor+18,self._o+50)],self._black)
+        elif y_pos <= -10 : #A5 and above
+            self._n.line([(self._cursor-5,self._o-10),(self._cursor+18,self._o-10)],self._black)
                    
     def measure_line(self) :
         """Draw a measure line"""
@@ -297,6 +398,78 @@ class Treble(object) :
             self.whole(note)
             self._cursor += 200
 
+    def notate_melody(self,melody) :
+        """Notates every note of a Melody, with a measure line before each measure after the first."""
+        for note in melody :
+            if note.get_onset() % (4*melody.get_ticks_per_beat()) == 0 and self.get_cursor() > self._music_start : #Prevent measure line from being drawn immediately after key signature
+                self.measure_line()
+            self.notate(note.get_name(),note.get_rhythm())
+
+    def measure_width(self,note_rhythm_pairs) :
+        """Returns the width in pixels that notating a measure takes, including the measure line before it."""
+        widths = {"eighth" : 25,"quarter" : 50,"half" : 100,"whole" : 200}
+        width = sum(widths[rhythm] for [pitch,rhythm] in note_rhythm_pairs)
+        if self.get_cursor() > self._music_start :
+            width += 10
+        return width
+
+    def notate_measure(self,note_rhythm_pairs) :
+        """Notates one measure of pitch and rhythm pairs after the previous one. If it does not fit on the staff, the full page is returned and the measure starts a new page, otherwise None is returned."""
+        page = None
+        if self.get_cursor() > self._music_start and self.get_cursor() + self.measure_width(note_rhythm_pairs) > self._width :
+            page = self._image
+            self.draw_staff()
+        if self.get_cursor() > self._music_start :
+            self.measure_line()
+        for [pitch,rhythm] in note_rhythm_pairs :
+            self.notate(pitch,rhythm)
+        return page
+
+    def notate_strip(self,measures) :
+        """Notates measures from the cursor on, without starting new pages, and returns the (start, end) pixels of each measure's notes for pasting with paste_measure."""
+        spans = []
+        for measure in measures :
+            if self.get_cursor() > self._music_start :
+                self.measure_line()
+            start = self.get_cursor()
+            for [pitch,rhythm] in measure[0] :
+                self.notate(pitch,rhythm)
+            spans.append((start,self.get_cursor()))
+        return spans
+
+    def paste_measure(self,image,span) :
+        """Copies a measure notated on another staff in the same key, given its image and span from notate_strip, to the cursor. Pages are started as in notate_measure, and the result is the same as notating the measure here."""
+        (start,end) = span
+        page = None
+        width = end-start
+        if self.get_cursor() > self._music_start :
+            width += 10
+        if self.get_cursor() > self._music_start and self.get_cursor() + width > self._width :
+            page = self._image
+            self.draw_staff()
+        if self.get_cursor() > self._music_start :
+            self.measure_line()
+        self._image.paste(image.crop((start-5,0,end,self._height)),(self._cursor-5,0)) #Ledger lines start 5 pixels before their note
+        self._cursor += end-start
+        return page
+
+    def notate_measures(self,measures) :
+        """Notates measures from Mozart.measures as they arrive, yielding each page image once it is full and the last page when the measures run out. Only the current page is held, so the measures may go on indefinitely."""
+        for measure in measures :
+            page = self.notate_measure(measure[0])
+            if page != None :
+                yield page
+        if self.has_music() :
+            yield self._image
+
+    def get_image(self) :
+        """Returns the image of the current page."""
+        return self._image
+
+    def has_music(self) :
+        """Returns True if anything has been notated on the current page."""
+        return self.get_cursor() > self._music_start
+
     def new_voice(self) :
         """Move cursor to start in order to add another voice."""
         self._cursor = self._music_start
@@ -305,65 +478,250 @@ class Treble(object) :
         """Saves image to given filename within working directory. In order to view sheet music, open this file."""
         self._image.save(filename+".jpg")
 
+
 class Sinatra(object) :
     """This class creates an audio file to play a given melody within a homophonic texture - i.e., basic chordal accompaniment."""
+
+    def __init__(self,note_table=None,accompaniment_cache=None,tempo=60000/350.0,release=150,fade=20,max_voices=4,quality="full") :
+        """Sets the table of piano samples, the cache of accompaniment tracks and the tempo, either in beats per minute or as a TempoMap. Sharing the table and cache between instances means each note and progression is only rendered once.
+        Release, fade and max_voices set how long notes ring past their written duration, how they are faded out and how many may sound at once (see Scheduler).
+        Quality is either "full" or "draft". Draft renders are made in mono, at a lower frame rate, with hard cuts between chords and no fades, for quickly previewing many melodies. Unless convert is False, the finished audio is converted back to the frame rate and channels of a full quality render, and padded or trimmed to exactly as many frames.
+        Resampling back costs most of what the draft saves: in bench_draft_render, accompanied drafts are about 1.4 times as fast as full quality renders when converted, and about 6.5 times as fast as previews left unconverted."""
+        if note_table == None :
+            note_table = NoteTable()
+        self._note_table = note_table
+        if accompaniment_cache == None :
+            accompaniment_cache = AccompanimentCache()
+        self._accompaniment_cache = accompaniment_cache
+        self._chord_builder = ChordTrackBuilder(self.chord)
+        self._draft_chord_builder = ChordTrackBuilder(self.draft_chord)
+        self._draft_note_table = None
+        if quality not in ("full","draft") :
+            raise ValueError("quality should be \"full\" or \"draft\"")
+        self._quality = quality
+        if not isinstance(tempo,TempoMap) :
+            tempo = TempoMap(tempo)
+        self._tempo = tempo
+        self._release = release
+        self._fade = fade
+        self._max_voices = max_voices
+
+    def get_note_table(self) :
+        """Returns the table of piano samples."""
+        return self._note_table
+
+    def get_tempo(self) :
+        """Returns the tempo map used for every rendered note and chord."""
+        return self._tempo
+
+    def get_quality(self,quality=None) :
+        """Returns the given render quality, or the default quality of this instance if none is given."""
+        if quality == None :
+            return self._quality
+        if quality not in ("full","draft") :
+            raise ValueError("quality should be \"full\" or \"draft\"")
+        return quality
+
+    def get_render_note_table(self,quality=None) :
+        """Returns the note table used for renders of the given quality. The draft table is a downsampled copy of the note table, made on first use."""
+        if self.get_quality(quality) == "full" :
+            return self._note_table
+        if self._draft_note_table == None :
+            self._draft_note_table = self._note_table.downsampled()
+        return self._draft_note_table
+
+    def get_render_settings(self,quality=None) :
+        """Returns the tempo map, release, fade, polyphony limit, quality and note table settings (see NoteTable.get_settings) used when rendering melodies."""
+        quality = self.get_quality(quality)
+        fade = self._fade if quality == "full" else 0
+        return {"tempo" : self._tempo,"release" : self._release,"fade" : fade,"max_voices" : self._max_voices,"quality" : quality,"note_table" : self.get_render_note_table(quality).get_settings()}
     
     def export(self,file,filename) :
         """Expects audio segment and saves as a wav file to filename within current working directory."""
         file.export(os.getcwd()+"/"+filename+".wav", format="wav")
 
-    def sing(self,note_rhythm_pairs):
-        """Reads pairs of pitches and rhythms to create an audio segment"""
-        song = AudioSegment.empty()
-        for [note,rhythm] in note_rhythm_pairs :
-            if rhythm == "whole" :
-                song += self.whole(note)
-            elif rhythm == "half" :
-                song += self.half(note)
-            elif rhythm == "quarter" :
-                song += self.quarter(note)
-            elif rhythm == "eighth" :
-                song += self.eighth(note)
-        return song
+    def sing(self,note_rhythm_pairs,quality=None,convert=True):
+        """Reads pairs of pitches and rhythms, or a Melody, to create an audio segment, placing each note at its exact frame position.
+        If convert is False, a draft render is left at the draft frame rate, in mono, e.g. to be mixed further before converting it with output_format."""
+        settings = self.get_render_settings(quality)
+        scheduler = Scheduler(self.get_render_note_table(quality),settings["tempo"],settings["release"],settings["fade"],settings["max_voices"])
+        scheduler.add_melody(note_rhythm_pairs)
+        if not convert or settings["quality"] == "full" :
+            return scheduler.render()
+        return self.output_format(scheduler.render(),quality,"notes",self.melody_frame_count(note_rhythm_pairs))
+
+    def melody_frame_count(self,note_rhythm_pairs) :
+        """Returns the number of frames sing gives for a melody at full quality, without mixing any audio."""
+        scheduler = Scheduler(self._note_table,self._tempo,self._release,self._fade,self._max_voices)
+        scheduler.add_melody(note_rhythm_pairs)
+        return scheduler.frame_count()
+
+    def output_template(self,parts="notes") :
+        """Returns an empty audio segment in the format of full quality renders. Parts is "notes", "chords" or "mix" for both, which takes the higher frame rate and channel count of the two."""
+        templates = []
+        if parts in ("notes","mix") :
+            if self._note_table.get_template() == None :
+                self._note_table.load_sample("C4")
+            templates.append(self._note_table.get_template())
+        if parts in ("chords","mix") :
+            templates.append(self._chord_builder.get_template())
+        return templates[0].set_frame_rate(max(template.frame_rate for template in templates)).set_channels(max(template.channels for template in templates))
+
+    def output_format(self,segment,quality=None,parts="notes",frames=None) :
+        """Converts a render of the given quality to the frame rate and channels of the same render at full quality (see output_template), then pads it with silence or trims it to frames, if given.
+        Resampling rounds the length of a draft, so frames should be the length of the full quality render, e.g. from melody_frame_count or progression_frame_count, for the two to last exactly as long.
+        Full quality renders are returned unchanged. Draft renders are only converted once finished, so they are still mixed at the lower frame rate."""
+        if self.get_quality(quality) == "full" :
+            return segment
+        template = self.output_template(parts)
+        segment = segment.set_frame_rate(template.frame_rate).set_channels(template.channels)
+        if frames == None :
+            return segment
+        size = frames*segment.frame_width
+        return segment._spawn(segment.raw_data[:size]+b"\0"*(size-len(segment.raw_data)))
+
+    def stream(self,key,measures,accompaniment=True,quality=None,crossfade=100,beat=0,ring_out=False,fade_in=False,convert=True) :
+        """Renders measures from Mozart.measures one at a time, yielding an audio segment for each that lasts exactly as long as the measure, so the segments can be played or written one after another.
+        Notes and chords ringing past the end of a measure are carried into the next, and if ring_out is True, yielded as a last segment after the final measure. Only one measure is held at a time, so the stream can run indefinitely.
+        The first measure is timed from the given beat of the tempo map. Its chord fades in, as every later chord does, if fade_in is True, e.g. when the stream continues audio rendered earlier.
+        As in sing, convert is False to leave draft measures at the draft frame rate, in mono."""
+        settings = self.get_render_settings(quality)
+        parts = "mix" if accompaniment else "notes"
+        output_rate = self.output_template(parts).frame_rate
+        note_table = self.get_render_note_table(quality)
+        if settings["quality"] == "draft" : #Hard cuts between chords, as in draft renders of whole progressions
+            chord_builder = self._draft_chord_builder
+            crossfade = 0
+        else :
+            chord_builder = self._chord_builder
+
+        #Past the last tempo point the tempo is steady, so measures are timed from the start of a constant map and the tempo map's table stops growing
+        ticks_per_beat,points = settings["tempo"].key()
+        steady = TempoMap(points[-1][1],ticks_per_beat)
+
+        tail = None #Sound carried over from previous measures
+        for (note_rhythm_pairs,count_list,numeral) in measures :
+            if beat >= points[-1][0] :
+                tempo,start = steady,0
+            else :
+                tempo,start = settings["tempo"],beat
+            scheduler = Scheduler(note_table,tempo,settings["release"],settings["fade"],settings["max_voices"])
+            end = scheduler.add_melody(note_rhythm_pairs,start)
+            audio = scheduler.render(start)
+            if accompaniment :
+                chord = chord_builder.stream_chord(KEY_CHORDS[key][numeral],1000*(tempo.seconds(end)-tempo.seconds(start))+crossfade,crossfade,fade_in or tail != None)
+                audio = audio.overlay(chord) if len(audio) >= len(chord) else chord.overlay(audio)
+            if tail != None :
+                audio = audio.overlay(tail) if len(audio) >= len(tail) else tail.overlay(audio)
+            frames = tempo.frame(end,audio.frame_rate)-tempo.frame(start,audio.frame_rate)
+            if int(audio.frame_count()) < frames :
+                audio = audio + AudioSegment.silent(duration=1000.0*frames/audio.frame_rate+1,frame_rate=audio.frame_rate)
+            tail = audio.get_sample_slice(frames,None)
+            beat += end-start
+            measure = audio.get_sample_slice(0,frames)
+            if convert :
+                measure = self.output_format(measure,quality,parts,tempo.frame(end,output_rate)-tempo.frame(start,output_rate))
+            yield measure
+        if ring_out and tail != None and len(tail.raw_data) :
+            yield self.output_format(tail,quality,parts) if convert else tail
+
+    def session(self,note_rhythm_pairs=None,accompaniment=None,quality=None) :
+        """Returns a render session holding the given melody (none by default), for editing notes and re-rendering quickly.
+        The session renders with the note table, tempo, release and fade sing uses at the given quality, but without the polyphony limit, which RenderSession does not apply. As with sing and convert set to False, a draft session's audio is left at the draft frame rate, in mono, to be converted with output_format."""
+        if note_rhythm_pairs == None :
+            note_rhythm_pairs = []
+        settings = self.get_render_settings(quality)
+        session = RenderSession(self.get_render_note_table(quality),settings["tempo"],settings["release"],settings["fade"],accompaniment)
+        session.add_melody(note_rhythm_pairs)
+        return session
 
     def chord(self,chord,sample_length) :
         """Creates audio segment for given chord with given duration"""
+        chord = sample_chord(chord) #Chord samples are named with sharps
         if "m" in chord : #Chord is minor
             return AudioSegment.from_file(os.getcwd()+"/Minor Chords/Grand Piano - Fazioli - minor chords - "+chord+" lower.wav",format="wav")[:sample_length]
         else : #Otherwise, chord is major
             return AudioSegment.from_file(os.getcwd()+"/Major Chords/Grand Piano - Fazioli - major "+chord+".wav",format="wav")[:sample_length]
 
+    def draft_chord(self,chord,sample_length) :
+        """Creates audio segment for given chord with given duration, in mono at the draft frame rate."""
+        return self.chord(chord,sample_length).set_channels(1).set_frame_rate(DRAFT_FRAME_RATE)
+
     def harmony(self,melody_1,melody_2) :
         """Overlays two melodies to play simultaneously."""
         return melody_1.overlay(melody_2)
     
-    def chord_progression_audio(self,chord_list) :
-        """Creates an audio segment playing chords from given chord list"""
-        sample_length = 1400+100*(len(chord_list)-1)/len(chord_list) #Sets sample duration to account for time lost during crossfade
-        progression_audio = self.chord(chord_list[0],sample_length) #first chord in progression
-        for chord in chord_list[1:] : #add each chord to audio segment. Crossfade applied to eliminate cracks.
-            progression_audio = progression_audio.append(self.chord(chord,sample_length),crossfade=100)
-        return progression_audio
-
-    def accompany(self,melody,chord_list) :
-        """Takes a melody and plays it over a basic chordal accompaniment. Slight offset applied to account for small discrepancies between starting times for pitches and chords."""
-        return self.offset(melody,100,"start").overlay(self.offset(self.chord_progression_audio(chord_list),100,"end"))
+    def chord_progression_audio(self,chord_list,key=None,crossfade=100,tempo_map=None,quality=None,convert=True) :
+        """Creates an audio segment playing chords from given chord list. If a tempo map is given, each chord starts exactly at the start of its 4/4 measure.
+        Tracks are kept in the accompaniment cache, keyed by key, chords, sample length, crossfade, tempo map and quality, in the format they were rendered in. As in sing, convert is False to leave a draft track unconverted."""
+        quality = self.get_quality(quality)
+        (sample_length,starts,timing) = self.progression_timing(chord_list,crossfade,tempo_map)
+        if quality == "draft" : #Cut each chord off where the next one starts, keeping the overall length the same
+            if starts == None :
+                starts = [(sample_length-crossfade)*x for x in range(len(chord_list))]
+                sample_length = [sample_length-crossfade]*(len(chord_list)-1)+[sample_length]
+            else :
+                sample_length = [length-crossfade for length in sample_length[:-1]]+sample_length[-1:]
+        cache_key = self._accompaniment_cache.cache_key(key,chord_list,sample_length,crossfade,timing,quality)
+        progression_audio = self._accompaniment_cache.get(cache_key)
+        if progression_audio == None :
+            progression_audio = self.render_chord_progression(chord_list,sample_length,crossfade,starts,quality)
+            self._accompaniment_cache.put(cache_key,progression_audio)
+        if not convert or quality == "full" :
+            return progression_audio
+        return self.output_format(progression_audio,quality,"chords",self.progression_frame_count(chord_list,crossfade,tempo_map))
+
+    def progression_timing(self,chord_list,crossfade=100,tempo_map=None) :
+        """Returns (sample length, starts, timing) for a full quality chord track: the length of each chord in milliseconds, their starting times (None if chords follow each other directly) and the tempo map's key (None without a tempo map)."""
+        if tempo_map == None :
+            sample_length = 1400+crossfade*(len(chord_list)-1)/len(chord_list) #Sets sample duration to account for time lost during crossfade
+            return (sample_length,None,None)
+        starts = [1000*tempo_map.seconds(4*x) for x in range(len(chord_list)+1)]
+        sample_length = [starts[x+1]-starts[x]+crossfade for x in range(len(chord_list))] #Each chord rings on into the crossfade with the next one
+        return (sample_length,starts[:-1],tempo_map.key())
+
+    def progression_frame_count(self,chord_list,crossfade=100,tempo_map=None) :
+        """Returns the number of frames chord_progression_audio gives for a chord list at full quality, without building the track."""
+        (sample_length,starts,timing) = self.progression_timing(chord_list,crossfade,tempo_map)
+        return self._chord_builder.frame_count(chord_list,sample_length,crossfade,starts)
+
+    def render_chord_progression(self,chord_list,sample_length,crossfade=100,starts=None,quality=None) :
+        """Renders chords from given chord list, each with given duration (or list of durations), without using the cache. Crossfade applied to eliminate cracks, except in draft quality."""
+        if self.get_quality(quality) == "draft" :
+            return self._draft_chord_builder.build(chord_list,sample_length,0,starts)
+        return self._chord_builder.build(chord_list,sample_length,crossfade,starts)
+
+    def accompany(self,melody,chord_list,key=None,quality=None,convert=True) :
+        """Takes a melody and plays it over a basic chordal accompaniment, with each chord placed at the start of its measure.
+        The melody is either audio sung at the same quality, or pitch and rhythm pairs or a Melody to be sung here. Melodies given as notes are mixed in the format of the render quality, so a draft is mixed at the draft frame rate, in mono, and converted once at the end, unless convert is False."""
+        sung = isinstance(melody,AudioSegment)
+        if not sung :
+            notes = melody
+            melody = self.sing(notes,quality,False)
+        chords = self.chord_progression_audio(chord_list,key,tempo_map=self._tempo,quality=quality,convert=sung)
+        if len(melody) > len(chords) :
+            mix = melody.overlay(chords)
+        else :
+            mix = chords.overlay(melody)
+        if sung or not convert or self.get_quality(quality) == "full" :
+            return mix
+        return self.output_format(mix,quality,"mix",max(self.melody_frame_count(notes),self.progression_frame_count(chord_list,tempo_map=self._tempo)))
             
     def eighth(self,note) :
         """Creates audio segment for an eighth note at given pitch."""
-        return AudioSegment.from_file(os.getcwd()+"/Piano Samples/"+note+".wav",format="wav")[:175]
+        return self._note_table.sample(note)[:175]
 
     def quarter(self,note) :
         """Creates audio segment for a quarter note at given pitch."""
-        return AudioSegment.from_file(os.getcwd()+"/Piano Samples/"+note+".wav",format="wav")[:350]
+        return self._note_table.sample(note)[:350]
 
     def half(self,note) :
         """Creates audio segment for a half note at given pitch."""
-        return AudioSegment.from_file(os.getcwd()+"/Piano Samples/"+note+".wav",format="wav")[:700]
+        return self._note_table.sample(note)[:700]
 
     def whole(self,note) :
         """Creates audio segment for a whole note at given pitch."""
-        return AudioSegment.from_file(os.getcwd()+"/Piano Samples/"+note+".wav",format="wav")[:1400]
+        return self._note_table.sample(note)[:1400]
 
     def offset(self,sound,delay,position) :
         """Offsets given audio segment with silence, depending on position"""
@@ -372,8 +730,10 @@ class Sinatra(object) :
         elif position == "end" : #Add delay at end of audio
             return sound + AudioSegment.silent(duration=delay)
 
+
 def main() :
     """Creates a melody of chord tones, notates it, and creates an audio file of the melody over a homophonic texture."""
+    from arrangement import Ensemble #arrangement imports this module, so Ensemble is only imported once it is needed
 
     #Single voice, broken chord melody
     #Compose the melody
@@ -383,17 +743,19 @@ def main() :
     m1.broken_chord_melody(m1.get_key(),m1.get_progression())
     
     #Notate the melody
+    melody1 = m1.to_melody()
     t1 = Treble(m1.get_key())
-    for x in range(len(m1.get_melody())) :
-        if m1.get_count_list()[x] == 1 and t1.get_cursor() > 70: #Prevent measure line from being drawn immediately after clef
-            t1.measure_line() 
-        [pitch,rhythm]=m1.get_melody()[x]
-        t1.notate(pitch,rhythm)
+    t1.notate_melody(melody1)
     t1.save("Broken Chord Melody Sheet Music") #Image saved under Broken Chord Melody Sheet Music.jpg
 
+    #Load every sample that can appear in a melody once, to be shared by all audio below.
+    note_table = NoteTable()
+    note_table.build(m1.all_pitches())
+    accompaniment_cache = AccompanimentCache()
+
     #Create audio file with melody over accompaniment.
-    s1 = Sinatra()
-    audio1 = s1.accompany(s1.sing(m1.get_melody()),m1.chord_list())
+    s1 = Sinatra(note_table,accompaniment_cache)
+    audio1 = s1.accompany(s1.sing(melody1),m1.chord_list(),m1.get_key())
     s1.export(audio1,"Broken Chord Melody Audio") #audio saved under Broken Chord Melody Audio.wav
 
     #Single voice, stepwise melody
@@ -402,16 +764,13 @@ def main() :
     m2.choose_progression()
     m2.stepwise_melody(m2.get_key(),m2.get_progression())
 
+    melody2 = m2.to_melody()
     t2 = Treble(m2.get_key())
-    for x in range(len(m2.get_melody())) :
-        if m2.get_count_list()[x] == 1 and t2.get_cursor() > 70:
-            t2.measure_line() 
-        [pitch,rhythm]=m2.get_melody()[x]
-        t2.notate(pitch,rhythm)
+    t2.notate_melody(melody2)
     t2.save("Stepwise Melody Sheet Music")
 
-    s2 = Sinatra()
-    audio2 = s2.accompany(s2.sing(m2.get_melody()),m2.chord_list())
+    s2 = Sinatra(note_table,accompaniment_cache)
+    audio2 = s2.accompany(s2.sing(melody2),m2.chord_list(),m2.get_key())
     s2.export(audio2,"Stepwise Melody Audio") 
     
     #Two voices, broken chord melody
@@ -428,24 +787,19 @@ def main() :
     
     #Notate both melodies on same sheet music
     tAB = Treble(mA.get_key())
-    for x in range(len(mA.get_melody())) :
-        if mA.get_count_list()[x] == 1 and tAB.get_cursor() > 70:
-            tAB.measure_line() 
-        [pitch,rhythm]=mA.get_melody()[x]
-        tAB.notate(pitch,rhythm)
+    tAB.notate_melody(mA.to_melody())
     tAB.new_voice()
-    for x in range(len(mB.get_melody())) :
-        if mB.get_count_list()[x] == 1 and tAB.get_cursor() > 70:
-            tAB.measure_line() 
-        [pitch,rhythm]=mB.get_melody()[x]
-        tAB.notate(pitch,rhythm)
+    tAB.notate_melody(mB.to_melody())
     tAB.save("Duet Sheet Music") 
 
     #Create audio file with both melodies over accompaniment.
-    sAB = Sinatra()
-    duet = sAB.harmony(sAB.sing(mA.get_melody()),sAB.sing(mB.get_melody()))
-    audioAB = sAB.accompany(duet,mA.chord_list())
-    sAB.export(audioAB,"Duet Audio") 
+    sAB = Sinatra(note_table,accompaniment_cache)
+    ensemble = Ensemble(sAB)
+    ensemble.add_voice(mA,pan=-0.25) #Spread the two voices slightly apart
+    ensemble.add_voice(mB,pan=0.25)
+    duet = ensemble.render()
+    audioAB = sAB.accompany(duet,mA.chord_list(),mA.get_key())
+    sAB.export(audioAB,"Duet Audio")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,266 @@
+"""
+filename: arrangement.py
+
+Pieces with more than one voice or section: SongForm arranges named sections
+into a form such as AABA, FormRenderer renders and notates it with each
+distinct section rendered once, and Ensemble mixes several voices, each
+with its own gain and pan.
+"""
+import time
+import hashlib
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+from collections import OrderedDict
+from pydub import AudioSegment
+from pydub.utils import audioop, interleave_channels, pan_gains
+from theory import KEY_PITCHES, KEY_CHORDS, KEY_CHORD_DEGREES
+from MusicMaker import Mozart, Sinatra, Treble
+from rendering import render_voice_data
+
+
+class SongForm(object) :
+    """This class composes the named sections of a piece once each, e.g. a verse and a chorus, and arranges them by a form such as "AABA" or "verse chorus verse chorus".
+    Its measures can be streamed by Sinatra and Treble like those of Mozart.measures, or rendered with FormRenderer so that repeated sections are only rendered once."""
+
+    def __init__(self,key,mozart=None,cadence=True) :
+        """Sets the key, the Mozart used to compose sections (a new one with a random seed by default) and whether the piece ends with a cadence."""
+        if mozart == None :
+            mozart = Mozart()
+        self._key = key
+        self._mozart = mozart
+        self._cadence = cadence
+        self._sections = OrderedDict() #Name -> list of (pitch and rhythm pairs, count list, roman numeral) measures
+        self._form = []
+
+    def add_section(self,name,prog,melody_type="broken_chord") :
+        """Composes a section with one measure for each chord of prog."""
+        self.set_section(name,list(self._mozart.measures(self._key,prog,melody_type,repeat=False,cadence=False)))
+
+    def set_section(self,name,measures) :
+        """Sets a section from a list of (pitch and rhythm pairs, count list, roman numeral) measures, e.g. one composed elsewhere."""
+        self._sections[name] = measures
+
+    def get_section(self,name) :
+        """Returns the measures of a section."""
+        return self._sections[name]
+
+    def get_section_names(self) :
+        """Returns the names of the sections, in the order they were added."""
+        return list(self._sections)
+
+    def arrange(self,form) :
+        """Sets the order of sections from a form string, either of single letter names such as "AABA" or of names separated by spaces."""
+        names = form.split()
+        if len(names) == 1 and names[0] not in self._sections :
+            names = list(names[0])
+        for name in names :
+            if name not in self._sections :
+                raise ValueError("Unknown section: "+name)
+        self._form = names
+
+    def get_form(self) :
+        """Returns the names of the sections in the order they are played."""
+        return self._form
+
+    def get_key(self) :
+        """Returns the key."""
+        return self._key
+
+    def sections(self) :
+        """Returns (name, measures) for each section in the order they are played, ending with the cadence, named "cadence", if there is one."""
+        sections = [(name,self._sections[name]) for name in self._form]
+        if self._cadence == True and sections :
+            tonic = sections[0][1][0][2]
+            sections.append(("cadence",[([[KEY_PITCHES[self._key][KEY_CHORD_DEGREES[self._key][tonic][0]],"whole"]],[1],tonic)]))
+        return sections
+
+    def measures(self) :
+        """Generates every measure of the piece in order, as Mozart.measures does."""
+        for (name,measures) in self.sections() :
+            for measure in measures :
+                yield measure
+
+    def get_melody(self) :
+        """Returns the melody of the whole piece as pairs of pitches and rhythms."""
+        return [pair for measure in self.measures() for pair in measure[0]]
+
+    def chord_list(self) :
+        """Returns the chord of each measure of the whole piece."""
+        return [KEY_CHORDS[self._key][measure[2]] for measure in self.measures()]
+
+
+class Ensemble(object) :
+    """This class renders any number of melodies together, each with its own gain and stereo pan, and mixes them in a single pass."""
+
+    def __init__(self,sinatra=None) :
+        """Expects the Sinatra used to render each voice, so that all voices share its note table and tempo."""
+        if sinatra == None :
+            sinatra = Sinatra()
+        self._sinatra = sinatra
+        self._voices = [] #(melody, gain in dB, pan from -1.0 (left) to 1.0 (right))
+        self._costs = []
+
+    def add_voice(self,melody,gain=0,pan=0) :
+        """Adds a voice, given as a Mozart instance, a Melody or a list of pitch and rhythm pairs.
+        Mozart is recognised by its get_melody method rather than by class, since MusicMaker run as a script defines a Mozart class of its own."""
+        if hasattr(melody,"get_melody") :
+            melody = melody.get_melody()
+        if not -1.0 <= pan <= 1.0 :
+            raise ValueError("pan should be between -1.0 (100% left) and +1.0 (100% right)")
+        self._voices.append((melody,gain,pan))
+
+    def get_voices(self) :
+        """Returns the list of (melody, gain, pan) voices."""
+        return self._voices
+
+    def render(self,workers=None,processes=False) :
+        """Renders every voice and mixes them together. With workers, voices are rendered in that many threads, or processes if processes is True."""
+        melodies = [melody for (melody,gain,pan) in self._voices]
+        if workers == None :
+            rendered = [self.render_voice(melody) for melody in melodies]
+        elif processes :
+            pool = Pool(workers)
+            try :
+                settings = self._sinatra.get_render_settings()
+                results = pool.map(render_voice_data,[(melody,settings) for melody in melodies])
+            finally :
+                pool.close()
+            rendered = []
+            for (melody,(data,sample_width,frame_rate,channels,seconds)) in zip(melodies,results) :
+                segment = AudioSegment(data,sample_width=sample_width,frame_rate=frame_rate,channels=channels)
+                if settings["quality"] == "draft" :
+                    segment = self._sinatra.output_format(segment,"draft","notes",self._sinatra.melody_frame_count(melody))
+                rendered.append((segment,seconds))
+        else :
+            pool = ThreadPool(workers)
+            try :
+                rendered = pool.map(self.render_voice,melodies)
+            finally :
+                pool.close()
+        self._costs = [seconds for (segment,seconds) in rendered]
+        return self.mix([segment for (segment,seconds) in rendered])
+
+    def render_voice(self,melody) :
+        """Renders one voice, returning the audio segment and the time taken in seconds."""
+        start = time.time()
+        segment = self._sinatra.sing(melody)
+        return segment,time.time()-start
+
+    def mix(self,segments) :
+        """Adds every voice into one stereo mix. Each voice's gain and constant power pan are applied as a left and right gain while it is added to the left and right channels, so panning costs no extra passes."""
+        if not segments :
+            return AudioSegment.empty()
+        template = segments[0]
+        sample_width = template.sample_width
+        channel_length = max(len(segment.raw_data)//segment.channels for segment in segments)
+        left = bytearray(channel_length)
+        right = bytearray(channel_length)
+        for x in range(len(segments)) :
+            data = segments[x].raw_data
+            melody,gain,pan = self._voices[x]
+            left_gain,right_gain = pan_gains(pan,gain)
+            if segments[x].channels == 2 :
+                left_data = audioop.tomono(data,sample_width,left_gain,0)
+                right_data = audioop.tomono(data,sample_width,0,right_gain)
+            else :
+                left_data = audioop.mul(data,sample_width,left_gain)
+                right_data = audioop.mul(data,sample_width,right_gain)
+            end = len(left_data)
+            left[:end] = audioop.add(bytes(left[:end]),left_data,sample_width)
+            right[:end] = audioop.add(bytes(right[:end]),right_data,sample_width)
+        return template._spawn(interleave_channels(bytes(left),bytes(right),sample_width),overrides={"channels" : 2,"frame_width" : 2*sample_width})
+
+    def get_costs(self) :
+        """Returns the time in seconds taken to render each voice in the last call to render."""
+        return self._costs
+
+
+class FormRenderer(object) :
+    """This class renders the audio and sheet music of a SongForm section by section. Each section's audio and notation strip is kept by a hash of its contents, so a repeated section is copied rather than rendered again."""
+
+    def __init__(self,sinatra=None,quality=None) :
+        """Sets the Sinatra used for rendering and the render quality (that of the Sinatra by default)."""
+        if sinatra == None :
+            sinatra = Sinatra()
+        self._sinatra = sinatra
+        self._quality = quality
+        self._audio = {} #(content hash, quality, timing, whether the first chord fades in) -> (audio including its ring out, length in frames)
+        self._strips = {} #Content hash -> (image, measure spans)
+
+        #Render statistics
+        self._audio_sections = 0
+        self._audio_renders = 0
+        self._notation_sections = 0
+        self._notation_renders = 0
+
+    def digest(self,key,measures) :
+        """Returns the content hash of a section: its key and each measure's chord, pitches and rhythms."""
+        text = key + "|" + "|".join(measure[2] + ":" + ",".join("%s %s" % (pitch,rhythm) for [pitch,rhythm] in measure[0]) for measure in measures)
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def render(self,form) :
+        """Returns the audio of a SongForm. Each section is overlaid from its exact starting frame, so sound ringing past its end carries into the next.
+        The first chord of every section but the first fades in, crossfading with the chord ringing out of the section before, as in a stream of the whole form."""
+        ticks_per_beat,points = self._sinatra.get_tempo().key()
+        quality = self._sinatra.get_quality(self._quality)
+        placed = [] #(audio, starting frame)
+        beat = 0
+        frame = 0
+        for (name,measures) in form.sections() :
+            #Past the last tempo point every section of the same contents sounds the same, wherever it falls
+            timing = None if beat >= points[-1][0] else beat
+            fade_in = bool(placed)
+            cache_key = (self.digest(form.get_key(),measures),quality,timing,fade_in)
+            self._audio_sections += 1
+            if cache_key not in self._audio :
+                self._audio_renders += 1
+                self._audio[cache_key] = self.render_section(form.get_key(),measures,beat,quality,fade_in)
+            audio,frames = self._audio[cache_key]
+            placed.append((audio,frame))
+            beat += 4*len(measures)
+            frame += frames
+        if not placed :
+            return AudioSegment.empty()
+
+        template = placed[0][0]
+        buffer = bytearray(max(start*template.frame_width+len(audio.raw_data) for (audio,start) in placed))
+        for (audio,start) in placed :
+            start = start*template.frame_width
+            end = start+len(audio.raw_data)
+            buffer[start:end] = audioop.add(bytes(buffer[start:end]),audio.raw_data,template.sample_width)
+        return template._spawn(bytes(buffer))
+
+    def render_section(self,key,measures,beat=0,quality=None,fade_in=False) :
+        """Renders a section starting at the given beat, returning its audio, including anything ringing past its end, and its length in frames. If fade_in is True, the section's first chord fades in."""
+        segments = list(self._sinatra.stream(key,measures,quality=quality,beat=beat,ring_out=True,fade_in=fade_in))
+        frames = sum(int(segment.frame_count()) for segment in segments[:len(measures)])
+        return segments[0]._spawn(b"".join(segment.raw_data for segment in segments)),frames
+
+    def notate(self,form) :
+        """Returns the pages of sheet music for a SongForm, pasting each section's notation strip measure by measure."""
+        treble = Treble(form.get_key())
+        pages = []
+        for (name,measures) in form.sections() :
+            digest = self.digest(form.get_key(),measures)
+            self._notation_sections += 1
+            if digest not in self._strips :
+                self._notation_renders += 1
+                strip = Treble(form.get_key(),120+210*len(measures)) #No measure is wider than 210 pixels, measure line included
+                self._strips[digest] = (strip.get_image(),strip.notate_strip(measures))
+            image,spans = self._strips[digest]
+            for span in spans :
+                page = treble.paste_measure(image,span)
+                if page != None :
+                    pages.append(page)
+        if treble.has_music() :
+            pages.append(treble.get_image())
+        return pages
+
+    def get_stats(self) :
+        """Returns the number of sections rendered and reused for audio and notation, and the fraction of each that were reused."""
+        stats = {}
+        for (kind,sections,renders) in [("audio",self._audio_sections,self._audio_renders),("notation",self._notation_sections,self._notation_renders)] :
+            stats[kind+" sections"] = sections
+            stats[kind+" renders"] = renders
+            stats[kind+" reuse ratio"] = (sections-renders)/float(sections) if sections else 0.0
+        return stats
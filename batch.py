@@ -0,0 +1,261 @@
+"""
+filename: batch.py
+
+Composing and rendering many melodies at once. BatchComposer composes the
+melody of every seed in a list into a MelodyBatch, which keeps them all in
+flat arrays, and BatchRenderer renders a MelodyBatch over its accompaniment,
+skipping melodies a MelodyIndex already holds.
+"""
+import os
+import array
+from random import Random
+from theory import KEY_PITCHES, KEY_CHORDS, KEY_CHORD_DEGREES, RANDOM_KEYS, key_progressions
+from MusicMaker import Mozart, Sinatra
+
+
+class BatchComposer(Mozart) :
+    """This class composes melodies for many seeds in one call, storing them compactly in a MelodyBatch.
+    Each seed gets its own random number generator, drawn from in the same order as Mozart, so every melody matches the one Mozart composes from that seed with choose_key, choose_progression and then a melody method."""
+
+    def __init__(self) :
+        """Unlike Mozart, leaves the shared random number generator untouched."""
+        pass
+
+    def compose(self,seeds,melody_type="broken_chord",key=None,progression=None,cadence=True) :
+        """Returns a MelodyBatch holding one melody for each seed. Melody type is "broken_chord" or "stepwise". If key or progression are given, they are used for every melody instead of being chosen randomly."""
+        if melody_type not in ("broken_chord","stepwise") :
+            raise ValueError("melody_type should be \"broken_chord\" or \"stepwise\"")
+        batch = MelodyBatch(KEY_PITCHES)
+        for seed_num in seeds :
+            draw = self.draw_function(Random(seed_num))
+            melody_key = RANDOM_KEYS[draw(len(RANDOM_KEYS))] if key == None else key
+            prog = key_progressions(melody_key)[draw(len(key_progressions(melody_key)))] if progression == None else progression
+            if melody_type == "broken_chord" :
+                degrees,eighths,measures = self.broken_chord_notes(draw,melody_key,prog)
+            else :
+                degrees,eighths,measures = self.stepwise_notes(draw,melody_key,prog)
+            if cadence == True : #Whole note on the tonic, in a measure of its own
+                degrees.append(KEY_CHORD_DEGREES[melody_key][prog[0]][0])
+                eighths.append(8)
+                measures.append(len(prog))
+            batch.append(seed_num,melody_key,prog,degrees,eighths,measures)
+        return batch
+
+    def draw_function(self,generator) :
+        """Returns a function giving a random integer below n, drawn exactly as the generator's randint and choice draw it, so that randint(1,100) is draw(100)+1 and choice(seq) is seq[draw(len(seq))].
+        Where the generator draws from getrandbits, as in CPython 3, this is done directly, which is several times faster."""
+        if getattr(Random,"_randbelow_with_getrandbits",None) != None and type(generator)._randbelow is Random._randbelow_with_getrandbits :
+            getrandbits = generator.getrandbits
+            def draw(n) :
+                bits = n.bit_length()
+                r = getrandbits(bits)
+                while r >= n :
+                    r = getrandbits(bits)
+                return r
+            return draw
+        return generator.randrange
+
+    def broken_chord_notes(self,draw,key,prog) :
+        """Returns the scale degrees, lengths in eighth notes and measure numbers of a broken chord melody, as in Mozart.broken_chord_melody."""
+        degrees = []
+        eighths = []
+        measures = []
+        for measure_num in range(len(prog)) :
+            scale_degree_list = KEY_CHORD_DEGREES[key][prog[measure_num]]
+            rhythms = self.measure_rhythms(draw)
+            for rhythm in rhythms :
+                degrees.append(scale_degree_list[draw(len(scale_degree_list))])
+            eighths.extend(rhythms)
+            measures.extend([measure_num]*len(rhythms))
+        return degrees,eighths,measures
+
+    def stepwise_notes(self,draw,key,prog) :
+        """Returns the scale degrees, lengths in eighth notes and measure numbers of a stepwise melody, as in Mozart.stepwise_melody.
+        The melody turns back at the lowest and highest scale degrees of the key, and starts over if a measure does not begin on a chord tone."""
+        lowest = min(KEY_PITCHES[key])
+        highest = max(KEY_PITCHES[key])
+        chord_degrees = KEY_CHORD_DEGREES[key]
+        first_chord = chord_degrees[prog[0]]
+        while True :
+            degrees = [first_chord[draw(len(first_chord))]]
+            eighths = []
+            measures = []
+            for measure_num in range(len(prog)) :
+                rhythms = self.measure_rhythms(draw)
+                eighths.extend(rhythms)
+                measures.extend([measure_num]*len(rhythms))
+            for x in range(len(eighths)-1) :
+                prev_pitch = degrees[x]
+                prob = draw(100)+1
+                if prev_pitch == lowest :
+                    degrees.append(prev_pitch + 1)
+                elif prev_pitch == highest :
+                    degrees.append(prev_pitch - 1)
+                elif prob <= 50 :
+                    degrees.append(prev_pitch + 1)
+                else :
+                    degrees.append(prev_pitch - 1)
+            #Make sure first pitch in each measure is in the appropriate chord
+            measure_num = -1
+            for x in range(len(degrees)) :
+                if measures[x] != measure_num :
+                    measure_num = measures[x]
+                    if degrees[x] not in chord_degrees[prog[measure_num]] :
+                        break
+            else :
+                return degrees,eighths,measures
+
+    def measure_rhythms(self,draw) :
+        """Returns the lengths in eighth notes of the rhythms filling a 4/4 measure, as in Mozart.generate_rhythm_list."""
+        while True :
+            rhythms = []
+            count = 0
+            while count < 8 :
+                prob = draw(100)+1
+                if prob < 50 :
+                    rhythm = 2
+                elif prob < 85 :
+                    rhythm = 1
+                else :
+                    rhythm = 4
+                rhythms.append(rhythm)
+                count += rhythm
+            if count == 8 : #Otherwise the last rhythm overran the measure, so start over
+                return rhythms
+
+
+class MelodyBatch(object) :
+    """This class holds many melodies in flat arrays of scale degrees, lengths in eighth notes and measure numbers, with the key, chord progression and seed of each melody."""
+
+    def __init__(self,key_dict) :
+        """Expects the dictionary relating scale degrees to pitches for each key, as in Mozart."""
+        self._key_dict = key_dict
+        self._rhythm_names = {1 : "eighth",2 : "quarter",4 : "half",8 : "whole"}
+        self._seeds = []
+        self._keys = []
+        self._progressions = []
+        self._degrees = array.array("b")
+        self._eighths = array.array("B")
+        self._measures = array.array("H")
+
+        #Index of the first note of each melody, plus the end of the last one
+        self._offsets = array.array("l",[0])
+
+    def append(self,seed_num,key,prog,degrees,eighths,measures) :
+        """Adds a melody, given as lists of scale degrees, lengths in eighth notes and measure numbers."""
+        self._seeds.append(seed_num)
+        self._keys.append(key)
+        self._progressions.append(prog)
+        self._degrees.extend(degrees)
+        self._eighths.extend(eighths)
+        self._measures.extend(measures)
+        self._offsets.append(len(self._degrees))
+
+    def extend(self,seeds,keys,progressions,degrees,eighths,measures,counts) :
+        """Adds many melodies at once, given as arrays of every melody's scale degrees, lengths in eighth notes and measure numbers one after another, with the number of notes of each melody in counts."""
+        self._seeds.extend(seeds)
+        self._keys.extend(keys)
+        self._progressions.extend(progressions)
+        self._degrees.extend(degrees)
+        self._eighths.extend(eighths)
+        self._measures.extend(measures)
+        for count in counts :
+            self._offsets.append(self._offsets[-1]+count)
+
+    def get_seeds(self) :
+        """Returns the seed of each melody."""
+        return self._seeds
+
+    def get_keys(self) :
+        """Returns the key of each melody."""
+        return self._keys
+
+    def get_progressions(self) :
+        """Returns the chord progression of each melody."""
+        return self._progressions
+
+    def get_arrays(self) :
+        """Returns the arrays of scale degrees, lengths in eighth notes, measure numbers and melody offsets. The notes of melody x run from offsets[x] to offsets[x+1]."""
+        return self._degrees,self._eighths,self._measures,self._offsets
+
+    def get_numpy_arrays(self) :
+        """Returns the arrays of get_arrays as numpy arrays sharing their memory, followed by the number of the melody each note belongs to. Raises ImportError without numpy."""
+        import numpy
+        offsets = numpy.frombuffer(self._offsets,dtype="i%d" % self._offsets.itemsize)
+        melody_nums = numpy.repeat(numpy.arange(len(offsets)-1),numpy.diff(offsets))
+        arrays = [numpy.frombuffer(data,dtype=dtype) if len(data) else numpy.zeros(0,dtype=dtype) for (data,dtype) in ((self._degrees,numpy.int8),(self._eighths,numpy.uint8),(self._measures,numpy.uint16))]
+        return arrays[0],arrays[1],arrays[2],offsets,melody_nums
+
+    def slice(self,start,stop) :
+        """Returns a new MelodyBatch holding melodies start to stop, copied a whole array slice at a time."""
+        batch = MelodyBatch(self._key_dict)
+        batch._seeds = self._seeds[start:stop]
+        batch._keys = self._keys[start:stop]
+        batch._progressions = self._progressions[start:stop]
+        first = self._offsets[start]
+        last = self._offsets[stop]
+        batch._degrees = self._degrees[first:last]
+        batch._eighths = self._eighths[first:last]
+        batch._measures = self._measures[first:last]
+        batch._offsets = array.array("l",[offset-first for offset in self._offsets[start:stop+1]])
+        return batch
+
+    def notes(self,x) :
+        """Returns lists of the scale degrees, lengths in eighth notes and measure numbers of melody x."""
+        start = self._offsets[x]
+        end = self._offsets[x+1]
+        return list(self._degrees[start:end]),list(self._eighths[start:end]),list(self._measures[start:end])
+
+    def melody(self,x) :
+        """Returns melody x as a list of pitch and rhythm pairs, as in Mozart.get_melody."""
+        pitches = self._key_dict[self._keys[x]]
+        return [[pitches[self._degrees[y]],self._rhythm_names[self._eighths[y]]] for y in range(self._offsets[x],self._offsets[x+1])]
+
+    def chord_list(self,x,cadence=True) :
+        """Returns the chords of melody x, as in Mozart.chord_list."""
+        key = self._keys[x]
+        chords = [KEY_CHORDS[key][chord] for chord in self._progressions[x]]
+        if cadence == True :
+            chords.append(KEY_CHORDS[key][self._progressions[x][0]])
+        return chords
+
+    def __len__(self) :
+        """Returns the number of melodies."""
+        return len(self._seeds)
+
+
+class BatchRenderer(object) :
+    """This class renders every melody of a MelodyBatch over its accompaniment. A MelodyIndex is consulted before each melody is rendered, so exact and near duplicates are skipped."""
+
+    def __init__(self,sinatra=None,index=None,output_dir=None) :
+        """Sets the Sinatra used for rendering, the index of melodies already rendered (none by default) and a folder for the rendered wav files. Without a folder, rendered audio segments are returned instead."""
+        if sinatra == None :
+            sinatra = Sinatra()
+        self._sinatra = sinatra
+        self._index = index
+        self._output_dir = output_dir
+        if output_dir != None and not os.path.isdir(output_dir) :
+            os.makedirs(output_dir)
+
+    def render(self,batch,quality=None,convert=True) :
+        """Renders each melody that is not a duplicate, converting draft renders to the full quality format unless convert is False (see Sinatra.accompany). Returns (seed, audio segment or file name, None) for each rendered melody and (seed, None, (kind, name)) for each duplicate, where kind is "exact" or "near" and name is that of the melody it duplicates."""
+        results = []
+        keys = batch.get_keys()
+        progressions = batch.get_progressions()
+        seeds = batch.get_seeds()
+        for x in range(len(batch)) :
+            melody = batch.melody(x)
+            if self._index != None :
+                duplicate = self._index.lookup(keys[x],progressions[x],melody)
+                if duplicate != None :
+                    results.append((seeds[x],None,duplicate))
+                    continue
+            audio = self._sinatra.accompany(melody,batch.chord_list(x),keys[x],quality,convert)
+            if self._output_dir != None :
+                filename = os.path.join(self._output_dir,"melody %s.wav" % seeds[x])
+                audio.export(filename,format="wav").close()
+                audio = filename
+            if self._index != None :
+                self._index.add(keys[x],progressions[x],melody,seeds[x])
+            results.append((seeds[x],audio,None))
+        return results
@@ -0,0 +1,201 @@
+"""
+filename: benchmarks.py
+
+Timing helpers for the slower parts of the audio pipeline. Each benchmark
+returns a dictionary of its measurements so the numbers can be compared
+between runs, and running this file prints all of them.
+"""
+import contextlib
+import io
+import os
+import shutil
+import subprocess
+import sys
+import time
+from pydub import AudioSegment
+from MusicMaker import Mozart, Sinatra
+from batch import BatchComposer
+from fitness import GeneticOptimizer, WeightedFitness, chord_tone_fitness, contour_fitness, rhythm_variety_fitness, voice_leading_fitness
+from rendering import AccompanimentCache, NoteTable, Scheduler, TempoMap
+from search import MelodyQuery, SeedSearch
+
+#Stand-in for ffmpeg/avconv, used when neither is installed
+STUB_CONVERTER = os.path.join(os.path.dirname(os.path.abspath(__file__)),"stub_converter.py")
+
+
+def bench_converter() :
+    """Returns the converter the export benchmarks should use, the stub converter when ffmpeg and avconv are missing."""
+    if shutil.which("ffmpeg") == None and shutil.which("avconv") == None :
+        return STUB_CONVERTER
+    return None
+
+
+def bench_converter_pipes(count=20,converter=None) :
+    """Times export and decode round trips through the converter's pipes, and through a temporary file for mp4."""
+    if converter == None :
+        converter = bench_converter()
+    segment_class = AudioSegment
+    if converter != None :
+        #Export through a subclass so the class-wide converter is left alone
+        segment_class = type("BenchSegment",(AudioSegment,),{"converter" : converter})
+    sample = segment_class.from_file(os.getcwd()+"/Piano Samples/C4.wav",format="wav")
+
+    results = {}
+    for format in ["mp3","mp4"] :
+        start = time.time()
+        for x in range(count) :
+            encoded = sample.export(format=format)
+            decoded = segment_class.from_file(encoded,format=format)
+            encoded.close()
+        results[format+" round trips/s"] = count/(time.time() - start)
+        if converter == STUB_CONVERTER and decoded.raw_data != sample.raw_data :
+            raise AssertionError("%s round trip through the stub converter changed the audio" % format)
+    return results
+
+
+def bench_import_time(runs=10,module="MusicMaker") :
+    """Times starting a fresh interpreter that only imports module (MusicMaker by default)."""
+    command = [sys.executable,"-c","import "+module]
+    baseline_command = [sys.executable,"-c","pass"]
+    times = []
+    baseline_times = []
+    for x in range(runs) :
+        start = time.time()
+        subprocess.check_call(baseline_command)
+        baseline_times.append(time.time() - start)
+        start = time.time()
+        subprocess.check_call(command)
+        times.append(time.time() - start)
+    times.sort()
+    baseline_times.sort()
+    return {"runs" : runs,
+            "median startup (ms)" : 1000*times[runs//2],
+            "median import cost over bare interpreter (ms)" : 1000*(times[runs//2] - baseline_times[runs//2])}
+
+
+def bench_tempo_maps(repeats=20,seed_num=1) :
+    """Renders the same melody under a constant, a stepped and a ramped tempo map, timing compilation and rendering separately."""
+    m = Mozart(seed_num)
+    m.choose_key()
+    m.choose_progression()
+    m.broken_chord_melody(m.get_key(),m.get_progression())
+    note_table = NoteTable()
+    note_table.build(m.all_pitches())
+
+    constant = TempoMap(120)
+    stepped = TempoMap(120)
+    for beat in range(1,64) :
+        stepped.set_tempo(beat,[100,120,140][beat%3])
+    ramped = TempoMap(60)
+    for beat in range(2,64,2) :
+        ramped.ramp_to(beat,60+beat*2)
+
+    results = {}
+    for name,tempo_map in [("constant",constant),("stepped",stepped),("ramped",ramped)] :
+        start = time.time()
+        tempo_map.compile(64)
+        results[name+" compile (ms)"] = 1000*(time.time() - start)
+        scheduler = Scheduler(note_table,tempo_map)
+        scheduler.add_melody(m.get_melody())
+        start = time.time()
+        for x in range(repeats) :
+            scheduler.render()
+        results[name+" render (ms)"] = 1000*(time.time() - start)/repeats
+    return results
+
+
+def bench_batch_composer(count=2000,melody_type="broken_chord") :
+    """Compares composing count melodies one Mozart at a time against one BatchComposer call for the same seeds."""
+    start = time.time()
+    with contextlib.redirect_stdout(io.StringIO()) : #Mozart prints each seed
+        for seed_num in range(count) :
+            m = Mozart(seed_num)
+            m.choose_key()
+            m.choose_progression()
+            getattr(m,melody_type+"_melody")(m.get_key(),m.get_progression())
+    mozart_time = time.time() - start
+
+    start = time.time()
+    BatchComposer().compose(range(count),melody_type)
+    batch_time = time.time() - start
+
+    return {"melodies" : count,
+            "Mozart (melodies/s)" : count/mozart_time,
+            "BatchComposer (melodies/s)" : count/batch_time}
+
+
+def bench_seed_search(count=20000,workers=None) :
+    """Scans count seeds for G major melodies containing the motif G4 B4, reporting the scan rate overall and per core."""
+    search = SeedSearch(MelodyQuery(key="G",motif=["G4","B4"]),workers=workers)
+    search.run(0,count)
+    return search.get_stats()
+
+
+def bench_measure_stream(measures=200,quality="draft",seed_num=1) :
+    """Streams an endless broken chord melody in C through Sinatra.stream, timing the first and last halves of measures separately to show the time per measure stays constant."""
+    with contextlib.redirect_stdout(io.StringIO()) :
+        m = Mozart(seed_num)
+    stream = Sinatra(quality=quality).stream("C",m.measures("C",["I","V","vi","IV"]))
+    times = []
+    for half in range(2) :
+        start = time.time()
+        for x in range(measures//2) :
+            next(stream)
+        times.append(time.time() - start)
+    return {"measures" : measures,
+            "first half (measures/s)" : (measures//2)/times[0],
+            "second half (measures/s)" : (measures//2)/times[1]}
+
+
+def bench_draft_render(count=20,seed_num=1) :
+    """Renders count melodies over their accompaniment at full quality, at draft quality converted back to the full quality format, and as draft previews left at the draft rate, in mono, as BatchRenderer does, with a fresh accompaniment cache for each."""
+    batch = BatchComposer().compose(range(seed_num,seed_num+count))
+    note_table = NoteTable()
+    note_table.build(Mozart.all_pitches())
+    results = {"melodies" : count}
+    for (name,quality,convert) in [("full","full",True),("draft","draft",True),("draft preview","draft",False)] :
+        sinatra = Sinatra(note_table,AccompanimentCache(),quality=quality)
+        sinatra.accompany(batch.melody(0),batch.chord_list(0),batch.get_keys()[0],convert=convert) #Load the samples used by this quality
+        start = time.time()
+        for x in range(count) :
+            sinatra.accompany(batch.melody(x),batch.chord_list(x),batch.get_keys()[x],convert=convert)
+        results[name+" (melodies/s)"] = count/(time.time() - start)
+    results["draft speedup"] = results["draft (melodies/s)"]/results["full (melodies/s)"]
+    results["draft preview speedup"] = results["draft preview (melodies/s)"]/results["full (melodies/s)"]
+    return results
+
+
+def bench_genetic_optimizer(generations=20,population_size=2000,workers=4,seed_num=1) :
+    """Evolves the same population with the default fitness scored in this process and across a pool of worker processes."""
+    results = {"generations" : generations,"population" : population_size}
+    for (name,worker_count) in [("in process",1),("pool of %d" % workers,workers)] :
+        optimizer = GeneticOptimizer(population_size=population_size,workers=worker_count,seed_num=seed_num)
+        start = time.time()
+        best_score,melody = optimizer.run(generations)
+        results[name+" (generations/s)"] = generations/(time.time() - start)
+    results["best score"] = best_score
+    return results
+
+
+def bench_fitness(count=20000) :
+    """Scores a batch of broken chord melodies with each fitness function and with the default weighted fitness, reporting melodies scored per second."""
+    batch = BatchComposer().compose(range(count),"broken_chord")
+    results = {"melodies" : count}
+    functions = [voice_leading_fitness,chord_tone_fitness,contour_fitness,rhythm_variety_fitness]
+    for function in functions+[WeightedFitness([(function,1) for function in functions])] :
+        start = time.time()
+        function(batch)
+        results["%s (melodies/s)" % getattr(function,"__name__","weighted fitness")] = count/(time.time() - start)
+    return results
+
+
+def main() :
+    """Runs every benchmark and prints the results."""
+    for benchmark in [bench_import_time,bench_converter_pipes,bench_tempo_maps,bench_batch_composer,bench_seed_search,bench_measure_stream,bench_draft_render,bench_fitness,bench_genetic_optimizer] :
+        print(benchmark.__name__)
+        for name,value in sorted(benchmark().items()) :
+            print("    %s: %s" % (name,value))
+
+
+if __name__ == "__main__":
+    main()
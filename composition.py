@@ -0,0 +1,334 @@
+"""
+filename: composition.py
+
+Melody generators used by Mozart's constrained_melody and markov_melody:
+MelodyConstraints, which chooses uniformly among every melody meeting a set
+of constraints, and MelodyModel, an n-gram model trained on a corpus of
+melodies.
+"""
+import sys
+import json
+import array
+from bisect import bisect_right
+from theory import KEY_PITCHES, pitch_number, chord_tone_classes
+
+
+class MelodyConstraints(object) :
+    """This class generates melodies meeting a set of constraints, choosing uniformly among every melody that meets them.
+    For each key and chord progression, the constraints are compiled into a table counting the ways to finish a melody from every state (position, previous scale degree, repeats so far and notes so far).
+    Each note is then picked with probability in proportion to those counts, so generation takes the same time however rare valid melodies are."""
+
+    def __init__(self,lowest=None,highest=None,end_on_tonic=False,max_repeats=None,max_leap=None,contour=None,chord_tones="first",rhythms=("eighth","quarter","half")) :
+        """Sets the constraints:
+        lowest and highest - pitch names bounding the melody (by default the range of the key)
+        end_on_tonic - the last note before any cadence is a tonic
+        max_repeats - the same pitch is played at most this many times in a row
+        max_leap - no interval is wider than this many scale steps (1 gives stepwise motion)
+        contour - a string of "u" (up), "d" (down) and "s" (same) giving the direction of every interval, which also fixes the number of notes
+        chord_tones - "first" if the first note of each measure must be in its chord, "all" for every note, or "none"
+        rhythms - the rhythms that may be used"""
+        if chord_tones not in ("first","all","none") :
+            raise ValueError("chord_tones should be \"first\", \"all\" or \"none\"")
+        if contour != None and contour.strip("uds") :
+            raise ValueError("contour should only contain \"u\", \"d\" and \"s\"")
+        self._lowest = lowest
+        self._highest = highest
+        self._end_on_tonic = end_on_tonic
+        self._max_repeats = max_repeats
+        self._max_leap = max_leap
+        self._contour = contour
+        self._chord_tones = chord_tones
+        self._rhythm_eighths = sorted({"eighth" : 1,"quarter" : 2,"half" : 4,"whole" : 8}[rhythm] for rhythm in rhythms)
+
+        #Compiled tables for each (key, progression). For each state, the cumulative counts of the melodies following each move, and the moves as (degree, eighths, next state).
+        self._tables = {}
+
+    def count(self,key,prog) :
+        """Returns the number of melodies meeting the constraints in a key over a chord progression."""
+        table = self.compile(key,prog)
+        start = self.start_state()
+        if start not in table :
+            return 0
+        return table[start][0][-1]
+
+    def notes(self,key,prog,draw) :
+        """Returns the scale degrees, lengths in eighth notes and measure numbers of a melody chosen uniformly from those meeting the constraints, with one measure per chord.
+        Draw(n) should return a random integer from 0 to n-1, e.g. random.randrange."""
+        table = self.compile(key,prog)
+        state = self.start_state()
+        if state not in table :
+            raise ValueError("No melody meets the constraints")
+        degrees = []
+        eighths = []
+        measures = []
+        while state[0] < 8*len(prog) :
+            measures.append(state[0]//8)
+            cumulative,moves = table[state]
+            degree,length,state = moves[bisect_right(cumulative,draw(cumulative[-1]))]
+            degrees.append(degree)
+            eighths.append(length)
+        return degrees,eighths,measures
+
+    def start_state(self) :
+        """Returns the state before the first note: (position in eighth notes, previous degree, times it has been played in a row, notes so far)."""
+        return (0,None,0,0)
+
+    def compile(self,key,prog) :
+        """Builds, or returns the already built, table of counts for a key and chord progression. Only states from which a valid melody can be finished are kept."""
+        table_key = (key,tuple(prog))
+        if table_key in self._tables :
+            return self._tables[table_key]
+        pitches = KEY_PITCHES[key]
+        lowest = pitch_number(self._lowest)[0] if self._lowest != None else None
+        highest = pitch_number(self._highest)[0] if self._highest != None else None
+        degrees = [degree for degree in sorted(pitches) if (lowest == None or pitch_number(pitches[degree])[0] >= lowest) and (highest == None or pitch_number(pitches[degree])[0] <= highest)]
+        chord_tones = [chord_tone_classes(key,numeral) for numeral in prog]
+        end = 8*len(prog)
+        table = {}
+        counts = {}
+
+        #Find every state reachable from the start, grouped by position, with the moves from each
+        start = self.start_state()
+        layers = [[] for position in range(end+1)]
+        layers[0].append(start)
+        state_moves = {start : None}
+        for position in range(end) :
+            for state in layers[position] :
+                state_moves[state] = list(self.moves(state,degrees,chord_tones))
+                for degree,length,next_state in state_moves[state] :
+                    if next_state not in state_moves :
+                        state_moves[next_state] = None
+                        layers[next_state[0]].append(next_state)
+
+        #Every move goes forward, so counting back from the end reaches each state after every state it leads to
+        for state in layers[end] :
+            position,previous,repeats,notes = state
+            counts[state] = int((not self._end_on_tonic or (previous-1)%7 == 0) and (self._contour == None or notes == len(self._contour)+1))
+        for position in range(end-1,-1,-1) :
+            for state in layers[position] :
+                cumulative = []
+                moves = []
+                total = 0
+                for degree,length,next_state in state_moves.pop(state) :
+                    ways = counts[next_state]
+                    if ways :
+                        total += ways
+                        cumulative.append(total)
+                        moves.append((degree,length,next_state))
+                if total :
+                    table[state] = (cumulative,moves)
+                counts[state] = total
+
+        self._tables[table_key] = table
+        return table
+
+    def moves(self,state,degrees,chord_tones) :
+        """Yields every (degree, eighths, next state) that may follow a state. Chord_tones holds the chord tones of each measure, as returned by chord_tone_classes."""
+        position,previous,repeats,notes = state
+        measure_position = position % 8
+        if self._contour != None and notes > len(self._contour) :
+            return
+        for length in self._rhythm_eighths :
+            if measure_position+length > 8 : #Notes may not run over the end of a measure
+                break
+            for degree in degrees :
+                if (self._chord_tones == "all" or (self._chord_tones == "first" and measure_position == 0)) and degree%7 not in chord_tones[position//8] :
+                    continue
+                if previous != None :
+                    if self._max_leap != None and abs(degree-previous) > self._max_leap :
+                        continue
+                    if self._contour != None and self._contour[notes-1] != ("u" if degree > previous else "d" if degree < previous else "s") :
+                        continue
+                next_repeats = repeats+1 if degree == previous else 1
+                if self._max_repeats != None and next_repeats > self._max_repeats :
+                    continue
+                #Only keep track of what the constraints need, so that equivalent states are shared
+                yield degree,length,(position+length,degree,next_repeats if self._max_repeats != None else 0,notes+1 if self._contour != None else 0)
+
+
+class MelodyModel(object) :
+    """This class is an n-gram model of melodies over (scale degree, rhythm) notes, conditioned on the chord of the current measure.
+    It is trained by counting which note followed each context in a corpus of melodies, then compiled into flat arrays of cumulative counts, so that choosing each note is one binary search.
+    Contexts never seen in training back off to shorter ones, down to the chord alone and then to every note in the corpus."""
+
+    def __init__(self,order=2) :
+        """Sets the order of the model - each note depends on the order-1 notes before it and the chord."""
+        self._order = order
+        self._rhythm_eighths = {"eighth" : 1,"quarter" : 2,"half" : 4,"whole" : 8}
+
+        #Training counts, for each context (chord numeral followed by (degree, eighths) notes) and note
+        self._counts = {}
+        self._degree_dicts = {} #Pitch to scale degree, for each key seen in training
+
+        #Compiled tables. The notes that may follow context number x run from offsets[x] to offsets[x+1] in degrees, eighths and cumulative.
+        #Offsets and cumulative use "I" rather than "L", whose width differs between platforms, so that saved models load anywhere.
+        self._states = {}
+        self._offsets = array.array("I",[0])
+        self._degrees = array.array("b")
+        self._eighths = array.array("B")
+        self._cumulative = array.array("I")
+
+    def get_order(self) :
+        """Returns the order of the model."""
+        return self._order
+
+    def train(self,key,prog,note_rhythm_pairs) :
+        """Counts the notes of a melody, given as pitch and rhythm pairs in a key over a chord progression with one chord per measure. Notes after the last chord, such as a cadence, are ignored."""
+        if key not in self._degree_dicts :
+            self._degree_dicts[key] = dict((pitch,degree) for (degree,pitch) in KEY_PITCHES[key].items())
+        degree_dict = self._degree_dicts[key]
+        degrees = []
+        eighths = []
+        measures = []
+        position = 0 #In eighth notes from the start of the melody
+        for [pitch,rhythm] in note_rhythm_pairs :
+            if pitch not in degree_dict :
+                raise ValueError("%s is not in the key of %s" % (pitch,key))
+            degrees.append(degree_dict[pitch])
+            eighths.append(self._rhythm_eighths[rhythm])
+            measures.append(position//8)
+            position += self._rhythm_eighths[rhythm]
+        self.train_notes(prog,degrees,eighths,measures)
+
+    def train_batch(self,batch) :
+        """Counts the notes of every melody in a MelodyBatch."""
+        degrees,eighths,measures,offsets = batch.get_arrays()
+        progressions = batch.get_progressions()
+        for x in range(len(batch)) :
+            start = offsets[x]
+            end = offsets[x+1]
+            self.train_notes(progressions[x],degrees[start:end],eighths[start:end],measures[start:end])
+
+    def train_notes(self,prog,degrees,eighths,measures) :
+        """Counts a melody given as scale degrees, lengths in eighth notes and measure numbers."""
+        context = ()
+        for x in range(len(degrees)) :
+            if measures[x] >= len(prog) :
+                break
+            note = (degrees[x],eighths[x])
+            numeral = prog[measures[x]]
+            #Count the note after the full context and every shorter one, for backing off
+            for length in range(len(context)+1) :
+                self.count((numeral,)+context[len(context)-length:],note)
+            self.count((None,),note)
+            context = self.next_context(context,note)
+
+    def count(self,state,note) :
+        """Adds one to the count of a note following a context."""
+        notes = self._counts.setdefault(state,{})
+        notes[note] = notes.get(note,0)+1
+
+    def next_context(self,context,note) :
+        """Returns the context after a note."""
+        if self._order < 2 :
+            return ()
+        return (context+(note,))[-(self._order-1):]
+
+    def compile(self) :
+        """Builds the cumulative count arrays from the training counts."""
+        self._states = {}
+        self._offsets = array.array("I",[0])
+        self._degrees = array.array("b")
+        self._eighths = array.array("B")
+        self._cumulative = array.array("I")
+        for state in sorted(self._counts,key=repr) :
+            self._states[state] = len(self._states)
+            total = 0
+            for (note,count) in sorted(self._counts[state].items()) :
+                total += count
+                self._degrees.append(note[0])
+                self._eighths.append(note[1])
+                self._cumulative.append(total)
+            self._offsets.append(len(self._cumulative))
+
+    def state(self,numeral,context) :
+        """Returns the number of the longest compiled context matching the chord and previous notes."""
+        for length in range(len(context),-1,-1) :
+            state = (numeral,)+context[len(context)-length:]
+            if state in self._states :
+                return self._states[state]
+        if (None,) not in self._states :
+            raise ValueError("The model has not been trained and compiled")
+        return self._states[(None,)]
+
+    def notes(self,key,prog,draw) :
+        """Returns the scale degrees, lengths in eighth notes and measure numbers of a new melody with one measure per chord.
+        Draw(n) should return a random integer from 0 to n-1, e.g. random.randrange. Degrees outside the key are kept within it, and a rhythm running past the end of its measure is shortened to fit."""
+        lowest = min(KEY_PITCHES[key])
+        highest = max(KEY_PITCHES[key])
+        degrees = []
+        eighths = []
+        measures = []
+        context = ()
+        for measure_num in range(len(prog)) :
+            remaining = 8
+            while remaining > 0 :
+                state = self.state(prog[measure_num],context)
+                start = self._offsets[state]
+                end = self._offsets[state+1]
+                entry = bisect_right(self._cumulative,draw(self._cumulative[end-1]),start,end)
+                degree = min(max(self._degrees[entry],lowest),highest)
+                length = self._eighths[entry]
+                while length > remaining :
+                    length //= 2
+                degrees.append(degree)
+                eighths.append(length)
+                measures.append(measure_num)
+                remaining -= length
+                context = self.next_context(context,(degree,length))
+        return degrees,eighths,measures
+
+    def save(self,filename) :
+        """Saves the compiled model. The file holds a one line JSON header followed by the raw arrays, whose typecodes and item sizes are recorded in the header."""
+        numerals = sorted(set(state[0] for state in self._states if state[0] != None))
+        state_list = sorted(self._states,key=lambda state : self._states[state])
+        chords = array.array("h",[-1 if state[0] == None else numerals.index(state[0]) for state in state_list])
+        lengths = array.array("B",[len(state)-1 for state in state_list])
+        context_degrees = array.array("b",[note[0] for state in state_list for note in state[1:]])
+        context_eighths = array.array("B",[note[1] for state in state_list for note in state[1:]])
+        arrays = [chords,lengths,context_degrees,context_eighths,self._offsets,self._degrees,self._eighths,self._cumulative]
+        header = {"format" : "MusicMaker melody model","version" : 2,"order" : self._order,"byteorder" : sys.byteorder,"numerals" : numerals,
+                  "states" : len(state_list),"contexts" : len(context_degrees),"entries" : len(self._cumulative),
+                  "typecodes" : [data.typecode for data in arrays],"itemsizes" : [data.itemsize for data in arrays]}
+        with open(filename,"wb") as model_file :
+            model_file.write((json.dumps(header)+"\n").encode("utf-8"))
+            for data in arrays :
+                data.tofile(model_file)
+
+    @classmethod
+    def load(cls,filename) :
+        """Returns a compiled model loaded from a file written by save. The training counts are not kept, so a loaded model cannot be trained further."""
+        with open(filename,"rb") as model_file :
+            header = json.loads(model_file.readline().decode("utf-8"))
+            if header.get("format") != "MusicMaker melody model" :
+                raise ValueError("%s is not a melody model file" % filename)
+            if header.get("version") != 2 :
+                raise ValueError("%s was saved by an unsupported version of the melody model" % filename)
+            counts = [header["states"],header["states"],header["contexts"],header["contexts"],header["states"]+1,header["entries"],header["entries"],header["entries"]]
+            arrays = []
+            for (typecode,itemsize,length) in zip(header["typecodes"],header["itemsizes"],counts) :
+                data = array.array(typecode)
+                #Arrays are read back with the typecodes they were saved with, which must have the same width on this platform
+                if data.itemsize != itemsize :
+                    raise ValueError("%s holds %d byte '%s' arrays, which are %d bytes on this platform" % (filename,itemsize,typecode,data.itemsize))
+                data.fromfile(model_file,length)
+                if header["byteorder"] != sys.byteorder :
+                    data.byteswap()
+                arrays.append(data)
+        [chords,lengths,context_degrees,context_eighths,offsets,degrees,eighths,cumulative] = arrays
+        model = cls(header["order"])
+        numerals = header["numerals"]
+        position = 0
+        for x in range(header["states"]) :
+            context = tuple((context_degrees[y],context_eighths[y]) for y in range(position,position+lengths[x]))
+            position += lengths[x]
+            model._states[(None if chords[x] == -1 else numerals[chords[x]],)+context] = x
+        model._offsets = offsets
+        model._degrees = degrees
+        model._eighths = eighths
+        model._cumulative = cumulative
+        return model
+
+    def __len__(self) :
+        """Returns the number of compiled contexts."""
+        return len(self._states)
@@ -0,0 +1,386 @@
+"""
+filename: fitness.py
+
+Evolving melodies: GeneticOptimizer breeds a population held in a
+MelodyBatch toward a fitness function, and the fitness functions here score
+a whole MelodyBatch at a time, with numpy when it is installed.
+"""
+import os
+import json
+from bisect import bisect_left
+from multiprocessing import Pool
+from random import Random
+from theory import KEY_PITCHES, KEY_CHORD_DEGREES, RANDOM_KEYS, key_progressions, chord_tone_classes
+from batch import BatchComposer, MelodyBatch
+
+
+class WeightedFitness(object) :
+    """This class combines fitness functions, each taking a MelodyBatch and returning a score from 0 to 1 for every melody, into one giving the weighted mean of their scores."""
+
+    def __init__(self,functions) :
+        """Expects a list of (fitness function, weight) pairs. For scoring in worker processes the functions must be defined at module level."""
+        self._functions = functions
+
+    def __call__(self,batch) :
+        """Returns the combined score of each melody of a MelodyBatch, adding each function's scores at once with numpy if it is installed."""
+        total = float(sum(weight for (function,weight) in self._functions))
+        try :
+            import numpy
+        except ImportError :
+            numpy = None
+        if numpy != None :
+            scores = numpy.zeros(len(batch))
+            for (function,weight) in self._functions :
+                scores += weight*numpy.asarray(function(batch),dtype=float)/total
+            return scores.tolist()
+        scores = [0.0]*len(batch)
+        for (function,weight) in self._functions :
+            function_scores = function(batch)
+            for x in range(len(batch)) :
+                scores[x] += weight*function_scores[x]/total
+        return scores
+
+
+class GeneticOptimizer(object) :
+    """This class evolves melodies toward a fitness function, starting from melodies composed by BatchComposer. The population is kept in the compact form of a MelodyBatch, with crossover and mutation working on measures of scale degrees and lengths in eighth notes.
+    Each generation is scored as one batch in this process, or split into a batch per worker process if asked. The search can be saved to a checkpoint file after every generation and resumed from it later."""
+
+    def __init__(self,fitness=None,key=None,progression=None,population_size=200,melody_type="broken_chord",mutation_rate=0.2,elite=2,tournament_size=3,workers=1,seed_num=None,checkpoint=None) :
+        """Sets:
+        fitness - a function taking a MelodyBatch and returning a score for each melody, higher being better, e.g. a WeightedFitness. By default voice leading, chord tones, contour and rhythmic variety are weighted equally
+        key and progression - the key and chord progression shared by every melody, chosen randomly if not given
+        population_size and melody_type - the number of melodies, and the Mozart melody method ("broken_chord" or "stepwise") composing the first generation
+        mutation_rate - the chance of each measure of a new melody being mutated
+        elite - the number of best melodies carried over unchanged to the next generation
+        tournament_size - the number of melodies compared when picking each parent
+        workers - the number of worker processes scoring each generation, or None for one per core. The default of 1 scores in this process, which is faster unless the fitness function is slow, since sending each batch to the workers costs more than scoring it with the default fitness
+        seed_num - the seed of the search's random number generator
+        checkpoint - a file the search is saved to after each generation. If it already exists, the search resumes from it."""
+        if fitness == None :
+            fitness = WeightedFitness([(voice_leading_fitness,1),(chord_tone_fitness,1),(contour_fitness,1),(rhythm_variety_fitness,1)])
+        self._fitness = fitness
+        self._population_size = population_size
+        self._mutation_rate = mutation_rate
+        self._elite = elite
+        self._tournament_size = tournament_size
+        self._workers = workers
+        self._checkpoint = checkpoint
+        self._random = Random(seed_num)
+        self._composer = BatchComposer()
+        self._draw = self._composer.draw_function(self._random)
+        self._scores = None
+        self._history = [] #(generation, best score, mean score)
+
+        if checkpoint != None and os.path.isfile(checkpoint) :
+            self.load(checkpoint)
+        else :
+            self._key = RANDOM_KEYS[self._draw(len(RANDOM_KEYS))] if key == None else key
+            self._progression = key_progressions(self._key)[self._draw(len(key_progressions(self._key)))] if progression == None else progression
+            self._generation = 0
+            seeds = [self._random.getrandbits(32) for x in range(population_size)]
+            self._population = self._composer.compose(seeds,melody_type,self._key,self._progression)
+        self._lowest = min(KEY_PITCHES[self._key])
+        self._highest = max(KEY_PITCHES[self._key])
+
+    def run(self,generations) :
+        """Evolves the population for a number of generations, saving a checkpoint after each, and returns the best score and melody."""
+        pool = None
+        if self._workers != 1 :
+            pool = Pool(self._workers)
+        try :
+            if self._scores == None :
+                self._scores = self.evaluate(self._population,pool)
+                if not self._history :
+                    self.record()
+            for x in range(generations) :
+                self._population = self.next_generation()
+                self._scores = self.evaluate(self._population,pool)
+                self._generation += 1
+                self.record()
+                if self._checkpoint != None :
+                    self.save(self._checkpoint)
+        finally :
+            if pool != None :
+                pool.close()
+        return self.get_best()
+
+    def evaluate(self,batch,pool=None) :
+        """Returns the fitness of every melody in a MelodyBatch, scoring the whole batch in this process without a pool, or one slice of it per worker process."""
+        if pool == None :
+            return list(self._fitness(batch))
+        chunks = max(1,min(len(batch),self._workers or os.cpu_count() or 1))
+        jobs = [(self._fitness,batch.slice(chunk*len(batch)//chunks,(chunk+1)*len(batch)//chunks)) for chunk in range(chunks)]
+        results = pool.map(evaluate_fitness,jobs)
+        return [score for scores in results for score in scores]
+
+    def next_generation(self) :
+        """Returns the next generation: the elite melodies, then children of parents picked by tournament, crossed over and mutated."""
+        population = MelodyBatch(KEY_PITCHES)
+        ranked = sorted(range(len(self._population)),key=lambda x : -self._scores[x])
+        for x in ranked[:self._elite] :
+            population.append(self._population.get_seeds()[x],self._key,self._progression,*self._population.notes(x))
+        while len(population) < self._population_size :
+            degrees,eighths,measures = self.crossover(self.tournament(),self.tournament())
+            self.mutate(degrees,eighths,measures)
+            population.append(None,self._key,self._progression,degrees,eighths,measures)
+        return population
+
+    def tournament(self) :
+        """Returns the index of the fittest of tournament_size melodies picked at random."""
+        entrants = [self._draw(len(self._population)) for x in range(self._tournament_size)]
+        return max(entrants,key=lambda x : self._scores[x])
+
+    def crossover(self,parent_1,parent_2) :
+        """Returns the scale degrees, lengths in eighth notes and measure numbers of a child with the measures of one parent before a random measure and those of the other from it on."""
+        cut = 1+self._draw(len(self._progression))
+        degrees_1,eighths_1,measures_1 = self._population.notes(parent_1)
+        degrees_2,eighths_2,measures_2 = self._population.notes(parent_2)
+        split_1 = bisect_left(measures_1,cut)
+        split_2 = bisect_left(measures_2,cut)
+        return degrees_1[:split_1]+degrees_2[split_2:],eighths_1[:split_1]+eighths_2[split_2:],measures_1[:split_1]+measures_2[split_2:]
+
+    def mutate(self,degrees,eighths,measures) :
+        """Mutates each measure, other than the cadence, with a chance of mutation_rate, in place. A mutation moves one note a step (or, for the first note of a measure, to another chord tone), gives the measure a new rhythm, or swaps two neighbouring notes after the first."""
+        for measure_num in range(len(self._progression)) :
+            if self._random.random() >= self._mutation_rate :
+                continue
+            chord = KEY_CHORD_DEGREES[self._key][self._progression[measure_num]]
+            start = bisect_left(measures,measure_num)
+            end = bisect_left(measures,measure_num+1)
+            kind = self._draw(3)
+            if kind == 0 :
+                x = start+self._draw(end-start)
+                if x == start :
+                    degrees[x] = chord[self._draw(len(chord))]
+                else :
+                    degrees[x] = min(self._highest,max(self._lowest,degrees[x]+2*self._draw(2)-1))
+            elif kind == 1 : #Keeps the measure's pitches in order, adding chord tones if the new rhythm has more notes
+                rhythms = self._composer.measure_rhythms(self._draw)
+                pitches = degrees[start:end][:len(rhythms)]
+                while len(pitches) < len(rhythms) :
+                    pitches.append(chord[self._draw(len(chord))])
+                degrees[start:end] = pitches
+                eighths[start:end] = rhythms
+                measures[start:end] = [measure_num]*len(rhythms)
+            elif end-start > 2 :
+                x = start+1+self._draw(end-start-2)
+                degrees[x],degrees[x+1] = degrees[x+1],degrees[x]
+
+    def record(self) :
+        """Adds the best and mean scores of the current generation to the history."""
+        self._history.append((self._generation,max(self._scores),sum(self._scores)/len(self._scores)))
+
+    def get_best(self) :
+        """Returns the best score in the current generation and its melody as pitch and rhythm pairs."""
+        best = max(range(len(self._population)),key=lambda x : self._scores[x])
+        return self._scores[best],self._population.melody(best)
+
+    def get_population(self) :
+        """Returns the current generation as a MelodyBatch."""
+        return self._population
+
+    def get_scores(self) :
+        """Returns the score of each melody in the current generation, or None before it has been scored."""
+        return self._scores
+
+    def get_history(self) :
+        """Returns (generation, best score, mean score) for each generation scored."""
+        return self._history
+
+    def get_generation(self) :
+        """Returns the number of generations evolved."""
+        return self._generation
+
+    def save(self,filename) :
+        """Saves the search to a json file, writing a temporary file first so an interrupted save leaves the last checkpoint intact."""
+        state = self._random.getstate()
+        checkpoint = {"generation" : self._generation,"key" : self._key,"progression" : self._progression,
+                      "random state" : [state[0],list(state[1]),state[2]],"history" : self._history,
+                      "population" : [self._population.notes(x) for x in range(len(self._population))]}
+        with open(filename+".tmp","w") as checkpoint_file :
+            json.dump(checkpoint,checkpoint_file)
+        os.replace(filename+".tmp",filename)
+
+    def load(self,filename) :
+        """Restores the search from a json file written by save. The population is scored again when the search is next run."""
+        with open(filename) as checkpoint_file :
+            checkpoint = json.load(checkpoint_file)
+        self._generation = checkpoint["generation"]
+        self._key = checkpoint["key"]
+        self._progression = checkpoint["progression"]
+        state = checkpoint["random state"]
+        self._random.setstate((state[0],tuple(state[1]),state[2]))
+        self._history = [tuple(entry) for entry in checkpoint["history"]]
+        self._population = MelodyBatch(KEY_PITCHES)
+        for (degrees,eighths,measures) in checkpoint["population"] :
+            self._population.append(None,self._key,self._progression,degrees,eighths,measures)
+        self._scores = None
+
+
+def voice_leading_fitness(batch) :
+    """Scores how smoothly each melody of a MelodyBatch moves, from 0 to 1. Steps and repeated notes score 1, and leaps lose a quarter for each scale step beyond a second, so a sixth or wider scores 0.
+    With numpy every interval of the batch is scored at once."""
+    try :
+        import numpy
+        degrees,eighths,measures,offsets,melody_nums = batch.get_numpy_arrays()
+    except ImportError :
+        numpy = None
+    if numpy != None :
+        leaps = numpy.abs(numpy.diff(degrees.astype(numpy.int16)))
+        within = melody_nums[1:] == melody_nums[:-1] #Intervals between the last note of one melody and the first of the next are left out
+        interval_scores = numpy.maximum(0.0,1-numpy.maximum(0,leaps-1)/4.0)
+        totals = numpy.bincount(melody_nums[1:][within],interval_scores[within],len(batch))
+        intervals = numpy.diff(offsets)-1
+        return numpy.where(intervals > 0,totals/numpy.maximum(intervals,1),1.0).tolist()
+    degrees,eighths,measures,offsets = batch.get_arrays()
+    scores = []
+    for x in range(len(batch)) :
+        total = 0.0
+        for y in range(offsets[x]+1,offsets[x+1]) :
+            leap = abs(degrees[y]-degrees[y-1])
+            total += max(0.0,1-max(0,leap-1)/4.0)
+        intervals = offsets[x+1]-offsets[x]-1
+        scores.append(total/intervals if intervals > 0 else 1.0)
+    return scores
+
+
+def chord_tone_masks(batch) :
+    """Returns, for the chord tone fitness, a flat table with a bit for each chord tone class of every measure of every distinct key and progression in a MelodyBatch, followed by one for the cadence over the first chord,
+    and for each melody the table position of its first measure and its number of measures."""
+    tables = {} #(key, progression) -> position in the table
+    masks = []
+    starts = []
+    lengths = []
+    keys = batch.get_keys()
+    for (key,prog) in zip(keys,batch.get_progressions()) :
+        entry = (key,tuple(prog))
+        if entry not in tables :
+            tables[entry] = len(masks)
+            for numeral in list(prog)+list(prog[:1]) :
+                masks.append(sum(1 << tone for tone in chord_tone_classes(key,numeral)))
+        starts.append(tables[entry])
+        lengths.append(len(prog))
+    return masks,starts,lengths
+
+
+def chord_tone_fitness(batch) :
+    """Scores the fraction of each melody's length spent on tones of the chord of its measure, with the cadence measure over the first chord. Chord tones are those MelodyConstraints uses, from chord_tone_classes.
+    With numpy every note of the batch is looked up at once in a table of chord tones for each key and progression."""
+    try :
+        import numpy
+        degrees,eighths,measures,offsets,melody_nums = batch.get_numpy_arrays()
+    except ImportError :
+        numpy = None
+    if numpy != None :
+        masks,starts,lengths = chord_tone_masks(batch)
+        masks = numpy.array(masks,dtype=numpy.uint8)
+        starts = numpy.array(starts,dtype=numpy.intp)
+        lengths = numpy.array(lengths,dtype=numpy.intp)
+        #Measures past the progression are the cadence, which has the entry after the last measure
+        rows = starts[melody_nums]+numpy.minimum(measures,lengths[melody_nums])
+        on_chord = (masks[rows] >> (degrees % 7).astype(numpy.uint8)) & 1
+        totals = numpy.bincount(melody_nums,eighths,len(batch))
+        on_chord_totals = numpy.bincount(melody_nums,eighths*on_chord,len(batch))
+        return numpy.where(totals > 0,on_chord_totals/numpy.maximum(totals,1),0.0).tolist()
+    degrees,eighths,measures,offsets = batch.get_arrays()
+    keys = batch.get_keys()
+    progressions = batch.get_progressions()
+    scores = []
+    for x in range(len(batch)) :
+        prog = progressions[x]
+        chord_tones = [chord_tone_classes(keys[x],numeral) for numeral in prog]
+        on_chord = 0
+        total = 0
+        for y in range(offsets[x],offsets[x+1]) :
+            tones = chord_tones[measures[y]] if measures[y] < len(prog) else chord_tones[0]
+            if degrees[y]%7 in tones :
+                on_chord += eighths[y]
+            total += eighths[y]
+        scores.append(on_chord/float(total) if total else 0.0)
+    return scores
+
+
+def contour_fitness(batch) :
+    """Scores how closely each melody follows an arch, rising to its highest note midway and falling back: 1 when the highest note is exactly in the middle, down to 0 when it is the first or last note.
+    With numpy the highest note of every melody is found at once."""
+    try :
+        import numpy
+        degrees,eighths,measures,offsets,melody_nums = batch.get_numpy_arrays()
+    except ImportError :
+        numpy = None
+    if numpy != None :
+        notes = numpy.diff(offsets)
+        scores = numpy.zeros(len(batch))
+        if len(degrees) :
+            #Melodies without notes are left out, so that each reduction runs over exactly the notes of one melody
+            starts = offsets[:-1][notes > 0]
+            highest = numpy.maximum.reduceat(degrees,starts)
+            peaks = numpy.minimum.reduceat(numpy.where(degrees == highest.repeat(notes[notes > 0]),numpy.arange(len(degrees)),len(degrees)),starts)-starts
+            scores[notes > 0] = 1-2*numpy.abs(peaks/numpy.maximum(notes[notes > 0]-1,1)-.5)
+        return numpy.where(notes < 2,0.0,scores).tolist()
+    degrees,eighths,measures,offsets = batch.get_arrays()
+    scores = []
+    for x in range(len(batch)) :
+        start = offsets[x]
+        notes = offsets[x+1]-start
+        if notes < 2 :
+            scores.append(0.0)
+            continue
+        peak = max(range(start,offsets[x+1]),key=lambda y : degrees[y])-start
+        scores.append(1-2*abs(peak/float(notes-1)-.5))
+    return scores
+
+
+def rhythm_variety_fitness(batch) :
+    """Scores the rhythmic variety of each melody, ignoring the cadence: half for the number of different note lengths out of eighth, quarter and half, and half for the fraction of measures with a rhythm of their own.
+    With numpy each measure's rhythm is coded as a number, from the bits of the positions its notes start at and its length, and the distinct codes are counted for every melody at once.
+    A batch with a measure out of order, or one over 56 eighth notes long, is scored one melody at a time."""
+    progressions = batch.get_progressions()
+    try :
+        import numpy
+        degrees,eighths,measures,offsets,melody_nums = batch.get_numpy_arrays()
+    except ImportError :
+        numpy = None
+    if numpy != None :
+        lengths = numpy.array([len(prog) for prog in progressions],dtype=numpy.intp)
+        kept = measures < lengths[melody_nums]
+        nums = melody_nums[kept]
+        kept_eighths = eighths[kept].astype(numpy.int64)
+        kept_measures = measures[kept]
+        #Each measure's notes are together, so a new measure starts wherever the melody or measure number changes
+        new_measure = numpy.ones(len(nums),dtype=bool)
+        new_measure[1:] = (nums[1:] != nums[:-1]) | (kept_measures[1:] != kept_measures[:-1])
+        first_notes = numpy.flatnonzero(new_measure)
+        ends = numpy.cumsum(kept_eighths)
+        measure_starts = (ends-kept_eighths)[first_notes]
+        measure_nums = numpy.cumsum(new_measure)-1
+        positions = ends-kept_eighths-measure_starts[measure_nums]
+        measure_lengths = numpy.add.reduceat(kept_eighths,first_notes) if len(first_notes) else numpy.zeros(0,dtype=numpy.int64)
+        in_order = ((kept_measures[1:] >= kept_measures[:-1]) | (nums[1:] != nums[:-1])).all()
+        if in_order and (measure_lengths < 57).all() :
+            codes = numpy.add.reduceat(numpy.left_shift(1,positions+6),first_notes)+measure_lengths if len(first_notes) else measure_lengths
+            measure_melodies = nums[first_notes]
+            order = numpy.lexsort((codes,measure_melodies))
+            distinct = numpy.ones(len(order),dtype=bool)
+            distinct[1:] = (measure_melodies[order][1:] != measure_melodies[order][:-1]) | (codes[order][1:] != codes[order][:-1])
+            patterns = numpy.bincount(measure_melodies[order][distinct],minlength=len(batch))
+            #Measures without notes all share the empty rhythm
+            patterns += numpy.bincount(measure_melodies,minlength=len(batch)) < lengths
+            note_lengths = sum((numpy.bincount(nums[kept_eighths == length],minlength=len(batch)) > 0).astype(numpy.int64) for length in (1,2,4))
+            return (.5*note_lengths/3.0 + .5*patterns/lengths.astype(float)).tolist()
+    degrees,eighths,measures,offsets = batch.get_arrays()
+    scores = []
+    for x in range(len(batch)) :
+        patterns = [[] for measure_num in range(len(progressions[x]))]
+        for y in range(offsets[x],offsets[x+1]) :
+            if measures[y] < len(patterns) :
+                patterns[measures[y]].append(eighths[y])
+        lengths = set(length for pattern in patterns for length in pattern)
+        scores.append(.5*len(lengths & set([1,2,4]))/3.0 + .5*len(set(tuple(pattern) for pattern in patterns))/float(len(patterns)))
+    return scores
+
+
+def evaluate_fitness(job) :
+    """Scores a (fitness function, MelodyBatch) job, in a worker process."""
+    fitness,batch = job
+    return list(fitness(batch))
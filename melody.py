@@ -0,0 +1,144 @@
+"""
+filename: melody.py
+
+Melody, a compact array-backed melody of notes with onsets, durations and
+spelled pitches, and Note, the lightweight view of one of its notes. Mozart
+builds a Melody with to_melody, Treble notates one and the Scheduler in
+rendering.py renders one.
+"""
+import array
+from theory import pitch_number, pitch_name, spell
+
+
+class Note(object) :
+    """This class is a lightweight view of one note of a Melody, made while iterating over it."""
+    __slots__ = ("_melody","_index")
+
+    def __init__(self,melody,index) :
+        """Expects the melody and the position of the note within it."""
+        self._melody = melody
+        self._index = index
+
+    def get_pitch(self) :
+        """Returns the MIDI number of the pitch."""
+        return self._melody._pitches[self._index]
+
+    def get_name(self) :
+        """Returns the name of the pitch, e.g. "F#4"."""
+        return self._melody.name(self._index)
+
+    def get_duration(self) :
+        """Returns the duration in ticks."""
+        return self._melody._durations[self._index]
+
+    def get_onset(self) :
+        """Returns the tick at which the note starts."""
+        return self._melody._onsets[self._index]
+
+    def get_rhythm(self) :
+        """Returns the name of the rhythm, e.g. "quarter"."""
+        return self._melody.rhythm_name(self._melody._durations[self._index])
+
+    def __repr__(self) :
+        return "Note(%s, %d, %d)" % (self.get_name(),self.get_onset(),self.get_duration())
+
+
+class Melody(object) :
+    """This class stores a melody compactly, as parallel arrays of MIDI pitch, duration in ticks and onset in ticks, rather than a list of pitch and rhythm pairs.
+    Iterating over a melody gives a Note view of each note."""
+
+    def __init__(self,ticks_per_beat=96) :
+        """Sets the number of ticks in a beat (quarter note). Melodies are assumed to be in 4/4."""
+        self._ticks_per_beat = ticks_per_beat
+        self._rhythm_dict = {"eighth" : ticks_per_beat//2,"quarter" : ticks_per_beat,"half" : 2*ticks_per_beat,"whole" : 4*ticks_per_beat}
+        self._rhythm_names = dict((ticks,rhythm) for (rhythm,ticks) in self._rhythm_dict.items())
+        self._pitches = array.array("B")
+        self._durations = array.array("L")
+        self._onsets = array.array("L")
+        self._letters = array.array("B") #Letter each pitch is spelled on, from 0 for C to 6 for B, so names such as "E#4" or "Cb4" convert back unchanged
+
+    @classmethod
+    def from_pairs(cls,note_rhythm_pairs,ticks_per_beat=96) :
+        """Returns a melody playing each pitch and rhythm pair in turn."""
+        melody = cls(ticks_per_beat)
+        for [pitch,rhythm] in note_rhythm_pairs :
+            melody.append(pitch,melody.rhythm_ticks(rhythm))
+        return melody
+
+    def to_pairs(self) :
+        """Returns the melody as a list of pitch and rhythm pairs. Notes must follow each other directly, with rhythms from eighth to whole notes."""
+        pairs = []
+        onset = 0
+        for x in range(len(self._pitches)) :
+            if self._onsets[x] != onset :
+                raise ValueError("Notes overlap or leave gaps, so cannot be written as pitch and rhythm pairs")
+            pairs.append([self.name(x),self.rhythm_name(self._durations[x])])
+            onset += self._durations[x]
+        return pairs
+
+    def append(self,pitch,duration,onset=None) :
+        """Adds a note, given its pitch as a name or MIDI number (spelled with a sharp if needed) and its duration in ticks. By default the note starts where the last note ends."""
+        if isinstance(pitch,int) :
+            letter = "CDEFGAB".index(pitch_name(pitch)[0])
+        else :
+            letter = "CDEFGAB".index(pitch[0])
+            pitch = pitch_number(pitch)[0]
+        if onset == None :
+            onset = self.end()
+        self._pitches.append(pitch)
+        self._durations.append(duration)
+        self._onsets.append(onset)
+        self._letters.append(letter)
+
+    def name(self,x) :
+        """Returns the name of the pitch of note x, spelled as it was added."""
+        return spell(self._letters[x],self._pitches[x])
+
+    def rhythm_ticks(self,rhythm) :
+        """Returns the duration in ticks of a rhythm name."""
+        return self._rhythm_dict[rhythm]
+
+    def rhythm_name(self,ticks) :
+        """Returns the rhythm name for a duration in ticks."""
+        if ticks not in self._rhythm_names :
+            raise ValueError("No rhythm lasts %d ticks" % ticks)
+        return self._rhythm_names[ticks]
+
+    def get_ticks_per_beat(self) :
+        """Returns the number of ticks in a beat."""
+        return self._ticks_per_beat
+
+    def end(self) :
+        """Returns the tick at which the last note ends."""
+        if not self._pitches :
+            return 0
+        return self._onsets[-1] + self._durations[-1]
+
+    def count_list(self) :
+        """Returns the count within its measure at which each note starts, as in Mozart.get_count_list."""
+        return [1 + (onset % (4*self._ticks_per_beat))/float(self._ticks_per_beat) for onset in self._onsets]
+
+    def measure_starts(self) :
+        """Returns True for each note that starts a measure."""
+        return [onset % (4*self._ticks_per_beat) == 0 for onset in self._onsets]
+
+    def memory_footprint(self) :
+        """Returns the number of bytes held by the note arrays."""
+        return sum(data.itemsize*len(data) for data in [self._pitches,self._durations,self._onsets,self._letters])
+
+    def __len__(self) :
+        """Returns the number of notes."""
+        return len(self._pitches)
+
+    def __getitem__(self,index) :
+        """Returns a Note view of the note at index."""
+        if index < 0 :
+            index += len(self._pitches)
+        if not 0 <= index < len(self._pitches) :
+            raise IndexError("Melody index out of range")
+        return Note(self,index)
+
+    def __iter__(self) :
+        """Iterates over a Note view of each note."""
+        for x in range(len(self._pitches)) :
+            yield Note(self,x)
@@ -17,11 +17,6 @@ except:
 
 from io import BytesIO
 
-try:
-    from itertools import izip
-except:
-    izip = zip
-
 from .utils import (
     _fd_or_path_or_tempfile,
     db_to_float,
@@ -76,6 +71,85 @@ def classproperty(func):
     return ClassPropertyDescriptor(func)
 
 
+# maps the most significant byte of a 24-bit sample to the byte used to pad it
+# out to 32 bits (0x00 for positive samples, 0xFF for negative ones)
+_SIGN_EXTENSION_TABLE = bytes(bytearray([0x00] * 128 + [0xFF] * 128))
+
+
+def _convert_24bit_to_32bit(data):
+    """
+    Expands little-endian 24-bit samples to 32-bit ones.
+
+    Rather than packing one sample at a time, every byte lane of the output
+    is filled with a single strided slice assignment, so the work is done in
+    a handful of passes over the whole buffer.
+    """
+    data = bytes(data)
+    msb = data[2::3]
+
+    output = bytearray(len(data) // 3 * 4)
+    output[0::4] = msb.translate(_SIGN_EXTENSION_TABLE)
+    output[1::4] = data[0::3]
+    output[2::4] = data[1::3]
+    output[3::4] = msb
+    return bytes(output)
+
+
+def _convert_32bit_to_24bit(data):
+    """
+    Inverse of _convert_24bit_to_32bit: keeps the three most significant
+    bytes of every little-endian 32-bit sample.
+    """
+    data = bytes(data)
+
+    output = bytearray(len(data) // 4 * 3)
+    output[0::3] = data[1::4]
+    output[1::3] = data[2::4]
+    output[2::3] = data[3::4]
+    return bytes(output)
+
+
+def _read_all(file):
+    """
+    reads everything left in a file-like object, in pieces if it is too
+    large for a single read() call
+    """
+    try:
+        return file.read()
+    except(OSError):
+        data = b''
+        reader = file.read(2**31-1)
+        while reader:
+            data += reader
+            reader = file.read(2**31-1)
+        return data
+
+
+def _fix_wav_headers(data):
+    """
+    ffmpeg/avconv can't seek back to fill in the RIFF and data chunk sizes
+    when writing wav data to a pipe, so patch them to match what was actually
+    received.
+    """
+    if len(data) < 12 or data[:4] != b'RIFF':
+        return data
+
+    data = bytearray(data)
+    data[4:8] = struct.pack('<I', min(len(data) - 8, 0xFFFFFFFF))
+
+    pos = 12
+    while pos + 8 <= len(data):
+        chunk_id = bytes(data[pos:pos + 4])
+        if chunk_id == b'data':
+            size = min(len(data) - pos - 8, 0xFFFFFFFF)
+            data[pos + 4:pos + 8] = struct.pack('<I', size)
+            break
+        size = struct.unpack('<I', bytes(data[pos + 4:pos + 8]))[0]
+        pos += 8 + size + (size % 2)
+
+    return bytes(data)
+
+
 AUDIO_FILE_EXT_ALIASES = {
     "m4a": "mp4",
     "wave": "wav",
@@ -93,7 +167,20 @@ class AudioSegment(object):
         first_second = a[:1000] # get the first second of an mp3
         slice = a[5000:10000] # get a slice from 5 to 10 seconds of an mp3
     """
-    converter = get_encoder_name()  # either ffmpeg or avconv
+    # either ffmpeg or avconv, looked up on first use so that importing pydub
+    # doesn't have to search the PATH. Assign to AudioSegment.converter to
+    # use a specific binary.
+    _converter = None
+
+    @classproperty
+    def converter(cls):
+        if cls._converter is None:
+            AudioSegment._converter = get_encoder_name()
+        return cls._converter
+
+    @converter.setter
+    def converter(cls, val):
+        cls._converter = val
 
     # TODO: remove in 1.0 release
     # maintain backwards compatibility for ffmpeg attr (now called converter)
@@ -109,6 +196,10 @@ class AudioSegment(object):
         "ogg": "libvorbis"
     }
 
+    # muxers that seek back to write their index once encoding is done, so
+    # they can't write to (or reliably read from) a pipe
+    SEEKABLE_FORMATS = ("mp4", "m4a", "ipod", "mov", "3gp", "3g2")
+
     def __init__(self, data=None, *args, **kwargs):
         self.sample_width = kwargs.pop("sample_width", None)
         self.frame_rate = kwargs.pop("frame_rate", None)
@@ -163,24 +254,7 @@ class AudioSegment(object):
         # Convert 24-bit audio to 32-bit audio.
         # (stdlib audioop and array modules do not support 24-bit data)
         if self.sample_width == 3:
-            byte_buffer = BytesIO()
-
-            # Workaround for python 2 vs python 3. _data in 2.x are length-1 strings,
-            # And in 3.x are ints.
-            pack_fmt = 'BBB' if isinstance(self._data[0], int) else 'ccc'
-
-            # This conversion maintains the 24 bit values.  The values are
-            # not scaled up to the 32 bit range.  Other conversions could be
-            # implemented.
-            i = iter(self._data)
-            padding = {False: b'\x00', True: b'\xFF'}
-            for b0, b1, b2 in izip(i, i, i):
-                byte_buffer.write(padding[b2 > b'\x7f'[0]])
-                old_bytes = struct.pack(pack_fmt, b0, b1, b2)
-                byte_buffer.write(old_bytes)
-
-
-            self._data = byte_buffer.getvalue()
+            self._data = _convert_24bit_to_32bit(self._data)
             self.sample_width = 4
             self.frame_width = self.channels * self.sample_width
 
@@ -253,6 +327,31 @@ class AudioSegment(object):
 
         return self._spawn(data)
 
+    def iter_blocks(self, frames=1024, hop=None):
+        """
+        Lazily yields the raw data in blocks of <frames> frames (the last
+        block can be shorter). Blocks are memoryviews into this segment's
+        data, so no audio is copied.
+
+        hop (optional int):
+            Number of frames to advance between blocks, defaults to <frames>.
+            A hop smaller than <frames> gives overlapping blocks, e.g. for
+            windowed analysis.
+        """
+        if hop is None:
+            hop = frames
+        if frames < 1 or hop < 1:
+            raise ValueError("frames and hop must be positive")
+
+        data = memoryview(self._data)
+        block_size = int(frames) * self.frame_width
+        step = int(hop) * self.frame_width
+
+        for start in xrange(0, len(data), step):
+            yield data[start:start + block_size]
+            if start + block_size >= len(data):
+                break
+
     def get_sample_slice(self, start_sample=None, end_sample=None):
         """
         Get a section of the audio segment by sample index.
@@ -425,22 +524,6 @@ class AudioSegment(object):
             }
             return cls(data=file.read(), metadata=metadata)
 
-        input_file = NamedTemporaryFile(mode='wb', delete=False)
-        try:
-            input_file.write(file.read())
-        except(OSError):
-            input_file.flush()
-            input_file.close()
-            input_file = NamedTemporaryFile(mode='wb', delete=False, buffering=2**31-1)
-            file = open(orig_file, buffering=2**13-1, mode='rb')
-            reader = file.read(2**31-1)
-            while reader:
-                input_file.write(reader)
-                reader = file.read(2**31-1)
-        input_file.flush()
-
-        output = NamedTemporaryFile(mode="rb", delete=False)
-
         conversion_command = [cls.converter,
                               '-y',  # always overwrite existing files
                               ]
@@ -450,29 +533,43 @@ class AudioSegment(object):
         if format:
             conversion_command += ["-f", format]
 
+        # files on disk are handed to the converter by name, anything else is
+        # streamed to it over stdin
+        input_file = None
+        if isinstance(orig_file, basestring):
+            file.close()
+            stdin_data = None
+            conversion_command += ["-i", orig_file]
+        elif format in cls.SEEKABLE_FORMATS:
+            input_file = NamedTemporaryFile(mode='wb', delete=False)
+            input_file.write(_read_all(file))
+            input_file.close()
+            stdin_data = None
+            conversion_command += ["-i", input_file.name]
+        else:
+            stdin_data = _read_all(file)
+            conversion_command += ["-i", "pipe:0"]
+
         conversion_command += [
-            "-i", input_file.name,  # input_file options (filename last)
             "-vn",  # Drop any video streams if there are any
             "-f", "wav",  # output options (filename last)
-            output.name
+            "pipe:1"
         ]
 
         log_conversion(conversion_command)
 
-        p = subprocess.Popen(conversion_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        p_out, p_err = p.communicate()
+        try:
+            p = subprocess.Popen(conversion_command, stdin=subprocess.PIPE,
+                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            p_out, p_err = p.communicate(input=stdin_data)
+        finally:
+            if input_file is not None:
+                os.unlink(input_file.name)
 
         if p.returncode != 0:
             raise CouldntDecodeError("Decoding failed. ffmpeg returned error code: {0}\n\nOutput from ffmpeg/avlib:\n\n{1}".format(p.returncode, p_err))
 
-        obj = cls._from_safe_wav(output)
-
-        input_file.close()
-        output.close()
-        os.unlink(input_file.name)
-        os.unlink(output.name)
-
-        return obj
+        return cls._from_safe_wav(BytesIO(_fix_wav_headers(p_out)))
 
     @classmethod
     def from_mp3(cls, file):
@@ -500,7 +597,7 @@ class AudioSegment(object):
         file.seek(0)
         return cls(data=file)
 
-    def export(self, out_f=None, format='mp3', codec=None, bitrate=None, parameters=None, tags=None, id3v2_version='4'):
+    def export(self, out_f=None, format='mp3', codec=None, bitrate=None, parameters=None, tags=None, id3v2_version='4', sample_width=None):
         """
         Export an AudioSegment to a file with given options
 
@@ -529,14 +626,19 @@ class AudioSegment(object):
 
         id3v2_version (string)
             Set ID3v2 version for tags. (default: '4')
-        """
-        id3v2_allowed_versions = ['3', '4']
 
+        sample_width (int)
+            Sample width in bytes of the written pcm data. (default: the
+            segment's own sample width) Use 3 to write 24-bit audio, e.g.
+            to round-trip a file that was loaded from 24-bit data.
+        """
         out_f = _fd_or_path_or_tempfile(out_f, 'wb+')
         out_f.seek(0)
 
+        pcm_data, pcm_sample_width = self._pcm_for_export(sample_width)
+
         if format == "raw":
-            out_f.write(self._data)
+            out_f.write(pcm_data)
             out_f.seek(0)
             return out_f
 
@@ -544,29 +646,70 @@ class AudioSegment(object):
         if format == "wav":
             data = out_f
         else:
-            data = NamedTemporaryFile(mode="wb", delete=False)
+            data = BytesIO()
 
         wave_data = wave.open(data, 'wb')
         wave_data.setnchannels(self.channels)
-        wave_data.setsampwidth(self.sample_width)
+        wave_data.setsampwidth(pcm_sample_width)
         wave_data.setframerate(self.frame_rate)
         # For some reason packing the wave header struct with
         # a float in python 2 doesn't throw an exception
         wave_data.setnframes(int(self.frame_count()))
-        wave_data.writeframesraw(self._data)
+        wave_data.writeframesraw(pcm_data)
         wave_data.close()
 
         # for wav files, we're done (wav data is written directly to out_f)
         if format == 'wav':
             return out_f
 
-        output = NamedTemporaryFile(mode="w+b", delete=False)
+        output_file = None
+        if format in self.SEEKABLE_FORMATS:
+            output_file = NamedTemporaryFile(mode='rb', delete=False)
+            output_file.close()
+            output = output_file.name
+        else:
+            output = "pipe:1"
+
+        conversion_command = self._export_command(format, codec, bitrate,
+                                                  parameters, tags,
+                                                  id3v2_version, output)
+
+        log_conversion(conversion_command)
+
+        try:
+            # read stdin / write stdout (or the temporary output file)
+            p = subprocess.Popen(conversion_command, stdin=subprocess.PIPE,
+                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            p_out, p_err = p.communicate(input=data.getvalue())
+
+            if p.returncode != 0:
+                raise CouldntEncodeError("Encoding failed. ffmpeg/avlib returned error code: {0}\n\nOutput from ffmpeg/avlib:\n\n{1}".format(p.returncode, p_err))
+
+            if output_file is not None:
+                with open(output_file.name, 'rb') as f:
+                    p_out = f.read()
+        finally:
+            if output_file is not None:
+                os.unlink(output_file.name)
+
+        out_f.write(p_out)
+
+        out_f.seek(0)
+        return out_f
+
+    def _export_command(self, format, codec=None, bitrate=None,
+                        parameters=None, tags=None, id3v2_version='4',
+                        output="pipe:1"):
+        """
+        Builds the converter command used by export() to encode wav data read
+        from stdin into <format> data written to output (stdout by default).
+        """
+        id3v2_allowed_versions = ['3', '4']
 
-        # build converter command to export
         conversion_command = [
             self.converter,
             '-y',  # always overwrite existing files
-            "-f", "wav", "-i", data.name,  # input options (filename last)
+            "-f", "wav", "-i", "pipe:0",  # input options (filename last)
         ]
 
         if codec is None:
@@ -588,7 +731,6 @@ class AudioSegment(object):
                 raise InvalidTag("Tags must be a dictionary.")
             else:
                 # Extend converter command with tags
-                # print(tags)
                 for key, value in tags.items():
                     conversion_command.extend(
                         ['-metadata', '{0}={1}'.format(key, value)])
@@ -606,29 +748,23 @@ class AudioSegment(object):
             conversion_command.extend(["-write_xing", "0"])
 
         conversion_command.extend([
-            "-f", format, output.name,  # output options (filename last)
+            "-f", format, output,  # output options (filename last)
         ])
 
-        log_conversion(conversion_command)
-
-        # read stdin / write stdout
-        p = subprocess.Popen(conversion_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        p_out, p_err = p.communicate()
-
-        if p.returncode != 0:
-            raise CouldntEncodeError("Encoding failed. ffmpeg/avlib returned error code: {0}\n\nOutput from ffmpeg/avlib:\n\n{1}".format(p.returncode, p_err))
-
-        output.seek(0)
-        out_f.write(output.read())
+        return conversion_command
 
-        data.close()
-        output.close()
+    def _pcm_for_export(self, sample_width=None):
+        """
+        returns the raw data and its sample width as they should be written
+        out by export()
+        """
+        if sample_width is None or sample_width == self.sample_width:
+            return self._data, self.sample_width
 
-        os.unlink(data.name)
-        os.unlink(output.name)
+        if sample_width == 3:
+            return _convert_32bit_to_24bit(self.set_sample_width(4)._data), 3
 
-        out_f.seek(0)
-        return out_f
+        return self.set_sample_width(sample_width)._data, sample_width
 
     def get_frame(self, index):
         frame_start = index * self.frame_width
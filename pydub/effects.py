@@ -5,7 +5,9 @@ from .utils import (
     db_to_float,
     ratio_to_db,
     register_pydub_effect,
-    make_chunks,
+    iter_chunks,
+    pan_gains,
+    stereo_gains,
     audioop,
     get_min_max_value
 )
@@ -74,8 +76,10 @@ def speedup(seg, playback_speed=1.5, chunk_size=150, crossfade=25):
     # DEBUG
     #print("chunk: {0}, rm: {1}".format(chunk_size, ms_to_remove_per_chunk))
 
-    chunks = make_chunks(seg, chunk_size + ms_to_remove_per_chunk)
-    if len(chunks) < 2:
+    chunks = iter_chunks(seg, chunk_size + ms_to_remove_per_chunk)
+    first_chunk = next(chunks, None)
+    last_chunk = next(chunks, None)
+    if last_chunk is None:
         raise Exception("Could not speed up AudioSegment, it was too short {2:0.2f}s for the current settings:\n{0}ms chunks at {1:0.1f}x speedup".format(
             chunk_size, playback_speed, seg.duration_seconds))
 
@@ -84,13 +88,13 @@ def speedup(seg, playback_speed=1.5, chunk_size=150, crossfade=25):
     ms_to_remove_per_chunk -= crossfade
 
     # we don't want to truncate the last chunk since it is not guaranteed to be
-    # the full chunk length
-    last_chunk = chunks[-1]
-    chunks = [chunk[:-ms_to_remove_per_chunk] for chunk in chunks[:-1]]
-
-    out = chunks[0]
-    for chunk in chunks[1:]:
-        out = out.append(chunk, crossfade=crossfade)
+    # the full chunk length, so each chunk is only added once the next one
+    # has been read
+    out = first_chunk[:-ms_to_remove_per_chunk]
+    for chunk in chunks:
+        out = out.append(last_chunk[:-ms_to_remove_per_chunk],
+                         crossfade=crossfade)
+        last_chunk = chunk
 
     out += last_chunk
     return out
@@ -275,29 +279,20 @@ def pan(seg, pan_amount):
     
     Panning does not alter the *perceived* loundness, but since loudness
     is decreasing on one side, the other side needs to get louder to
-    compensate. When panned hard left, the left channel will be 3dB louder.
+    compensate. The gains follow a constant power law (see
+    utils.pan_gains), so when panned hard left, the left channel will be
+    3dB louder.
     """
     if not -1.0 <= pan_amount <= 1.0:
         raise ValueError("pan_amount should be between -1.0 (100% left) and +1.0 (100% right)")
-    
-    max_boost_db = ratio_to_db(2.0)
-    boost_db = abs(pan_amount) * max_boost_db
-    
-    boost_factor = db_to_float(boost_db)
-    reduce_factor = db_to_float(max_boost_db) - boost_factor
-    
-    reduce_db = ratio_to_db(reduce_factor)
-    
-    # Cut boost in half (max boost== 3dB) - in reality 2 speakers
-    #   do not sum to a full 6 dB.
-    boost_db = boost_db / 2.0
-    
-    if pan_amount < 0:
-        return seg.apply_gain_stereo(boost_db, reduce_db)
-    else:
-        return seg.apply_gain_stereo(reduce_db, boost_db)
-    
-    
+
+    left_gain, right_gain = pan_gains(pan_amount)
+    return seg._spawn(data=stereo_gains(seg._data, seg.sample_width,
+                                        seg.channels, left_gain, right_gain),
+                      overrides={'channels': 2,
+                                 'frame_width': 2 * seg.sample_width})
+
+
 @register_pydub_effect
 def apply_gain_stereo(seg, left_gain=0.0, right_gain=0.0):
     """
@@ -306,22 +301,12 @@ def apply_gain_stereo(seg, left_gain=0.0, right_gain=0.0):
     
     note: mono audio segments will be converted to stereo
     """
-    if seg.channels == 1:
-        left = right = seg
-    elif seg.channels == 2:
-        left, right = seg.split_to_mono()
-    
     l_mult_factor = db_to_float(left_gain)
     r_mult_factor = db_to_float(right_gain)
-    
-    left_data = audioop.mul(left._data, left.sample_width, l_mult_factor)
-    left_data = audioop.tostereo(left_data, left.sample_width, 1, 0)
-    
-    right_data = audioop.mul(right._data, right.sample_width, r_mult_factor)
-    right_data = audioop.tostereo(right_data, right.sample_width, 0, 1)
-    
-    output = audioop.add(left_data, right_data, seg.sample_width)
-    
+
+    output = stereo_gains(seg._data, seg.sample_width, seg.channels,
+                          l_mult_factor, r_mult_factor)
+
     return seg._spawn(data=output,
                 overrides={'channels': 2,
                            'frame_width': 2 * seg.sample_width})
\ No newline at end of file
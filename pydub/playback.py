@@ -7,16 +7,23 @@ OSX 10.10): https://gist.github.com/jiaaro/9767512210a1d80a8a0d
 
 import subprocess
 from tempfile import NamedTemporaryFile
-from .utils import get_player_name, make_chunks
+from .utils import get_player_name
 
-PLAYER = get_player_name()
+# ffplay or avplay, looked up the first time it's needed (see get_player)
+PLAYER = None
 
 
+def get_player():
+    global PLAYER
+    if PLAYER is None:
+        PLAYER = get_player_name()
+    return PLAYER
+
 
 def _play_with_ffplay(seg):
     with NamedTemporaryFile("w+b", suffix=".wav") as f:
         seg.export(f.name, "wav")
-        subprocess.call([PLAYER, "-nodisp", "-autoexit", f.name])
+        subprocess.call([get_player(), "-nodisp", "-autoexit", f.name])
 
 
 def _play_with_pyaudio(seg):
@@ -29,8 +36,8 @@ def _play_with_pyaudio(seg):
                     output=True)
 
     # break audio into half-second chunks (to allows keyboard interrupts)
-    for chunk in make_chunks(seg, 500):
-        stream.write(chunk._data)
+    for block in seg.iter_blocks(frames=int(seg.frame_count(ms=500))):
+        stream.write(block.tobytes())
 
     stream.stop_stream()  
     stream.close()  
@@ -1,6 +1,6 @@
 from __future__ import division
 
-from math import log, ceil, floor
+from math import log, ceil, floor, pi, sqrt, cos, sin
 import os
 import re
 from subprocess import Popen, PIPE
@@ -94,6 +94,62 @@ def ratio_to_db(ratio, val2=None, using_amplitude=True):
         return 10 * log(ratio, 10)
     
 
+def pan_gains(pan, gain=0):
+    """
+    Returns the left and right gain factors for a constant power pan from
+    -1.0 (100% left) to +1.0 (100% right), including an overall gain in dB.
+
+    A centered signal is left at its own volume, and a signal panned hard to
+    one side is 3dB louder on that side.
+    """
+    angle = (pan + 1) * pi / 4
+    factor = db_to_float(gain) * sqrt(2)
+    # rounded so that a centered signal gets gains of exactly 1 and a hard
+    # panned one exactly 0
+    return round(factor * cos(angle), 12), round(factor * sin(angle), 12)
+
+
+def stereo_gains(data, sample_width, channels, left_factor, right_factor):
+    """
+    Returns stereo raw data with the left and right channels scaled by their
+    own factors, clipped and rounded as audioop.mul does. Mono data is
+    copied to both channels by a single audioop.tostereo call.
+
+    Stereo data is scaled in one vectorized step over its frames when numpy
+    is installed. Without numpy, each channel is scaled while it is split
+    out with audioop.tomono and the two are interleaved again.
+    """
+    if channels == 1:
+        return audioop.tostereo(data, sample_width, left_factor, right_factor)
+
+    try:
+        import numpy
+    except ImportError:
+        left = audioop.tomono(data, sample_width, left_factor, 0)
+        right = audioop.tomono(data, sample_width, 0, right_factor)
+        return interleave_channels(left, right, sample_width)
+
+    dtype = {1: numpy.int8, 2: numpy.int16, 4: numpy.int32}[sample_width]
+    limits = numpy.iinfo(dtype)
+    frames = numpy.frombuffer(data, dtype).reshape(-1, 2)
+    scaled = numpy.floor(frames * numpy.array([left_factor, right_factor]))
+    return numpy.clip(scaled, limits.min, limits.max).astype(dtype).tobytes()
+
+
+def interleave_channels(left, right, sample_width):
+    """
+    Builds stereo data from two mono channels of raw data. Each byte of a
+    sample is copied with a single strided slice assignment rather than
+    frame by frame.
+    """
+    frame_width = 2 * sample_width
+    output = bytearray(len(left) * 2)
+    for i in range(sample_width):
+        output[i::frame_width] = left[i::sample_width]
+        output[sample_width + i::frame_width] = right[i::sample_width]
+    return bytes(output)
+
+
 def register_pydub_effect(fn, name=None):
     """
     decorator for adding pydub effects to the AudioSegment objects.
@@ -123,6 +179,17 @@ def register_pydub_effect(fn, name=None):
     return fn
 
 
+def iter_chunks(audio_segment, chunk_length):
+    """
+    Lazily breaks an AudioSegment into chunks that are <chunk_length>
+    milliseconds long (rounded up to a whole number of frames). Only one
+    chunk is held in memory at a time.
+    """
+    frames = int(ceil(audio_segment.frame_count(ms=chunk_length)))
+    for block in audio_segment.iter_blocks(frames=frames):
+        yield audio_segment._spawn(block.tobytes())
+
+
 def make_chunks(audio_segment, chunk_length):
     """
     Breaks an AudioSegment into chunks that are <chunk_length> milliseconds
@@ -131,9 +198,7 @@ def make_chunks(audio_segment, chunk_length):
     if chunk_length is 50 then you'll get a list of 50 millisecond long audio
     segments back (except the last one, which can be shorter)
     """
-    number_of_chunks = ceil(len(audio_segment) / float(chunk_length))
-    return [audio_segment[i * chunk_length:(i + 1) * chunk_length]
-            for i in range(int(number_of_chunks))]
+    return list(iter_chunks(audio_segment, chunk_length))
 
 
 def which(program):
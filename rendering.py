@@ -0,0 +1,673 @@
+"""
+filename: rendering.py
+
+The rendering engine behind Sinatra: the table of piano samples, tempo
+maps, the Scheduler placing every note on a timeline and mixing it in one
+pass, editable render sessions, the accompaniment cache and the builder of
+crossfaded chord tracks. Everything here works on raw audio data in the
+format of a shared template, so notes and chords are joined without
+converting them.
+"""
+import os
+import time
+import array
+import hashlib
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from pydub import AudioSegment #Need pydub folder downloaded to working directory
+from pydub.utils import audioop, db_to_float
+from theory import sample_pitch
+from melody import Melody
+
+
+def ramp_data(data,template,fade_frames,from_gain,to_gain,offset=0,steps=100) :
+    """Applies a linear (equal gain) fade between two gains in dB, lasting fade_frames frames, to raw audio data in the format of the template audio segment. The data holds the frames of the fade from offset onward.
+    As in AudioSegment.fade, the gain changes in steps, each applied to a block of frames with one audioop.mul call. There are at most steps of them, so fades of up to that many frames change gain every frame."""
+    from_power = db_to_float(from_gain)
+    scale_step = (db_to_float(to_gain) - from_power)/fade_frames
+    block = -(-fade_frames//steps) #Frames per step, rounded up
+    frame_width = template.frame_width
+    frames = len(data)//frame_width
+    output = []
+    x = 0
+    while x < frames :
+        block_start = offset+x - (offset+x)%block
+        end = min(frames,block_start+block-offset)
+        output.append(audioop.mul(data[x*frame_width:end*frame_width],template.sample_width,from_power + scale_step*block_start))
+        x = end
+    return b"".join(output)
+
+
+#Frame rate used for draft quality renders
+DRAFT_FRAME_RATE = 8000
+
+
+class NoteTable(object) :
+    """This class holds the piano samples in one shared format, so that each sample is only loaded once. The Scheduler renders every note from these whole samples, cutting each off where the note ends."""
+
+    def __init__(self,sample_dir=None,frame_rate=None,channels=None) :
+        """Sets the folder holding the piano samples. If frame_rate or channels are given, samples are converted to them as they are loaded."""
+        if sample_dir == None :
+            sample_dir = os.getcwd()+"/Piano Samples/"
+        self._sample_dir = sample_dir
+        self._frame_rate = frame_rate
+        self._channels = channels
+
+        #Whole sample for each pitch. Every sample shares the format of self._template.
+        self._samples = {}
+        self._template = None
+
+        #Sample lookup statistics
+        self._hits = 0
+        self._misses = 0
+
+    def sample(self,pitch) :
+        """Returns the whole, unsliced sample for a pitch, loading it on first use. This is the lookup the Scheduler renders from, counted once for each note: a hit if the sample is already in memory, and a miss if it has to be read from file."""
+        if pitch in self._samples or sample_pitch(pitch) in self._samples :
+            self._hits += 1
+        else :
+            self._misses += 1
+        return self.load_sample(pitch)
+
+    def load_sample(self,pitch) :
+        """Returns the whole sample for a pitch, loading it if needed, without counting a lookup."""
+        if pitch not in self._samples :
+            #Pitches spelled differently share the sample of their enharmonic equivalent
+            sample_name = sample_pitch(pitch)
+            if sample_name not in self._samples :
+                self.add_sample(sample_name,AudioSegment.from_file(self._sample_dir+sample_name+".wav",format="wav"))
+            self._samples[pitch] = self._samples[sample_name]
+        return self._samples[pitch]
+
+    def add_sample(self,pitch,sample) :
+        """Stores the whole sample for a pitch, converted to the format of the table."""
+        if self._channels != None :
+            sample = sample.set_channels(self._channels)
+        if self._frame_rate != None :
+            sample = sample.set_frame_rate(self._frame_rate)
+        #All notes are converted to the format of the first sample loaded so that they can be joined directly.
+        if self._template == None :
+            self._template = sample[:0]
+        else :
+            sample = sample.set_channels(self._template.channels).set_frame_rate(self._template.frame_rate).set_sample_width(self._template.sample_width)
+        self._samples[pitch] = sample
+
+    def downsampled(self,frame_rate=DRAFT_FRAME_RATE,channels=1) :
+        """Returns a new table for the same samples at a lower frame rate and number of channels, e.g. for draft renders.
+        Samples already loaded are converted from memory rather than read again."""
+        table = NoteTable(self._sample_dir,frame_rate,channels)
+        for pitch in self._samples :
+            table.add_sample(pitch,self._samples[pitch])
+        return table
+
+    def get_template(self) :
+        """Returns an empty audio segment in the format shared by every note, or None if nothing has been loaded."""
+        return self._template
+
+    def get_settings(self) :
+        """Returns the sample folder, frame rate and channels of the table, from which an equal table can be made, e.g. in a worker process."""
+        return {"sample_dir" : self._sample_dir,"frame_rate" : self._frame_rate,"channels" : self._channels}
+
+    def build(self,pitches) :
+        """Eagerly loads the whole sample for each of the given pitches, e.g. all pitches used by a key, so that every later lookup of them is a hit."""
+        for pitch in set(pitches) :
+            self.load_sample(pitch)
+
+    def hit_rate(self) :
+        """Returns the fraction of sample lookups served from samples already in memory, whether loaded by build or by an earlier lookup."""
+        lookups = self._hits + self._misses
+        if lookups == 0 :
+            return 0.0
+        return self._hits / float(lookups)
+
+    def memory_footprint(self) :
+        """Returns the number of bytes of audio data held by the table."""
+        samples = dict((id(sample),sample) for sample in self._samples.values()) #Enharmonic pitches share one sample
+        return sum(len(sample.raw_data) for sample in samples.values())
+
+    def __len__(self) :
+        """Returns the number of distinct samples loaded."""
+        return len(set(id(sample) for sample in self._samples.values()))
+
+
+class TempoMap(object) :
+    """This class describes the tempo of a piece - constant, stepped or ramped - and compiles it once into a table of the time at which each tick falls, so that finding the position of any beat is a single lookup."""
+
+    def __init__(self,tempo=60000/350.0,ticks_per_beat=96) :
+        """Starts the map at a tempo in beats (quarter notes) per minute. The default tempo gives 350 millisecond quarter notes."""
+        self._ticks_per_beat = ticks_per_beat
+
+        #Tempo points are (beat, tempo, ramp). If ramp is True the tempo moves steadily from the previous point to this one, otherwise it jumps at this beat.
+        self._points = [(0,tempo,False)]
+
+        #Time in seconds at which each tick falls, compiled on demand
+        self._table = array.array("d",[0.0])
+
+    def set_tempo(self,beat,tempo) :
+        """Changes to a new tempo at the given beat."""
+        self.add_point(beat,tempo,False)
+
+    def ramp_to(self,beat,tempo) :
+        """Moves steadily from the tempo of the previous point to a new tempo, arriving at the given beat."""
+        self.add_point(beat,tempo,True)
+
+    def add_point(self,beat,tempo,ramp) :
+        """Adds a tempo point and discards the compiled table."""
+        if beat <= self._points[-1][0] :
+            raise ValueError("Tempo points must be added in order")
+        self._points.append((beat,tempo,ramp))
+        self._table = array.array("d",[0.0])
+
+    def tempo_at(self,beat) :
+        """Returns the tempo in beats per minute at a beat."""
+        for x in range(len(self._points)-1,-1,-1) :
+            point_beat,tempo,ramp = self._points[x]
+            if point_beat <= beat :
+                if x+1 < len(self._points) and self._points[x+1][2] :
+                    next_beat,next_tempo,next_ramp = self._points[x+1]
+                    return tempo + (next_tempo-tempo)*(beat-point_beat)/float(next_beat-point_beat)
+                return tempo
+
+    def compile(self,beats) :
+        """Extends the table of tick times to cover at least the given number of beats."""
+        ticks = int(beats*self._ticks_per_beat)+1
+        table = self._table
+        tick_length = 1.0/self._ticks_per_beat
+        for tick in range(len(table),ticks+1) :
+            #Tempo at the middle of each tick, which is exact for steady ramps
+            tempo = self.tempo_at((tick-.5)*tick_length)
+            table.append(table[-1] + 60.0*tick_length/tempo)
+
+    def seconds(self,beat) :
+        """Returns the time in seconds at which a beat falls."""
+        position = beat*self._ticks_per_beat
+        tick = int(position)
+        if tick+1 >= len(self._table) :
+            #Compile ahead in large steps so that lookups stay cheap for long pieces
+            self.compile(max(2*len(self._table)/float(self._ticks_per_beat),beat+1))
+        return self._table[tick] + (self._table[tick+1]-self._table[tick])*(position-tick)
+
+    def frame(self,beat,frame_rate) :
+        """Returns the frame at which a beat falls. Positions are looked up from the start of the piece rather than summed note by note."""
+        return int(round(self.seconds(beat)*frame_rate))
+
+    def key(self) :
+        """Returns a value identifying the tempo map, for use in cache keys."""
+        return (self._ticks_per_beat,tuple(self._points))
+
+
+class Scheduler(object) :
+    """This class places note events at exact frame positions and renders them by overlap-adding into a single buffer, so that timing does not drift."""
+
+    def __init__(self,note_table,tempo=60000/350.0,release=0,fade=0,max_voices=None) :
+        """Expects a note table and either a tempo in beats (quarter notes) per minute or a TempoMap. The default tempo gives 350 millisecond quarter notes.
+        Each note keeps ringing for release milliseconds past its written duration, overlapping the following notes, and is faded out over its last fade milliseconds.
+        If max_voices is given, no more than that many notes sound at once - starting a note beyond the limit cuts off the oldest sounding note."""
+        self._note_table = note_table
+        if not isinstance(tempo,TempoMap) :
+            tempo = TempoMap(tempo)
+        self._tempo = tempo
+        self._release = release
+        self._fade = fade
+        self._max_voices = max_voices
+        self._rhythm_dict = {"eighth" : .5,"quarter" : 1,"half" : 2,"whole" : 4}
+
+        #Events are (onset, duration, pitch, velocity), with onset and duration measured in beats
+        self._events = []
+
+    def add(self,onset,duration,pitch,velocity=1.0) :
+        """Adds a note starting at onset and lasting for duration beats. Velocity scales the volume of the note."""
+        self._events.append((onset,duration,pitch,velocity))
+
+    def add_melody(self,note_rhythm_pairs,onset=0,velocity=1.0) :
+        """Adds each pitch and rhythm pair of a melody in turn, or every note of a Melody, starting at onset. Returns the beat after the last note."""
+        if isinstance(note_rhythm_pairs,Melody) :
+            ticks_per_beat = float(note_rhythm_pairs.get_ticks_per_beat())
+            for note in note_rhythm_pairs :
+                self.add(onset+note.get_onset()/ticks_per_beat,note.get_duration()/ticks_per_beat,note.get_name(),velocity)
+            return onset+note_rhythm_pairs.end()/ticks_per_beat
+        for [pitch,rhythm] in note_rhythm_pairs :
+            duration = self._rhythm_dict[rhythm]
+            self.add(onset,duration,pitch,velocity)
+            onset += duration
+        return onset
+
+    def get_events(self) :
+        """Returns the list of events."""
+        return self._events
+
+    def get_tempo(self) :
+        """Returns the tempo map."""
+        return self._tempo
+
+    def end(self) :
+        """Returns the beat at which the last note ends."""
+        if not self._events :
+            return 0
+        return max(onset+duration for (onset,duration,pitch,velocity) in self._events)
+
+    def frame(self,beat,frame_rate) :
+        """Returns the frame at which a beat falls."""
+        return self._tempo.frame(beat,frame_rate)
+
+    def render(self,beat=0) :
+        """Renders every event into one audio segment, starting at the given beat. Events should not start before it."""
+        if not self._events :
+            return AudioSegment.empty()
+        voices = self.voices()
+        template = self._note_table.get_template()
+        origin = self.frame(beat,template.frame_rate)
+
+        buffer = bytearray(self.voices_frame_count(voices,beat)*template.frame_width)
+        for [start,stop,pitch,velocity] in voices :
+            data = self.voice_data(start,stop,pitch,velocity)
+            start = (start-origin)*template.frame_width
+            end = start+len(data)
+            buffer[start:end] = audioop.add(bytes(buffer[start:end]),data,template.sample_width)
+        return template._spawn(bytes(buffer))
+
+    def frame_count(self,beat=0) :
+        """Returns the number of frames render would give, starting at the given beat, without mixing any audio."""
+        if not self._events :
+            return 0
+        return self.voices_frame_count(self.voices(),beat)
+
+    def voices(self) :
+        """Returns [start, stop, pitch, velocity] for every event, sorted by start, with the polyphony limit applied. This looks up each note's sample, which also sets the format of the note table."""
+        voices = []
+        for (onset,duration,pitch,velocity) in sorted(self._events,key=lambda event : event[0]) :
+            voices.append(self.voice_frames(onset,duration,pitch)+[pitch,velocity])
+        self.steal_voices(voices)
+        return voices
+
+    def voices_frame_count(self,voices,beat=0) :
+        """Returns the number of frames from the given beat to the end of the last note's written duration or of the last voice, whichever is later."""
+        frame_rate = self._note_table.get_template().frame_rate
+        return max(self.frame(self.end(),frame_rate),max(stop for [start,stop,pitch,velocity] in voices))-self.frame(beat,frame_rate)
+
+    def get_template(self) :
+        """Returns an empty audio segment in the format of the rendered notes. If the note table has not loaded anything yet, the sample of the first event (or C4) is loaded to set its format."""
+        if self._note_table.get_template() == None :
+            self._note_table.load_sample(self._events[0][2] if self._events else "C4")
+        return self._note_table.get_template()
+
+    def voice_frames(self,onset,duration,pitch) :
+        """Returns [start, stop] - the frames between which a note sounds, including its release."""
+        sample = self._note_table.sample(pitch)
+        start = self.frame(onset,sample.frame_rate)
+        release_frames = int(sample.frame_count(ms=self._release))
+        stop = min(self.frame(onset+duration,sample.frame_rate)+release_frames,start+int(sample.frame_count()))
+        return [start,stop]
+
+    def voice_data(self,start,stop,pitch,velocity) :
+        """Returns the raw audio data for a note sounding from frame start to frame stop."""
+        sample = self._note_table.load_sample(pitch) #Already counted by voice_frames
+        data = sample.raw_data[:(stop-start)*sample.frame_width]
+        if velocity != 1 :
+            data = audioop.mul(data,sample.sample_width,velocity)
+        #Fade out the end of the note, unless the sample has already died away by itself
+        fade_frames = int(sample.frame_count(ms=self._fade))
+        if fade_frames and len(data) < len(sample.raw_data) :
+            fade_bytes = min(fade_frames*sample.frame_width,len(data))
+            data = data[:-fade_bytes] + ramp_data(data[-fade_bytes:],sample,fade_frames,0,-120,fade_frames-fade_bytes//sample.frame_width)
+        return data
+
+    def steal_voices(self,voices) :
+        """Expects [start, stop, pitch, velocity] voices sorted by start. Whenever a voice would go over the polyphony limit, cuts the oldest sounding voice off where the new one starts."""
+        if self._max_voices == None :
+            return
+        sounding = []
+        for voice in voices :
+            sounding = [other for other in sounding if other[1] > voice[0]]
+            if len(sounding) >= self._max_voices :
+                oldest = sounding.pop(0)
+                oldest[1] = max(oldest[0],voice[0])
+            sounding.append(voice)
+
+
+class RenderSession(object) :
+    """This class keeps a rendered melody in memory so that inserting, moving, retuning or deleting a note only re-mixes the frames that note covers, rather than the whole piece.
+    Voice stealing is not applied, since cutting off one note would change how every later note sounds."""
+
+    def __init__(self,note_table,tempo=60000/350.0,release=0,fade=0,accompaniment=None) :
+        """Expects a note table, a tempo or TempoMap and the release and fade used by Scheduler. An accompaniment audio segment, if given, is mixed in underneath the notes."""
+        self._scheduler = Scheduler(note_table,tempo,release,fade)
+        self._accompaniment = accompaniment
+        self._rhythm_dict = {"eighth" : .5,"quarter" : 1,"half" : 2,"whole" : 4}
+        self._template = None
+
+        #Notes are kept by id as [onset, duration, pitch, velocity, start, stop, data, end], and their start frames are kept sorted so that the notes near a frame can be found quickly
+        #End is the later of the frame where the note's written duration ends and where it stops sounding. Ends are kept sorted so the length of the piece is always the last one.
+        self._notes = {}
+        self._starts = []
+        self._ends = []
+        self._next_id = 0
+        self._longest = 0
+
+        self._buffer = bytearray()
+        self._dirty = []
+        self._last_dirty = []
+
+    def get_template(self) :
+        """Returns an empty audio segment in the format of the rendered audio."""
+        if self._template == None :
+            self._template = self._scheduler.get_template()
+            if self._accompaniment != None : #Match the accompaniment to the notes so the two can be mixed directly
+                self._accompaniment = self._accompaniment.set_frame_rate(self._template.frame_rate).set_channels(self._template.channels).set_sample_width(self._template.sample_width)
+        return self._template
+
+    def add_melody(self,note_rhythm_pairs,onset=0,velocity=1.0) :
+        """Inserts each pitch and rhythm pair of a melody in turn, starting at onset. Returns the list of new note ids."""
+        note_ids = []
+        for [pitch,rhythm] in note_rhythm_pairs :
+            duration = self._rhythm_dict[rhythm]
+            note_ids.append(self.insert_note(onset,duration,pitch,velocity))
+            onset += duration
+        return note_ids
+
+    def insert_note(self,onset,duration,pitch,velocity=1.0) :
+        """Adds a note starting at onset and lasting for duration beats, and returns its id."""
+        note_id = self._next_id
+        self._next_id += 1
+        self._place(note_id,onset,duration,pitch,velocity)
+        return note_id
+
+    def edit_note(self,note_id,onset=None,duration=None,pitch=None,velocity=None) :
+        """Changes any of the onset, duration, pitch or velocity of a note."""
+        [old_onset,old_duration,old_pitch,old_velocity,start,stop,data,end] = self._remove(note_id)
+        self._place(note_id,old_onset if onset == None else onset,old_duration if duration == None else duration,old_pitch if pitch == None else pitch,old_velocity if velocity == None else velocity)
+
+    def delete_note(self,note_id) :
+        """Removes a note."""
+        self._remove(note_id)
+
+    def get_note(self,note_id) :
+        """Returns the onset, duration, pitch and velocity of a note."""
+        return tuple(self._notes[note_id][:4])
+
+    def get_note_ids(self) :
+        """Returns the ids of every note, in order of onset."""
+        return [note_id for [start,note_id] in self._starts]
+
+    def get_last_dirty_range(self) :
+        """Returns the [start, stop] frame ranges re-mixed by the last render."""
+        return self._last_dirty
+
+    def render(self) :
+        """Re-mixes every range touched since the last render, in place, and returns the [start, stop] frame ranges re-mixed. The cost depends only on the notes changed, not the length of the piece; use get_audio for the audio itself."""
+        template = self.get_template()
+        length = self.length()
+        old_length = len(self._buffer)//template.frame_width
+        if length > old_length :
+            self._buffer.extend(bytes((length-old_length)*template.frame_width))
+            self._dirty.append([old_length,length])
+        elif length < old_length :
+            del self._buffer[length*template.frame_width:]
+
+        self._last_dirty = []
+        for [start,stop] in sorted(self._dirty) :
+            start = max(0,start)
+            stop = min(stop,length)
+            if start >= stop :
+                continue
+            if self._last_dirty and start <= self._last_dirty[-1][1] : #Merge with the previous range
+                self._last_dirty[-1][1] = max(self._last_dirty[-1][1],stop)
+            else :
+                self._last_dirty.append([start,stop])
+        self._dirty = []
+        for [start,stop] in self._last_dirty :
+            self.mix(start,stop)
+        return self._last_dirty
+
+    def get_audio(self,start=0,stop=None) :
+        """Returns the frames from start to stop (the end of the piece by default) as rendered so far, as an audio segment. Only those frames are copied."""
+        template = self.get_template()
+        if stop == None :
+            stop = len(self._buffer)//template.frame_width
+        return template._spawn(bytes(self._buffer[start*template.frame_width:stop*template.frame_width]))
+
+    def length(self) :
+        """Returns the length of the rendered piece in frames."""
+        length = self._ends[-1] if self._ends else 0
+        if self._accompaniment != None :
+            length = max(length,int(self._accompaniment.frame_count()))
+        return length
+
+    def mix(self,start,stop) :
+        """Rebuilds the frames from start to stop out of the accompaniment and every note sounding in that range."""
+        template = self.get_template()
+        frame_width = template.frame_width
+        buffer = self._buffer
+        accompaniment = b""
+        if self._accompaniment != None :
+            accompaniment = self._accompaniment.raw_data[start*frame_width:stop*frame_width]
+        buffer[start*frame_width:stop*frame_width] = accompaniment+bytes((stop-start)*frame_width-len(accompaniment))
+
+        #Only notes starting less than the longest note before the range can reach into it
+        first = bisect_left(self._starts,[start-self._longest,-1])
+        last = bisect_left(self._starts,[stop,-1])
+        for [note_start,note_id] in self._starts[first:last] :
+            note = self._notes[note_id]
+            note_stop = note[5]
+            if note_stop <= start :
+                continue
+            offset = max(note_start,start)
+            end = min(note_stop,stop)
+            section = note[6][(offset-note_start)*frame_width:(end-note_start)*frame_width]
+            position = offset*frame_width
+            buffer[position:position+len(section)] = audioop.add(bytes(buffer[position:position+len(section)]),section,template.sample_width) #Overlap-add in place
+
+    def _place(self,note_id,onset,duration,pitch,velocity) :
+        """Renders a note and marks the frames it covers as needing to be re-mixed."""
+        [start,stop] = self._scheduler.voice_frames(onset,duration,pitch)
+        data = self._scheduler.voice_data(start,stop,pitch,velocity)
+        end = max(self._scheduler.frame(onset+duration,self.get_template().frame_rate),stop)
+        self._notes[note_id] = [onset,duration,pitch,velocity,start,stop,data,end]
+        insort(self._starts,[start,note_id])
+        insort(self._ends,end)
+        self._longest = max(self._longest,stop-start)
+        self._dirty.append([start,stop])
+
+    def _remove(self,note_id) :
+        """Takes a note out of the session, marking the frames it covered as needing to be re-mixed, and returns it."""
+        note = self._notes.pop(note_id)
+        del self._starts[bisect_left(self._starts,[note[4],note_id])]
+        del self._ends[bisect_left(self._ends,note[7])]
+        self._dirty.append([note[4],note[5]])
+        return note
+
+
+class AccompanimentCache(object) :
+    """This class keeps rendered chord progression tracks, so that progressions which come up again are not rebuilt."""
+
+    def __init__(self,max_entries=32,cache_dir=None) :
+        """Sets the number of tracks kept in memory and, optionally, a folder in which tracks are also saved between runs."""
+        self._max_entries = max_entries
+        self._cache_dir = cache_dir
+        if cache_dir != None and not os.path.isdir(cache_dir) :
+            os.makedirs(cache_dir)
+
+        #Tracks in order of use, least recently used first
+        self._tracks = OrderedDict()
+
+        #Lookup statistics
+        self._hits = 0
+        self._misses = 0
+
+    def cache_key(self,key,chord_list,sample_length,crossfade,timing=None,quality="full") :
+        """Returns the key under which a track is stored. Timing identifies how chords are placed, e.g. the key of a tempo map."""
+        if isinstance(sample_length,list) :
+            sample_length = tuple(sample_length)
+        if quality != "full" :
+            return (key,tuple(chord_list),sample_length,crossfade,timing,quality)
+        return (key,tuple(chord_list),sample_length,crossfade,timing)
+
+    def get(self,cache_key) :
+        """Returns the stored track, or None if it has not been rendered."""
+        if cache_key in self._tracks :
+            self._hits += 1
+            track = self._tracks.pop(cache_key)
+            self._tracks[cache_key] = track #Mark as most recently used
+            return track
+        if self._cache_dir != None and os.path.isfile(self.path(cache_key)) :
+            self._hits += 1
+            track = AudioSegment.from_file(self.path(cache_key),format="wav")
+            self._remember(cache_key,track)
+            return track
+        self._misses += 1
+        return None
+
+    def put(self,cache_key,track) :
+        """Stores a rendered track."""
+        self._remember(cache_key,track)
+        if self._cache_dir != None :
+            track.export(self.path(cache_key),format="wav").close()
+
+    def path(self,cache_key) :
+        """Returns the file in the cache folder used for a track."""
+        return os.path.join(self._cache_dir,hashlib.sha1(repr(cache_key).encode("utf-8")).hexdigest()+".wav")
+
+    def _remember(self,cache_key,track) :
+        """Adds a track to memory, evicting the least recently used tracks once the bound is reached."""
+        self._tracks[cache_key] = track
+        while len(self._tracks) > self._max_entries :
+            self._tracks.popitem(last=False)
+
+    def hit_rate(self) :
+        """Returns the fraction of lookups that were served without rendering."""
+        lookups = self._hits + self._misses
+        if lookups == 0 :
+            return 0.0
+        return self._hits / float(lookups)
+
+    def __len__(self) :
+        """Returns the number of tracks held in memory."""
+        return len(self._tracks)
+
+
+class ChordTrackBuilder(object) :
+    """This class builds a crossfaded chord track in one pass, writing every chord straight into a single preallocated buffer."""
+
+    def __init__(self,chord_loader) :
+        """Expects a function returning the audio segment for a given chord and duration, e.g. Sinatra.chord."""
+        self._chord_loader = chord_loader
+
+        #Raw audio data for each chord, and each (chord, sample length) with its edges already faded in and out
+        self._chords = {}
+        self._faded_chords = {}
+        self._template = None
+
+    def build(self,chord_list,sample_length,crossfade=100,starts=None) :
+        """Returns an audio segment playing each chord for sample_length milliseconds (or, if sample_length is a list, the matching length for each chord), with each pair of neighbouring chords crossfaded over crossfade milliseconds.
+        Chords follow each other directly unless starts gives the starting time of each chord in milliseconds.
+        Chords are placed at exact frame positions. A chain of AudioSegment.append(crossfade=...) calls places each join by the track length rounded to whole milliseconds, so there each chord may start up to one frame later per join than here.
+        Once each chord is realigned by that offset, the two tracks are the same outside the crossfades, and within them differ only by the fade ramps falling one frame apart."""
+        if not isinstance(sample_length,list) :
+            sample_length = [sample_length]*len(chord_list)
+
+        #Work out every chord's placement in frames before writing anything
+        (start_frames,fade_frames,total_frames) = self.placement(chord_list,sample_length,crossfade,starts)
+        frame_width = self._template.frame_width
+        track = bytearray(total_frames*frame_width)
+        written = 0 #End of the audio written so far
+        for x in range(len(chord_list)) :
+            fade_in = x > 0
+            fade_out = x < len(chord_list)-1
+            data = self.faded_chord_data(chord_list[x],sample_length[x],fade_frames,fade_in,fade_out)
+            start = start_frames[x]*frame_width
+            end = start + len(data)
+            #Mix the start of this chord into the end of the previous one, then write the rest of it directly
+            overlap = max(0,min(written,end)-start)
+            if overlap :
+                track[start:start+overlap] = audioop.add(bytes(track[start:start+overlap]),data[:overlap],self._template.sample_width)
+            track[start+overlap:end] = data[overlap:]
+            written = max(written,end)
+        return self._template._spawn(bytes(track))
+
+    def placement(self,chord_list,sample_length,crossfade=100,starts=None) :
+        """Returns (start frames, fade frames, total frames) for a track built from the given chords, with sample_length given as a list (see build)."""
+        self.chord_data(chord_list[0],sample_length[0])
+        chord_frames = [len(self.chord_data(chord_list[x],sample_length[x]))//self._template.frame_width for x in range(len(chord_list))]
+        fade_frames = min(int(self._template.frame_count(ms=crossfade)),min(chord_frames)//2)
+        if starts == None :
+            start_frames = [0]
+            for frames in chord_frames[:-1] :
+                start_frames.append(start_frames[-1]+frames-fade_frames)
+        else :
+            start_frames = [int(round(self._template.frame_count(ms=start))) for start in starts]
+        return (start_frames,fade_frames,max(start_frames[x]+chord_frames[x] for x in range(len(chord_list))))
+
+    def frame_count(self,chord_list,sample_length,crossfade=100,starts=None) :
+        """Returns the number of frames build would give for the same arguments, without writing the track."""
+        if not isinstance(sample_length,list) :
+            sample_length = [sample_length]*len(chord_list)
+        return self.placement(chord_list,sample_length,crossfade,starts)[2]
+
+    def get_template(self,chord="C") :
+        """Returns an empty audio segment in the format of the built tracks, loading the given chord if no chord has been loaded yet."""
+        if self._template == None :
+            self.chord_data(chord,0)
+        return self._template
+
+    def chord_data(self,chord,sample_length) :
+        """Returns the raw audio data for a chord with a given duration. Each chord is only loaded once, and then sliced to any length."""
+        if chord not in self._chords :
+            segment = self._chord_loader(chord,None)
+            #All chords are converted to the format of the first chord loaded
+            if self._template == None :
+                self._template = segment[:0]
+            else :
+                segment = segment.set_channels(self._template.channels).set_frame_rate(self._template.frame_rate).set_sample_width(self._template.sample_width)
+            self._chords[chord] = segment.raw_data
+        return self._chords[chord][:int(self._template.frame_count(ms=sample_length))*self._template.frame_width]
+
+    def stream_chord(self,chord,sample_length,crossfade=100,fade_in=True) :
+        """Returns an audio segment for one chord of a track built a chord at a time, faded out over its last crossfade milliseconds, and in over its first if fade_in is True, to crossfade with its neighbours.
+        Unlike build, nothing is kept for each sample length, so memory stays bounded however the lengths vary."""
+        data = self.chord_data(chord,sample_length)
+        fade_frames = min(int(self._template.frame_count(ms=crossfade)),len(data)//self._template.frame_width//2)
+        fade_bytes = fade_frames*self._template.frame_width
+        if fade_bytes :
+            if fade_in :
+                data = self.ramp(data[:fade_bytes],fade_frames,-120,0) + data[fade_bytes:]
+            data = data[:-fade_bytes] + self.ramp(data[-fade_bytes:],fade_frames,0,-120)
+        return self._template._spawn(data)
+
+    def faded_chord_data(self,chord,sample_length,fade_frames,fade_in,fade_out) :
+        """Returns the raw audio data for a chord with its first and/or last fade_frames frames faded."""
+        key = (chord,sample_length,fade_frames,fade_in,fade_out)
+        if key not in self._faded_chords :
+            data = self.chord_data(chord,sample_length)
+            fade_bytes = fade_frames*self._template.frame_width
+            if fade_bytes and fade_in :
+                data = self.ramp(data[:fade_bytes],fade_frames,-120,0) + data[fade_bytes:]
+            if fade_bytes and fade_out :
+                data = data[:-fade_bytes] + self.ramp(data[-fade_bytes:],fade_frames,0,-120)
+            self._faded_chords[key] = data
+        return self._faded_chords[key]
+
+    def ramp(self,data,fade_frames,from_gain,to_gain) :
+        """Applies a linear (equal gain) fade between two gains in dB to raw audio data, in blocks of frames as in AudioSegment.fade (see ramp_data)."""
+        return ramp_data(data,self._template,fade_frames,from_gain,to_gain)
+
+    def __len__(self) :
+        """Returns the number of chord samples held by the builder."""
+        return len(self._chords)
+
+
+#Note tables shared by every voice rendered in a worker process, for each (sample folder, frame rate, channels)
+_worker_note_tables = {}
+
+
+def render_voice_data(voice) :
+    """Renders a (melody, render settings) voice in a worker process. Returns the raw audio data, its format and the time taken in seconds."""
+    melody,settings = voice
+    table_settings = settings["note_table"]
+    table_key = (table_settings["sample_dir"],table_settings["frame_rate"],table_settings["channels"])
+    if table_key not in _worker_note_tables :
+        _worker_note_tables[table_key] = NoteTable(**table_settings)
+    start = time.time()
+    scheduler = Scheduler(_worker_note_tables[table_key],settings["tempo"],settings["release"],settings["fade"],settings["max_voices"])
+    scheduler.add_melody(melody)
+    segment = scheduler.render()
+    return segment.raw_data,segment.sample_width,segment.frame_rate,segment.channels,time.time()-start
@@ -0,0 +1,244 @@
+"""
+filename: search.py
+
+Searching and deduplicating melodies. SeedSearch scans ranges of seeds
+across worker processes for melodies matching a MelodyQuery, and
+MelodyIndex finds exact and near duplicates of melodies already seen.
+"""
+import os
+import time
+import zlib
+import hashlib
+from multiprocessing import Pool
+from random import Random
+from theory import KEY_PITCHES, pitch_number
+from batch import BatchComposer
+
+
+class MelodyQuery(object) :
+    """This class describes the melodies wanted from a seed search. A melody matches if it meets every criterion given."""
+
+    def __init__(self,key=None,progression=None,lowest=None,highest=None,interval_counts=None,motif=None,predicate=None) :
+        """Sets the criteria:
+        key and progression - the key and chord progression (a list of roman numerals) Mozart chose
+        lowest and highest - pitch names the melody must stay within
+        interval_counts - a dictionary from interval in scale steps (positive up, negative down, 0 for a repeat) to the least number of times it must occur
+        motif - a list of pitch names that must occur in a row somewhere in the melody
+        predicate - a function taking the key, progression and list of pitch and rhythm pairs, returning True for a match. When searching in worker processes it must be defined at module level."""
+        self._key = key
+        self._progression = progression
+        self._lowest = pitch_number(lowest)[0] if lowest != None else None
+        self._highest = pitch_number(highest)[0] if highest != None else None
+        self._interval_counts = interval_counts
+        self._motif = [pitch_number(pitch)[0] for pitch in motif] if motif != None else None
+        self._predicate = predicate
+        self._rhythm_names = {1 : "eighth",2 : "quarter",4 : "half",8 : "whole"}
+
+        #MIDI number of each scale degree, for each key
+        self._numbers = dict((key,dict((degree,pitch_number(pitch)[0]) for (degree,pitch) in KEY_PITCHES[key].items())) for key in KEY_PITCHES)
+
+    def matches(self,key,prog,degrees,eighths) :
+        """Returns True if a melody, given as scale degrees and lengths in eighth notes, meets every criterion. The cheapest checks are made first."""
+        if self._key != None and key != self._key :
+            return False
+        if self._progression != None and list(prog) != list(self._progression) :
+            return False
+        if self._lowest != None or self._highest != None or self._motif != None :
+            numbers = [self._numbers[key][degree] for degree in degrees]
+            if self._lowest != None and min(numbers) < self._lowest :
+                return False
+            if self._highest != None and max(numbers) > self._highest :
+                return False
+            if self._motif != None and not any(numbers[x:x+len(self._motif)] == self._motif for x in range(len(numbers)-len(self._motif)+1)) :
+                return False
+        if self._interval_counts != None :
+            counts = {}
+            for x in range(len(degrees)-1) :
+                interval = degrees[x+1]-degrees[x]
+                counts[interval] = counts.get(interval,0)+1
+            for interval in self._interval_counts :
+                if counts.get(interval,0) < self._interval_counts[interval] :
+                    return False
+        if self._predicate != None :
+            pitches = KEY_PITCHES[key]
+            return bool(self._predicate(key,prog,[[pitches[degrees[x]],self._rhythm_names[eighths[x]]] for x in range(len(degrees))]))
+        return True
+
+
+class SeedSearch(object) :
+    """This class scans a range of seeds for melodies matching a MelodyQuery. Melodies are composed with BatchComposer, so each matching seed gives the same melody when passed to Mozart, and nothing is rendered or notated.
+    Seeds are scanned in chunks across a pool of worker processes, and the matches can be written to an index file."""
+
+    def __init__(self,query,melody_type="broken_chord",workers=None,chunk_size=5000) :
+        """Sets the query, the Mozart melody method ("broken_chord" or "stepwise"), the number of worker processes (by default one per core, or 1 to search in this process) and the number of seeds given to a worker at a time."""
+        self._query = query
+        self._melody_type = melody_type
+        self._workers = workers
+        self._chunk_size = chunk_size
+        self._stats = {}
+
+    def run(self,start,stop,index_file=None) :
+        """Scans the seeds from start up to stop and returns the matches as (seed, key, progression) in seed order.
+        If index_file is given, the matches are also written to it, one tab separated line per seed."""
+        jobs = [(self._query,self._melody_type,chunk_start,min(chunk_start+self._chunk_size,stop)) for chunk_start in range(start,stop,self._chunk_size)]
+        begin = time.time()
+        if self._workers == 1 :
+            results = [search_seed_range(job) for job in jobs]
+        else :
+            pool = Pool(self._workers)
+            try :
+                results = pool.map(search_seed_range,jobs)
+            finally :
+                pool.close()
+        elapsed = time.time() - begin
+        matches = [match for (chunk_matches,seconds) in results for match in chunk_matches]
+        worker_seconds = sum(seconds for (chunk_matches,seconds) in results)
+        if index_file != None :
+            with open(index_file,"w") as index :
+                index.write("#seed\tkey\tprogression (%s melodies)\n" % self._melody_type)
+                for (seed_num,key,prog) in matches :
+                    index.write("%d\t%s\t%s\n" % (seed_num,key,"-".join(prog)))
+        seeds = max(0,stop-start)
+        self._stats = {"seeds" : seeds,"matches" : len(matches),"seconds" : elapsed,
+                       "seeds per second" : seeds/elapsed if elapsed else 0.0,
+                       "seeds per second per core" : seeds/worker_seconds if worker_seconds else 0.0}
+        return matches
+
+    def get_stats(self) :
+        """Returns the number of seeds scanned and matched in the last run, how long it took, and the scan rate overall and per core (from the time each worker spent composing and matching)."""
+        return self._stats
+
+    @staticmethod
+    def read_index(index_file) :
+        """Returns the (seed, key, progression) matches written to an index file."""
+        matches = []
+        with open(index_file) as index :
+            for line in index :
+                if line.startswith("#") or not line.strip() :
+                    continue
+                seed_num,key,prog = line.rstrip("\n").split("\t")
+                matches.append((int(seed_num),key,prog.split("-")))
+        return matches
+
+
+def search_seed_range(job) :
+    """Composes the melodies for a (query, melody type, start, stop) range of seeds, in a worker process. Returns the matching (seed, key, progression) and the time taken in seconds."""
+    query,melody_type,start,stop = job
+    begin = time.time()
+    batch = BatchComposer().compose(range(start,stop),melody_type)
+    degrees,eighths,measures,offsets = batch.get_arrays()
+    seeds = batch.get_seeds()
+    keys = batch.get_keys()
+    progressions = batch.get_progressions()
+    matches = []
+    for x in range(len(batch)) :
+        if query.matches(keys[x],progressions[x],degrees[offsets[x]:offsets[x+1]],eighths[offsets[x]:offsets[x+1]]) :
+            matches.append((seeds[x],keys[x],progressions[x]))
+    return matches,time.time()-begin
+
+
+class MelodyIndex(object) :
+    """This class remembers every melody added to it, so that duplicates can be skipped before they are rendered or stored.
+    Exact duplicates are found by a hash of the key, progression and pitch and rhythm sequence. Near duplicates are found by a MinHash fingerprint of the melody's runs of intervals and rhythms, with locality sensitive hashing, so both lookups take constant time.
+    If a file is given, entries are appended to it as they are added and loaded from it again in later runs."""
+
+    def __init__(self,filename=None,near_duplicates=True,threshold=0.5,shingle_length=3,bands=16,rows=2) :
+        """Sets the index file, whether to look for near duplicates, the estimated similarity (0 to 1) above which a melody counts as a near duplicate,
+        the number of notes in each run used for the fingerprint, and the number of bands and rows per band the fingerprint is split into for hashing."""
+        self._filename = filename
+        self._near_duplicates = near_duplicates
+        self._threshold = threshold
+        self._shingle_length = shingle_length
+        self._bands = bands
+        self._rows = rows
+
+        #Fixed hash functions, so that fingerprints match between runs
+        self._prime = 2**61-1
+        generator = Random(1729)
+        self._hash_parameters = [(generator.randrange(1,self._prime),generator.randrange(self._prime)) for x in range(bands*rows)]
+
+        self._digests = {} #Content hash -> name of the first melody with it
+        self._fingerprints = {} #Name -> fingerprint
+        self._buckets = {} #(band, band of a fingerprint) -> names
+
+        #Lookup statistics
+        self._exact = 0
+        self._near = 0
+
+        if filename != None and os.path.isfile(filename) :
+            with open(filename) as index :
+                for line in index :
+                    digest,name,fingerprint = line.rstrip("\n").split("\t")
+                    self.remember(digest,name,[int(value) for value in fingerprint.split(",")] if fingerprint else None)
+
+    def canonical(self,key,prog,note_rhythm_pairs) :
+        """Returns the canonical text of a melody that the content hash is taken from. Pitches are written as MIDI numbers, so enharmonic spellings are equal."""
+        return "%s|%s|%s" % (key,"-".join(prog),",".join("%d:%s" % (pitch_number(pitch)[0],rhythm) for [pitch,rhythm] in note_rhythm_pairs))
+
+    def digest(self,key,prog,note_rhythm_pairs) :
+        """Returns the content hash of a melody."""
+        return hashlib.sha1(self.canonical(key,prog,note_rhythm_pairs).encode("utf-8")).hexdigest()
+
+    def fingerprint(self,note_rhythm_pairs) :
+        """Returns the MinHash fingerprint of a melody's runs of intervals and rhythms, or None if the melody is too short to have any.
+        Using intervals means a melody moved to another key or octave has the same fingerprint."""
+        numbers = [pitch_number(pitch)[0] for [pitch,rhythm] in note_rhythm_pairs]
+        tokens = ["%d:%s" % (numbers[x]-numbers[x-1] if x else 0,note_rhythm_pairs[x][1]) for x in range(len(note_rhythm_pairs))]
+        shingles = set(zlib.crc32(",".join(tokens[x:x+self._shingle_length]).encode("utf-8")) for x in range(len(tokens)-self._shingle_length+1))
+        if not shingles :
+            return None
+        return [min((a*shingle+b) % self._prime for shingle in shingles) for (a,b) in self._hash_parameters]
+
+    def similarity(self,fingerprint_1,fingerprint_2) :
+        """Returns the estimated similarity of two melodies - the fraction of their fingerprints that agree."""
+        return sum(1 for x in range(len(fingerprint_1)) if fingerprint_1[x] == fingerprint_2[x]) / float(len(fingerprint_1))
+
+    def lookup(self,key,prog,note_rhythm_pairs) :
+        """Returns ("exact", name) or ("near", name) for a melody already in the index, or None if it is new."""
+        digest = self.digest(key,prog,note_rhythm_pairs)
+        if digest in self._digests :
+            self._exact += 1
+            return ("exact",self._digests[digest])
+        if self._near_duplicates :
+            fingerprint = self.fingerprint(note_rhythm_pairs)
+            if fingerprint != None :
+                for band in range(self._bands) :
+                    for name in self._buckets.get(self.band(fingerprint,band),[]) :
+                        if self.similarity(fingerprint,self._fingerprints[name]) >= self._threshold :
+                            self._near += 1
+                            return ("near",name)
+        return None
+
+    def add(self,key,prog,note_rhythm_pairs,name) :
+        """Adds a melody under a name (e.g. its seed), appending it to the index file."""
+        digest = self.digest(key,prog,note_rhythm_pairs)
+        fingerprint = self.fingerprint(note_rhythm_pairs) if self._near_duplicates else None
+        self.remember(digest,str(name),fingerprint)
+        if self._filename != None :
+            with open(self._filename,"a") as index :
+                index.write("%s\t%s\t%s\n" % (digest,name,",".join(str(value) for value in fingerprint) if fingerprint != None else ""))
+
+    def remember(self,digest,name,fingerprint) :
+        """Adds an entry to the lookup tables."""
+        if digest not in self._digests :
+            self._digests[digest] = name
+        if fingerprint != None and len(fingerprint) == self._bands*self._rows :
+            self._fingerprints[name] = fingerprint
+            for band in range(self._bands) :
+                self._buckets.setdefault(self.band(fingerprint,band),[]).append(name)
+
+    def band(self,fingerprint,band) :
+        """Returns the bucket key for one band of a fingerprint."""
+        return (band,tuple(fingerprint[band*self._rows:(band+1)*self._rows]))
+
+    def get_stats(self) :
+        """Returns the number of melodies held and the exact and near duplicates found by lookups."""
+        return {"melodies" : len(self._digests),"exact duplicates" : self._exact,"near duplicates" : self._near}
+
+    def __len__(self) :
+        """Returns the number of distinct melodies in the index."""
+        return len(self._digests)
+
+    def __contains__(self,digest) :
+        """Returns True if a content hash is in the index."""
+        return digest in self._digests
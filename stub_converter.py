@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+filename: stub_converter.py
+
+A stand-in for ffmpeg/avconv that understands just enough of the command
+lines pydub builds to copy its input to its output unchanged. Point
+AudioSegment.converter at this file to run the export and decode paths on
+machines without ffmpeg, e.g.
+
+    AudioSegment.converter = os.path.abspath("stub_converter.py")
+
+Like ffmpeg it reads "pipe:0" from stdin and writes "pipe:1" to stdout,
+refuses to write the mp4 family of formats to a pipe, and fails with a
+non-zero exit code for output formats it doesn't know.
+"""
+import sys
+
+OUTPUT_FORMATS = ["wav","mp3","ogg","flac","adts","mp4","m4a","ipod","mov","3gp","3g2"]
+SEEKABLE_FORMATS = ["mp4","m4a","ipod","mov","3gp","3g2"]
+
+
+def parse(args) :
+    """Returns the input, output and output format named in an ffmpeg style argument list."""
+    source = None
+    output_format = None
+    x = 0
+    while x < len(args) - 1 :
+        if args[x] == "-i" :
+            source = args[x+1]
+            output_format = None
+            x += 2
+        elif args[x] == "-f" :
+            output_format = args[x+1]
+            x += 2
+        else :
+            x += 1
+    return source,args[-1],output_format
+
+
+def main(args) :
+    """Copies the input to the output, returning the exit code."""
+    source,output,output_format = parse(args)
+    if source == None :
+        sys.stderr.write("stub_converter: no input given\n")
+        return 1
+    if output_format != None and output_format not in OUTPUT_FORMATS :
+        sys.stderr.write("stub_converter: unknown output format '%s'\n" % output_format)
+        return 1
+    if output == "pipe:1" and output_format in SEEKABLE_FORMATS :
+        sys.stderr.write("stub_converter: muxer does not support non seekable output\n")
+        return 1
+
+    if source == "pipe:0" :
+        data = sys.stdin.buffer.read()
+    else :
+        with open(source,"rb") as f :
+            data = f.read()
+
+    if output == "pipe:1" :
+        sys.stdout.buffer.write(data)
+        sys.stdout.buffer.flush()
+    else :
+        with open(output,"wb") as f :
+            f.write(data)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
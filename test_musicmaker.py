@@ -0,0 +1,721 @@
+"""
+filename: test_musicmaker.py
+
+Checks that the faster composing and rendering paths give the same results as the simple ones they replace. Run with python -m pytest.
+"""
+import io
+import itertools
+import math
+import os
+import random
+import subprocess
+import sys
+import wave
+import pytest
+from pydub import AudioSegment, audio_segment, playback, utils
+from pydub.utils import audioop, pan_gains
+from MusicMaker import Mozart, Sinatra
+from arrangement import FormRenderer, SongForm
+from batch import BatchComposer, BatchRenderer, MelodyBatch
+from composition import MelodyConstraints, MelodyModel
+from fitness import WeightedFitness, chord_tone_fitness, contour_fitness, rhythm_variety_fitness, voice_leading_fitness
+from melody import Melody
+from rendering import DRAFT_FRAME_RATE, AccompanimentCache, ChordTrackBuilder, NoteTable, RenderSession, Scheduler, TempoMap
+from search import MelodyIndex, MelodyQuery, SeedSearch
+import theory
+from theory import KEY_PITCHES
+
+
+def test_24_bit_round_trip() :
+    frames = bytes(random.Random(0).getrandbits(8) for x in range(3*2*1000))
+    wav_file = io.BytesIO()
+    wave_data = wave.open(wav_file,"wb")
+    wave_data.setnchannels(2)
+    wave_data.setsampwidth(3)
+    wave_data.setframerate(44100)
+    wave_data.writeframes(frames)
+    wave_data.close()
+    wav_file.seek(0)
+
+    segment = AudioSegment.from_file(wav_file,format="wav")
+    assert segment.sample_width == 4
+    exported = segment.export(io.BytesIO(),format="wav",sample_width=3)
+    exported.seek(0)
+    wave_data = wave.open(exported,"rb")
+    assert wave_data.getsampwidth() == 3
+    assert wave_data.readframes(wave_data.getnframes()) == frames
+    assert segment.export(format="raw",sample_width=3).read() == frames
+
+
+def test_24_bit_expansion_matches_per_sample_padding() :
+    #The loop AudioSegment used before: each sample gets a sign byte written in front of it
+    frames = bytes(random.Random(1).getrandbits(8) for x in range(3*500))
+    expected = b"".join((b"\xff" if frames[x+2] > 0x7f else b"\x00")+frames[x:x+3] for x in range(0,len(frames),3))
+    segment = AudioSegment(data=frames,sample_width=3,frame_rate=8000,channels=1)
+    assert segment.raw_data == expected
+
+
+def mozart_melody(seed_num,melody_type) :
+    """Returns the melody Mozart composes from a seed, choosing its own key and progression."""
+    m = Mozart(seed_num)
+    m.choose_key()
+    m.choose_progression()
+    if melody_type == "broken_chord" :
+        m.broken_chord_melody(m.get_key(),m.get_progression())
+    else :
+        #stepwise_melody starts over by calling itself, which runs deeper than the default limit for some seeds
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(20000)
+        try :
+            m.stepwise_melody(m.get_key(),m.get_progression())
+        finally :
+            sys.setrecursionlimit(limit)
+    return m.get_melody()
+
+
+@pytest.mark.parametrize("melody_type",["broken_chord","stepwise"])
+def test_batch_composer_matches_mozart(melody_type) :
+    seeds = range(100)
+    batch = BatchComposer().compose(seeds,melody_type)
+    for x in range(len(batch)) :
+        assert batch.melody(x) == mozart_melody(seeds[x],melody_type)
+
+
+@pytest.mark.parametrize("options",[{"key" : "Am"},{"key" : "G","progression" : ["I","V7","vi","iii","IV"]},{"cadence" : False}])
+def test_batch_composer_options_match_mozart(options) :
+    seeds = list(range(100))+[2**40,"seed",-7]
+    batch = BatchComposer().compose(seeds,**options)
+    for x in range(len(batch)) :
+        m = Mozart(seeds[x])
+        m.choose_key(options.get("key"))
+        m.choose_progression(options.get("progression"))
+        m.broken_chord_melody(m.get_key(),m.get_progression(),options.get("cadence",True))
+        assert (batch.get_keys()[x],batch.get_progressions()[x],batch.melody(x)) == (m.get_key(),m.get_progression(),m.get_melody())
+
+
+@pytest.mark.parametrize("melody_type",["broken_chord","stepwise"])
+def test_melody_round_trips_mozart_melodies(melody_type) :
+    for seed_num in range(20) :
+        pairs = mozart_melody(seed_num,melody_type)
+        assert Melody.from_pairs(pairs).to_pairs() == pairs
+
+
+def test_melody_keeps_spelling_and_timing() :
+    pairs = [["E#4","eighth"],["Cb4","eighth"],["Bb3","quarter"],["F#4","half"],["C5","whole"]]
+    melody = Melody.from_pairs(pairs,ticks_per_beat=4)
+    assert melody.to_pairs() == pairs
+    assert [(note.get_pitch(),note.get_onset(),note.get_duration(),note.get_rhythm()) for note in melody] == [(65,0,2,"eighth"),(59,2,2,"eighth"),(58,4,4,"quarter"),(66,8,8,"half"),(72,16,16,"whole")]
+    assert melody[-1].get_name() == "C5"
+    assert melody.count_list() == [1,1.5,2,3,1]
+    assert melody.measure_starts() == [True,False,False,False,True]
+
+
+def test_melody_count_list_matches_mozart() :
+    m = Mozart(3)
+    m.choose_key()
+    m.choose_progression()
+    m.broken_chord_melody(m.get_key(),m.get_progression())
+    assert m.to_melody().count_list() == m.get_count_list()
+
+
+def test_melody_with_gaps_has_no_pairs() :
+    melody = Melody(ticks_per_beat=4)
+    melody.append("C4",4)
+    melody.append("D4",4,onset=6)
+    with pytest.raises(ValueError) :
+        melody.to_pairs()
+
+
+def test_shipped_theory_tables_match_build_tables() :
+    assert list(theory._build_tables()) == [theory.KEY_PITCHES,theory.KEY_CHORDS,theory.KEY_CHORD_DEGREES,theory.KEY_SIGNATURES,theory.STAFF_POSITIONS]
+
+
+@pytest.mark.parametrize("tables",[None,"KEY_PITCHES = {}\n"])
+def test_theory_regenerates_missing_or_stale_tables(tmp_path,tables) :
+    here = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(here,"theory.py")) as source :
+        (tmp_path / "theory.py").write_text(source.read())
+    if tables != None :
+        (tmp_path / "theory_tables.py").write_text(tables)
+    else :
+        #Importing theory without the tables module builds them instead
+        command = "import theory; print(theory.KEY_CHORDS['Am']['V'], sorted(theory.chord_tone_classes('Am','V')))"
+        assert subprocess.check_output([sys.executable,"-c",command],cwd=str(tmp_path)).split() == [b"E",b"[2,",b"5]"]
+    subprocess.check_call([sys.executable,"theory.py"],cwd=str(tmp_path))
+    with open(os.path.join(here,"theory_tables.py")) as shipped :
+        assert (tmp_path / "theory_tables.py").read_text() == shipped.read()
+
+
+def test_theory_tables_cover_every_key() :
+    for key in theory.KEYS :
+        numerals = theory.MINOR_NUMERALS if theory.is_minor(key) else theory.MAJOR_NUMERALS
+        assert list(theory.KEY_CHORDS[key]) == numerals
+        assert theory.KEY_PITCHES[key][1] == theory.pitch_name(theory.tonic_number(key),"b" in key)
+        assert set(theory.KEY_PITCHES[key].values()) <= set(theory.STAFF_POSITIONS)
+    assert [theory.KEY_CHORDS["Db"]["ii"],theory.KEY_CHORDS["Am"]["V"],theory.KEY_CHORDS["F#m"]["VI"]] == ["Ebm","E","D"]
+    assert theory.KEY_PITCHES["Eb"][4] == "Ab4" and theory.KEY_PITCHES["Am"][-5] == "B3"
+    assert theory.KEY_CHORD_DEGREES["Am"]["i"] == [1,3,5,8]
+    assert [theory.KEY_SIGNATURES[key] for key in ["C","F#","Db","Am","Bbm"]] == [0,6,-5,0,-5]
+
+
+def trained_model(order,seeds) :
+    """Returns a compiled MelodyModel trained on the broken chord melodies Mozart composes from some seeds."""
+    model = MelodyModel(order)
+    for seed_num in seeds :
+        m = Mozart(seed_num)
+        m.choose_key()
+        m.choose_progression()
+        m.broken_chord_melody(m.get_key(),m.get_progression())
+        model.train(m.get_key(),m.get_progression(),m.get_melody())
+    model.compile()
+    return model
+
+
+def measure_pitches(melody,prog) :
+    """Returns the pitches of a melody in each measure, leaving out the cadence."""
+    eighths = {"eighth" : 1,"quarter" : 2,"half" : 4,"whole" : 8}
+    pitches = [[] for numeral in prog]
+    position = 0
+    for [pitch,rhythm] in melody[:-1] :
+        pitches[position//8].append(pitch)
+        position += eighths[rhythm]
+    assert position == 8*len(prog)
+    return pitches
+
+
+def test_markov_melody_uses_notes_heard_over_each_chord() :
+    #Every note backs off at worst to the chord alone, so its pitch was heard over that chord in training
+    prog = ["I","IV","V","vi"]
+    model = MelodyModel(3)
+    heard = dict((numeral,set()) for numeral in prog)
+    for seed_num in range(30) :
+        m = Mozart(seed_num)
+        m.choose_key("C")
+        m.choose_progression(prog)
+        m.broken_chord_melody("C",prog)
+        model.train("C",prog,m.get_melody())
+        for (numeral,pitches) in zip(prog,measure_pitches(m.get_melody(),prog)) :
+            heard[numeral].update(pitches)
+    model.compile()
+    for seed_num in range(30) :
+        m = Mozart(seed_num)
+        m.choose_key("C")
+        m.choose_progression(prog[::-1])
+        m.markov_melody("C",prog[::-1],model)
+        assert m.get_melody()[-1] == [m.tonic_pitch(),"whole"]
+        for (numeral,pitches) in zip(prog[::-1],measure_pitches(m.get_melody(),prog)) :
+            assert pitches and set(pitches) <= heard[numeral]
+
+
+def test_melody_model_draws_once_per_note() :
+    model = trained_model(2,range(50))
+    draws = []
+    def draw(n) :
+        draws.append(n)
+        return random.Random(len(draws)).randrange(n)
+    degrees,eighths,measures = model.notes("G",["I","V","vi","IV"],draw)
+    assert len(draws) == len(degrees)
+    assert measures[-1] == 3
+    for measure_num in range(4) :
+        assert sum(eighths[x] for x in range(len(degrees)) if measures[x] == measure_num) == 8
+    assert set(degrees) <= set(KEY_PITCHES["G"])
+
+
+def test_melody_model_train_batch_matches_train() :
+    model = trained_model(3,range(50))
+    batch_model = MelodyModel(3)
+    batch_model.train_batch(BatchComposer().compose(range(50),"broken_chord"))
+    batch_model.compile()
+    for seed_num in range(20) :
+        assert batch_model.notes("C",["I","IV","V"],random.Random(seed_num).randrange) == model.notes("C",["I","IV","V"],random.Random(seed_num).randrange)
+
+
+def test_melody_model_save_load_round_trip(tmp_path) :
+    model = trained_model(3,range(50))
+    model.save(str(tmp_path / "model.bin"))
+    loaded = MelodyModel.load(str(tmp_path / "model.bin"))
+    assert loaded.get_order() == 3
+    for key,prog in [("C",["I","V","vi","IV"]),("Am",["i","iv","V"])] :
+        for seed_num in range(20) :
+            assert loaded.notes(key,prog,random.Random(seed_num).randrange) == model.notes(key,prog,random.Random(seed_num).randrange)
+    (tmp_path / "other.bin").write_bytes(b"not a model\n")
+    with pytest.raises(ValueError) :
+        MelodyModel.load(str(tmp_path / "other.bin"))
+
+
+def test_untrained_melody_model_raises() :
+    with pytest.raises(ValueError) :
+        MelodyModel().notes("C",["I"],random.Random(0).randrange)
+
+
+@pytest.mark.parametrize("key,prog,numeral,letter",[("Am",["i","iv","V"],"V","G"),("C",["I","iv","V"],"iv","A")])
+def test_constraints_only_use_chord_tones(key,prog,numeral,letter) :
+    #G natural is not in E major, the V of A minor, and A natural is not in F minor, the iv borrowed in C
+    constraints = MelodyConstraints(chord_tones="all")
+    draw = random.Random(0).randrange
+    for x in range(200) :
+        degrees,eighths,measures = constraints.notes(key,prog,draw)
+        pitches = [KEY_PITCHES[key][degrees[y]] for y in range(len(degrees)) if prog[measures[y]] == numeral]
+        assert pitches
+        assert not [pitch for pitch in pitches if pitch[0] == letter]
+
+
+def leaps_up(key,prog,note_rhythm_pairs) :
+    """Seed search predicate, true for melodies with more leaps up than down."""
+    numbers = [theory.pitch_number(pitch)[0] for [pitch,rhythm] in note_rhythm_pairs]
+    steps = [numbers[x+1]-numbers[x] for x in range(len(numbers)-1)]
+    return len([step for step in steps if step > 2]) > len([step for step in steps if step < -2])
+
+
+def mozart_matches(seeds,key=None,lowest=None,highest=None,motif=None,interval_counts=None,predicate=None) :
+    """Returns the (seed, key, progression) of each seed whose Mozart broken chord melody meets the criteria, worked out from its pitch names."""
+    matches = []
+    for seed_num in seeds :
+        m = Mozart(seed_num)
+        m.choose_key()
+        m.choose_progression()
+        m.broken_chord_melody(m.get_key(),m.get_progression())
+        melody = m.get_melody()
+        numbers = [theory.pitch_number(pitch)[0] for [pitch,rhythm] in melody]
+        degree_dict = dict((pitch,degree) for (degree,pitch) in KEY_PITCHES[m.get_key()].items())
+        degrees = [degree_dict[pitch] for [pitch,rhythm] in melody]
+        intervals = [degrees[x+1]-degrees[x] for x in range(len(degrees)-1)]
+        if key != None and m.get_key() != key :
+            continue
+        if lowest != None and min(numbers) < theory.pitch_number(lowest)[0] :
+            continue
+        if highest != None and max(numbers) > theory.pitch_number(highest)[0] :
+            continue
+        if motif != None and not any([pitch for [pitch,rhythm] in melody[x:x+len(motif)]] == motif for x in range(len(melody))) :
+            continue
+        if interval_counts != None and any(intervals.count(interval) < interval_counts[interval] for interval in interval_counts) :
+            continue
+        if predicate != None and not predicate(m.get_key(),m.get_progression(),melody) :
+            continue
+        matches.append((seed_num,m.get_key(),m.get_progression()))
+    return matches
+
+
+@pytest.mark.parametrize("criteria",[{"key" : "G","motif" : ["G4","B4"]},{"lowest" : "C4","highest" : "E5"},{"interval_counts" : {0 : 2,-2 : 3}},{"predicate" : leaps_up}])
+def test_seed_search_matches_mozart(criteria) :
+    search = SeedSearch(MelodyQuery(**criteria),workers=1,chunk_size=70)
+    matches = search.run(0,300)
+    assert matches == mozart_matches(range(300),**criteria)
+    assert 0 < len(matches) < 300
+
+
+def test_seed_search_with_workers_writes_index(tmp_path) :
+    query = MelodyQuery(key="C",progression=["I","V","vi","IV"])
+    index_file = str(tmp_path / "index.tsv")
+    search = SeedSearch(query,workers=2,chunk_size=100)
+    matches = search.run(50,550,index_file)
+    assert matches == SeedSearch(query,workers=1).run(50,550)
+    assert matches == mozart_matches(range(50,550),key="C",predicate=lambda key,prog,melody : prog == ["I","V","vi","IV"])
+    assert SeedSearch.read_index(index_file) == matches
+    stats = search.get_stats()
+    assert (stats["seeds"],stats["matches"]) == (500,len(matches))
+    assert stats["seeds per second"] > 0 and stats["seeds per second per core"] > 0
+
+
+def test_melody_index_finds_exact_and_near_duplicates() :
+    index = MelodyIndex()
+    melody = mozart_melody(3,"broken_chord")
+    index.add("C",["I","IV","V"],melody,3)
+    #Respelled, the same notes are an exact duplicate, and an octave higher every interval and rhythm matches
+    respelled = [[theory.pitch_name(theory.pitch_number(pitch)[0],True),rhythm] for [pitch,rhythm] in melody]
+    octave_up = [[theory.pitch_name(theory.pitch_number(pitch)[0]+12),rhythm] for [pitch,rhythm] in melody]
+    assert index.lookup("C",["I","IV","V"],respelled) == ("exact","3")
+    assert index.lookup("C",["I","IV","V"],octave_up) == ("near","3")
+    assert index.lookup("C",["I","IV","V"],mozart_melody(4,"broken_chord")) == None
+    assert MelodyIndex(near_duplicates=False).lookup("C",["I","IV","V"],octave_up) == None
+    assert index.get_stats() == {"melodies" : 1,"exact duplicates" : 1,"near duplicates" : 1}
+
+
+def test_melody_index_reloads_from_file(tmp_path) :
+    filename = str(tmp_path / "index.tsv")
+    index = MelodyIndex(filename)
+    for seed_num in range(20) :
+        index.add("G",["I","V"],mozart_melody(seed_num,"stepwise"),seed_num)
+    reloaded = MelodyIndex(filename)
+    assert len(reloaded) == len(index)
+    for seed_num in range(20) :
+        assert index.digest("G",["I","V"],mozart_melody(seed_num,"stepwise")) in reloaded
+        assert reloaded.lookup("G",["I","V"],mozart_melody(seed_num,"stepwise")) == index.lookup("G",["I","V"],mozart_melody(seed_num,"stepwise"))
+
+
+def test_batch_renderer_skips_duplicates(tmp_path) :
+    batch = BatchComposer().compose([1,2,1],"broken_chord")
+    index = MelodyIndex(str(tmp_path / "index.tsv"))
+    sinatra = Sinatra()
+    results = BatchRenderer(sinatra,index).render(batch,"draft",convert=False)
+    assert [(seed_num,duplicate) for (seed_num,audio,duplicate) in results] == [(1,None),(2,None),(1,("exact","1"))]
+    assert results[0][1] == sinatra.accompany(batch.melody(0),batch.chord_list(0),batch.get_keys()[0],"draft",False)
+    #A later run reading the same index file renders nothing, and writes each rendered melody to a wav file
+    results = BatchRenderer(sinatra,MelodyIndex(str(tmp_path / "index.tsv")),str(tmp_path / "wavs")).render(batch,"draft",convert=False)
+    assert [duplicate for (seed_num,audio,duplicate) in results] == [("exact","1"),("exact","2"),("exact","1")]
+    results = BatchRenderer(sinatra,None,str(tmp_path / "wavs")).render(batch.slice(1,2),"draft",convert=False)
+    assert results == [(2,os.path.join(str(tmp_path / "wavs"),"melody 2.wav"),None)]
+    assert AudioSegment.from_wav(results[0][1]).frame_rate == DRAFT_FRAME_RATE
+
+
+def test_chord_tone_fitness_uses_chord_quality() :
+    #Half of each melody is on a chord tone: E over V in A minor (not G natural), and F over iv in C (not A natural)
+    batch = MelodyBatch(KEY_PITCHES)
+    batch.append(None,"Am",["V"],[7,5],[4,4],[0,0])
+    batch.append(None,"C",["iv"],[6,4],[4,4],[0,0])
+    assert chord_tone_fitness(batch) == [0.5,0.5]
+
+
+def test_fitness_scores_match_without_numpy(monkeypatch) :
+    pytest.importorskip("numpy")
+    batches = [BatchComposer().compose(range(300),"broken_chord"),BatchComposer().compose(range(300),"stepwise","Am")]
+    #An empty melody, a single note, a melody starting in its second measure, and measures out of order
+    odd = MelodyBatch(KEY_PITCHES)
+    odd.append(None,"C",["I","V"],[],[],[])
+    odd.append(None,"C",["I","V"],[3],[8],[0])
+    odd.append(None,"G",["I","V"],[1,2,1],[2,2,4],[1,1,1])
+    odd.append(None,"C",["I","IV"],[1,2,3,2],[2,2,2,2],[1,1,0,2])
+    batches += [odd.slice(0,3),odd]
+    functions = [voice_leading_fitness,chord_tone_fitness,contour_fitness,rhythm_variety_fitness]
+    functions.append(WeightedFitness([(function,x+1) for (x,function) in enumerate(functions)]))
+    scores = [function(batch) for function in functions for batch in batches]
+    monkeypatch.setitem(sys.modules,"numpy",None)
+    assert scores == [function(batch) for function in functions for batch in batches]
+
+
+def test_import_does_not_look_up_binaries() :
+    command = "import MusicMaker, pydub.playback; from pydub import AudioSegment; print(AudioSegment._converter, pydub.playback.PLAYER)"
+    output = subprocess.check_output([sys.executable,"-c",command],cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert output.split() == [b"None",b"None"]
+
+
+def test_binaries_are_looked_up_once(monkeypatch) :
+    lookups = []
+    def lookup(name) :
+        lookups.append(name)
+        return name
+    monkeypatch.setattr(audio_segment,"get_encoder_name",lambda : lookup("converter"))
+    monkeypatch.setattr(playback,"get_player_name",lambda : lookup("player"))
+    monkeypatch.setattr(AudioSegment,"_converter",None)
+    monkeypatch.setattr(playback,"PLAYER",None)
+    assert (AudioSegment.converter,AudioSegment.converter) == ("converter","converter")
+    assert (playback.get_player(),playback.get_player()) == ("player","player")
+    assert lookups == ["converter","player"]
+
+
+def test_iter_blocks_cover_the_data() :
+    segment = AudioSegment(data=bytes(range(256))*40,sample_width=2,frame_rate=8000,channels=2) #2560 frames
+    blocks = list(segment.iter_blocks(frames=1000))
+    assert [len(block)//4 for block in blocks] == [1000,1000,560]
+    assert b"".join(block.tobytes() for block in blocks) == segment.raw_data
+    #With a shorter hop, each block starts hop frames after the last and the final block reaches the end
+    blocks = list(segment.iter_blocks(frames=1000,hop=600))
+    assert [len(block)//4 for block in blocks] == [1000,1000,1000,760]
+    assert blocks[1].tobytes() == segment.raw_data[600*4:1600*4]
+    assert blocks[-1].tobytes() == segment.raw_data[1800*4:]
+
+
+def test_chunks_are_lazy_and_frame_aligned() :
+    segment = AudioSegment(data=bytes(range(256))*40,sample_width=2,frame_rate=11025,channels=1) #5120 frames
+    chunks = utils.iter_chunks(segment,10) #110.25 frames, rounded up
+    first = next(chunks)
+    assert first.raw_data == segment.raw_data[:111*2]
+    chunks = utils.make_chunks(segment,10)
+    assert [int(chunk.frame_count()) for chunk in chunks] == [111]*46+[14]
+    assert b"".join(chunk.raw_data for chunk in chunks) == segment.raw_data
+
+
+SAMPLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),"Piano Samples")
+
+
+def test_note_table_samples_match_sample_files() :
+    #Sinatra used to load the sample again for every note
+    note_table = NoteTable(SAMPLE_DIR+"/")
+    sinatra = Sinatra(note_table)
+    for (pitch,rhythm,duration) in [("C4","quarter",350),("E4","eighth",175),("G4","half",700),("C5","whole",1400),("C4","quarter",350)] :
+        sample = AudioSegment.from_file(os.path.join(SAMPLE_DIR,pitch+".wav"),format="wav")
+        assert note_table.sample(pitch).raw_data == sample.raw_data
+        assert getattr(sinatra,rhythm)(pitch).raw_data == sample[:duration].raw_data
+    assert len(note_table) == 4 #C4 is only loaded once
+    assert (note_table._hits,note_table._misses) == (6,4)
+
+
+def test_note_table_builds_every_pitch_once() :
+    note_table = NoteTable(SAMPLE_DIR+"/")
+    pitches = Mozart.all_pitches()
+    note_table.build(pitches)
+    assert note_table.load_sample("Bb4") is note_table.load_sample("A#4") #Enharmonic pitches share a sample
+    samples = dict((id(note_table.load_sample(pitch)),note_table.load_sample(pitch)) for pitch in pitches)
+    footprint = note_table.memory_footprint()
+    assert footprint == sum(len(sample.raw_data) for sample in samples.values())
+    assert len(note_table) == len(samples)
+
+
+def test_accompaniment_cache_reuses_tracks(tmp_path) :
+    cache = AccompanimentCache(max_entries=2,cache_dir=str(tmp_path))
+    sinatra = Sinatra(accompaniment_cache=cache)
+    track = sinatra.chord_progression_audio(["C","F","G","C"],"C")
+    assert (cache._hits,cache._misses) == (0,1)
+    assert sinatra.chord_progression_audio(["C","F","G","C"],"C") is track
+    assert cache.hit_rate() == 0.5
+
+    #The least recently used track is evicted from memory, but is still read back from the cache folder
+    sinatra.chord_progression_audio(["Am","Dm","E","Am"],"Am")
+    sinatra.chord_progression_audio(["G","C","D","G"],"G")
+    assert len(cache) == 2
+    cache = AccompanimentCache(cache_dir=str(tmp_path))
+    reloaded = Sinatra(accompaniment_cache=cache).chord_progression_audio(["C","F","G","C"],"C")
+    assert (cache._hits,cache._misses) == (1,0)
+    assert reloaded.raw_data == track.raw_data
+
+
+def test_chord_track_matches_append_chain() :
+    #The track used to be built by appending each chord with a 100 ms crossfade. The chain placed each join by the track's length rounded to whole milliseconds,
+    #so a chord may start up to a frame later per join there. Away from the crossfades the audio is the same once realigned, and within them it differs by a small amount.
+    sinatra = Sinatra()
+    chords = ["C","F","G","C"]
+    sample_length = 1400+100*(len(chords)-1)/len(chords)
+    chain = sinatra.chord(chords[0],sample_length)
+    for chord in chords[1:] :
+        chain = chain.append(sinatra.chord(chord,sample_length),crossfade=100)
+    track = ChordTrackBuilder(sinatra.chord).build(chords,sample_length,100)
+    assert track.frame_rate == chain.frame_rate and track.channels == chain.channels
+    assert 0 <= chain.frame_count()-track.frame_count() <= len(chords)-1
+
+    chain_samples = chain.get_array_of_samples()
+    track_samples = track.get_array_of_samples()
+    channels = track.channels
+    chord_frames = int(sinatra.chord(chords[0],sample_length).frame_count())
+    fade_frames = int(track.frame_count(ms=100))
+    starts = [x*(chord_frames-fade_frames) for x in range(len(chords))]+[int(track.frame_count())]
+    offset = 0
+    for x in range(len(chords)) :
+        body = slice(channels*(starts[x]+(fade_frames if x else 0)),channels*starts[x+1])
+        for shift in range(offset,offset+2) :
+            shifted = slice(body.start+channels*shift,body.stop+channels*shift)
+            if chain_samples[shifted] == track_samples[body] :
+                break
+        else :
+            raise AssertionError("chord %d does not match the chain within a frame of the previous join" % x)
+        if x :
+            fade = range(channels*starts[x],channels*(starts[x]+fade_frames))
+            assert max(abs(track_samples[y]-chain_samples[y+channels*shift]) for y in fade) < 256
+        offset = shift
+
+
+@pytest.mark.parametrize("pan",[-1.0,-0.3,0.0,0.6,1.0])
+def test_pan_uses_constant_power_gains(pan) :
+    #effects.pan and Ensemble's mix should give each channel the same level for the same pan
+    frames = AudioSegment.silent(duration=50,frame_rate=8000).raw_data
+    data = bytes(random.Random(0).getrandbits(8) for x in range(len(frames)))
+    segment = AudioSegment(data=data,sample_width=2,frame_rate=8000,channels=1)
+    left_gain,right_gain = pan_gains(pan)
+    panned = segment.pan(pan).raw_data
+    assert audioop.tomono(panned,2,1,0) == audioop.mul(data,2,left_gain)
+    assert audioop.tomono(panned,2,0,1) == audioop.mul(data,2,right_gain)
+
+
+@pytest.mark.parametrize("sample_width",[1,2,4])
+def test_stereo_pan_scales_each_channel(sample_width,monkeypatch) :
+    data = bytes(random.Random(2).getrandbits(8) for x in range(2*sample_width*400))
+    segment = AudioSegment(data=data,sample_width=sample_width,frame_rate=8000,channels=2)
+    left_gain,right_gain = pan_gains(0.6)
+    panned = segment.pan(0.6).raw_data
+    assert audioop.tomono(panned,sample_width,1,0) == audioop.mul(audioop.tomono(data,sample_width,1,0),sample_width,left_gain)
+    assert audioop.tomono(panned,sample_width,0,1) == audioop.mul(audioop.tomono(data,sample_width,0,1),sample_width,right_gain)
+    #Without numpy each channel is split out and scaled by audioop instead, with the same result
+    monkeypatch.setitem(sys.modules,"numpy",None)
+    assert segment.pan(0.6).raw_data == panned
+
+
+def scheduler_render(note_table,notes) :
+    """Renders (onset, duration, pitch, velocity) notes from scratch, with the release and fade used by the session below."""
+    scheduler = Scheduler(note_table,release=150,fade=20)
+    for (onset,duration,pitch,velocity) in notes :
+        scheduler.add(onset,duration,pitch,velocity)
+    return scheduler.render()
+
+
+def overlap_add(notes,template) :
+    """Mixes (start frame, raw data) notes into one buffer, the way they sound without a scheduler."""
+    buffer = bytearray(max(start*template.frame_width+len(data) for (start,data) in notes))
+    for (start,data) in notes :
+        start *= template.frame_width
+        buffer[start:start+len(data)] = audioop.add(bytes(buffer[start:start+len(data)]),data,template.sample_width)
+    return bytes(buffer)
+
+
+def test_notes_ring_past_their_slot() :
+    note_table = NoteTable(SAMPLE_DIR+"/")
+    scheduler = Scheduler(note_table,release=150)
+    scheduler.add_melody([["C4","quarter"],["E4","quarter"]])
+    audio = scheduler.render()
+    template = note_table.get_template()
+    slot = scheduler.frame(1,template.frame_rate)
+    release = int(template.frame_count(ms=150))
+    assert int(audio.frame_count()) == 2*slot+release
+    #Each note rings on for the release, the first one underneath the second
+    ringing = [(x*slot,note_table.load_sample(pitch).raw_data[:(slot+release)*template.frame_width]) for (x,pitch) in enumerate(["C4","E4"])]
+    assert audio.raw_data == overlap_add(ringing,template)
+
+
+def test_voice_cap_cuts_off_the_oldest_note() :
+    note_table = NoteTable(SAMPLE_DIR+"/")
+    scheduler = Scheduler(note_table,release=150,max_voices=1)
+    scheduler.add_melody([["C4","quarter"],["E4","quarter"]])
+    audio = scheduler.render()
+    template = note_table.get_template()
+    slot = scheduler.frame(1,template.frame_rate)
+    release = int(template.frame_count(ms=150))
+    cut = [(0,note_table.load_sample("C4").raw_data[:slot*template.frame_width]),(slot,note_table.load_sample("E4").raw_data[:(slot+release)*template.frame_width])]
+    assert audio.raw_data == overlap_add(cut,template)
+
+
+def test_tempo_map_times() :
+    #350 ms quarter notes place beat 1000 exactly, with nothing lost to rounding note by note
+    assert TempoMap().frame(1000,11025) == 350*11025
+    stepped = TempoMap(60)
+    stepped.set_tempo(4,120)
+    assert stepped.seconds(3) == pytest.approx(3)
+    assert stepped.seconds(6) == pytest.approx(5)
+    #A steady ramp from 60 to 120 beats per minute over 4 beats takes 4 ln 2 seconds
+    ramped = TempoMap(60)
+    ramped.ramp_to(4,120)
+    assert ramped.tempo_at(2) == 90
+    assert ramped.seconds(4) == pytest.approx(4*math.log(2),abs=1e-5)
+    assert ramped.seconds(5) == pytest.approx(4*math.log(2)+.5,abs=1e-5)
+    with pytest.raises(ValueError) :
+        ramped.set_tempo(3,100)
+
+
+def test_scheduler_places_notes_by_tempo_map() :
+    tempo_map = TempoMap(60)
+    tempo_map.set_tempo(1,120)
+    note_table = NoteTable(SAMPLE_DIR+"/")
+    scheduler = Scheduler(note_table,tempo_map)
+    scheduler.add_melody([["C4","quarter"],["E4","quarter"],["G4","half"]])
+    audio = scheduler.render()
+    template = note_table.get_template()
+    rate = template.frame_rate
+    notes = [(0,rate),(rate,rate//2),(3*rate//2,rate)] #(start, length) in frames: one second, then half a second per beat
+    assert int(audio.frame_count()) == 5*rate//2
+    assert audio.raw_data == overlap_add([(start,note_table.load_sample(pitch).raw_data[:length*template.frame_width]) for ((start,length),pitch) in zip(notes,["C4","E4","G4"])],template)
+
+
+def test_note_table_counts_one_lookup_per_note() :
+    melody = [["D4","quarter"],["F#4","quarter"],["A4","half"]]
+    note_table = NoteTable()
+    scheduler = Scheduler(note_table)
+    scheduler.add_melody(melody)
+    scheduler.render()
+    assert (note_table._hits,note_table._misses) == (0,3)
+    assert note_table.hit_rate() == 0.0
+    scheduler.render()
+    assert (note_table._hits,note_table._misses) == (3,3)
+
+    note_table = NoteTable()
+    note_table.build(["D4","F#4","A4"])
+    scheduler = Scheduler(note_table)
+    scheduler.add_melody(melody)
+    scheduler.render()
+    assert note_table.hit_rate() == 1.0
+
+
+@pytest.mark.parametrize("quality",["full","draft"])
+def test_sinatra_session_matches_sing(quality) :
+    #No more than two notes sound at once, so sing's polyphony limit, which sessions do not apply, never cuts a note off
+    melody = [["C4","quarter"],["E4","eighth"],["G4","eighth"],["C5","half"],["B4","whole"]]
+    sinatra = Sinatra(quality=quality)
+    session = sinatra.session(melody)
+    session.render()
+    assert session.get_audio().raw_data == sinatra.sing(melody,convert=False).raw_data
+
+
+def test_render_session_edits_match_full_render() :
+    note_table = NoteTable()
+    session = RenderSession(note_table,release=150,fade=20)
+    note_ids = session.add_melody([["C4","quarter"],["E4","eighth"],["G4","half"],["C5","quarter"],["B4","whole"]])
+    session.render()
+    session.edit_note(note_ids[1],pitch="F4",velocity=0.5)
+    session.edit_note(note_ids[3],onset=6,duration=2)
+    session.delete_note(note_ids[2])
+    session.insert_note(1.5,0.5,"A4")
+    session.render()
+
+    notes = [session.get_note(note_id) for note_id in session.get_note_ids()]
+    assert session.get_audio().raw_data == scheduler_render(note_table,notes).raw_data
+
+
+@pytest.mark.parametrize("seed_num",[1,2,3])
+def test_draft_output_matches_full_format_and_length(seed_num) :
+    m = Mozart(seed_num)
+    m.choose_key("C")
+    m.choose_progression()
+    m.broken_chord_melody("C",m.get_progression())
+    melody = m.get_melody()
+    chords = m.chord_list()
+    note_table = NoteTable()
+    full = Sinatra(note_table)
+    draft = Sinatra(note_table,quality="draft")
+    for (full_audio,draft_audio) in [(full.sing(melody),draft.sing(melody)),
+                                     (full.chord_progression_audio(chords,"C",tempo_map=full.get_tempo()),draft.chord_progression_audio(chords,"C",tempo_map=draft.get_tempo())),
+                                     (full.accompany(melody,chords,"C"),draft.accompany(melody,chords,"C"))] :
+        assert (draft_audio.frame_rate,draft_audio.channels,draft_audio.sample_width) == (full_audio.frame_rate,full_audio.channels,full_audio.sample_width)
+        assert draft_audio.raw_data != full_audio.raw_data
+        assert len(draft_audio.raw_data) == len(full_audio.raw_data)
+
+    preview = draft.accompany(melody,chords,"C",convert=False)
+    assert (preview.frame_rate,preview.channels) == (DRAFT_FRAME_RATE,1)
+
+
+def test_measures_without_repeat_match_broken_chord_melody() :
+    for seed_num in range(200) :
+        m = Mozart(seed_num)
+        m.choose_key()
+        m.choose_progression()
+        key,prog = m.get_key(),m.get_progression()
+        measures = [pair for (pairs,count_list,numeral) in m.measures(key,prog,repeat=False) for pair in pairs]
+
+        m = Mozart(seed_num)
+        m.choose_key()
+        m.choose_progression()
+        m.broken_chord_melody(key,prog)
+        assert measures == m.get_melody()
+
+
+def test_stepwise_measures_lead_into_the_next_chord() :
+    eighths = {"eighth" : 1,"quarter" : 2,"half" : 4,"whole" : 8}
+    prog = ["I","V","vi","IV"]
+    degree_dict = dict((pitch,degree) for (degree,pitch) in KEY_PITCHES["C"].items())
+    measures = list(itertools.islice(Mozart(7).measures("C",prog,"stepwise"),100))
+    for x in range(len(measures)) :
+        pairs,count_list,numeral = measures[x]
+        degrees = [degree_dict[pitch] for [pitch,rhythm] in pairs]
+        assert numeral == prog[x%4]
+        assert sum(eighths[rhythm] for [pitch,rhythm] in pairs) == 8
+        assert degrees[0] in theory.KEY_CHORD_DEGREES["C"][numeral]
+        assert all(abs(degrees[y+1]-degrees[y]) == 1 for y in range(len(degrees)-1))
+        if x > 0 :
+            assert abs(degrees[0]-degree_dict[measures[x-1][0][-1][0]]) == 1
+
+
+def test_stream_yields_one_segment_per_measure() :
+    measures = list(Mozart(2).measures("G",["I","IV","V"],repeat=False))
+    segments = list(Sinatra().stream("G",iter(measures),quality="draft"))
+    assert len(segments) == len(measures)
+    assert len(set(segment.frame_count() for segment in segments)) == 1
+    assert segments[0].frame_count() > 0
+
+
+def test_form_render_matches_stream_of_whole_form() :
+    #Sections are rendered once each, but the chords crossfade across section boundaries as in one stream
+    form = SongForm("C",Mozart(4))
+    form.add_section("A",["I","IV","V","I"])
+    form.add_section("B",["vi","IV","V","V"])
+    form.arrange("AABA")
+    sinatra = Sinatra()
+    renderer = FormRenderer(sinatra)
+    audio = renderer.render(form)
+    assert renderer.get_stats()["audio renders"] == 4 #A, A with its first chord faded in, B and the cadence
+    segments = list(sinatra.stream("C",form.measures(),ring_out=True))
+    assert audio.raw_data == b"".join(segment.raw_data for segment in segments)
@@ -0,0 +1,216 @@
+"""
+filename: theory.py
+
+Music theory tables shared by MusicMaker: the pitch of every scale degree,
+the chord for every roman numeral, the chord tones of every numeral and the
+staff position of every pitch, for all 24 major and minor keys. The tables
+are computed by _build_tables and shipped as literals in theory_tables.py,
+so importing theory is cheap and composing and notating a melody only looks
+values up. Run "python theory.py" to regenerate theory_tables.py.
+"""
+
+#Keys, named by tonic, with minor keys marked by a trailing "m" as for chords
+MAJOR_KEYS = ["C","G","D","A","E","B","F#","Db","Ab","Eb","Bb","F"]
+MINOR_KEYS = ["Am","Em","Bm","F#m","C#m","G#m","D#m","Bbm","Fm","Cm","Gm","Dm"]
+KEYS = MAJOR_KEYS + MINOR_KEYS
+
+#Keys chosen from when Mozart picks a key at random. Kept to C and G so that a seed gives the same melody as before all keys were available.
+RANDOM_KEYS = ["C","G"]
+
+#List of common chord progressions, for major keys and for minor keys
+COMMON_PROGRESSIONS = [["I","IV","V"],["I","V","vi","IV"],["I","IV","vi","V"],["I","V","vi","iii","IV","I","IV","V"],["vi","V","IV","V"],["I","vi","IV","V"],["I","V","IV","V"]]
+MINOR_PROGRESSIONS = [["i","iv","V"],["i","VI","III","VII"],["i","iv","VII","III"],["i","VII","VI","V"],["i","iv","v","i"],["i","VI","iv","V"],["i","III","VII","iv"]]
+
+#Length of each rhythm in beats (quarter notes)
+RHYTHM_BEATS = {"eighth" : .5,"quarter" : 1,"half" : 2,"whole" : 4}
+
+#Roman numerals with a chord in every major or minor key
+MAJOR_NUMERALS = ["I","I7","ii","ii7","iii","IV","iv","V","V7","vi","viio","V/ii","V/iii","V/IV","V/V","V/vi","V7/ii","V7/iii","V7/IV","V7/V","V7/vi"]
+MINOR_NUMERALS = ["i","iio","III","iv","IV","v","V","V7","VI","VII"]
+
+#Lowest and highest pitches with a piano sample, and the range Mozart writes in when a key allows it
+LOWEST_SAMPLE = 59 #B3
+HIGHEST_SAMPLE = 82 #A#5
+LOWEST_PITCH = 59 #B3
+HIGHEST_PITCH = 79 #G5
+
+_LETTERS = "CDEFGAB"
+_LETTER_SEMITONES = [0,2,4,5,7,9,11]
+_MAJOR_STEPS = [0,2,4,5,7,9,11]
+_MINOR_STEPS = [0,2,3,5,7,8,10]
+_NUMERAL_DEGREES = {"I" : 1,"II" : 2,"III" : 3,"IV" : 4,"V" : 5,"VI" : 6,"VII" : 7}
+_CHORD_INTERVALS = {"" : (0,4,7),"m" : (0,3,7),"dim" : (0,3,6)}
+
+def pitch_number(name) :
+    """Returns the MIDI number of a pitch name such as "F#4" or "Bb3", and whether it is spelled with a flat."""
+    number = 12*(int(name.lstrip("ABCDEFG#b"))+1) + _LETTER_SEMITONES[_LETTERS.index(name[0])]
+    accidentals = name[1:len(name)-len(name.lstrip("ABCDEFG#b"))+1]
+    return number + accidentals.count("#") - accidentals.count("b"),"b" in accidentals
+
+def pitch_name(number,flat=False) :
+    """Returns the name of a MIDI number, spelled with a sharp unless flat is True."""
+    if flat :
+        names = ["C","Db","D","Eb","E","F","Gb","G","Ab","A","Bb","B"]
+    else :
+        names = ["C","C#","D","D#","E","F","F#","G","G#","A","A#","B"]
+    return names[number%12] + str(number//12-1)
+
+def spell(letter_index,number) :
+    """Returns the name of a MIDI number spelled on the given letter (0 for C to 6 for B), e.g. 70 on B is "Bb4" and on A is "A#4"."""
+    octave = (number - _LETTER_SEMITONES[letter_index%7] + 6)//12 - 1
+    accidental = number - 12*(octave+1) - _LETTER_SEMITONES[letter_index%7]
+    if accidental < 0 :
+        return _LETTERS[letter_index%7] + "b"*-accidental + str(octave)
+    return _LETTERS[letter_index%7] + "#"*accidental + str(octave)
+
+def is_minor(key) :
+    """Returns True for a minor key."""
+    return key.endswith("m")
+
+def tonic_number(key) :
+    """Returns the MIDI number of the tonic of a key in the fourth octave, e.g. 67 for G."""
+    return pitch_number(key.rstrip("m")+"4")[0]
+
+def degree_number(key,degree) :
+    """Returns the MIDI number of a scale degree, where 1 is the tonic in the fourth octave, 8 the tonic an octave higher and 0 the note below the tonic."""
+    steps = _MINOR_STEPS if is_minor(key) else _MAJOR_STEPS
+    octave,index = divmod(degree-1,7)
+    return tonic_number(key) + 12*octave + steps[index]
+
+def degree_name(key,degree) :
+    """Returns the pitch name of a scale degree, spelled within the key."""
+    return spell(_LETTERS.index(key[0])+degree-1,degree_number(key,degree))
+
+def degree_range(key) :
+    """Returns the lowest and highest scale degrees available in a key. Melodies stay between B3 and G5, stretched to include degrees 0 to 8 where piano samples allow."""
+    lowest = min(LOWEST_PITCH,degree_number(key,0))
+    highest = max(HIGHEST_PITCH,degree_number(key,8))
+    degrees = [degree for degree in range(-14,22) if max(lowest,LOWEST_SAMPLE) <= degree_number(key,degree) <= min(highest,HIGHEST_SAMPLE)]
+    return degrees[0],degrees[-1]
+
+def key_progressions(key) :
+    """Returns the common chord progressions for a key, written in minor key numerals for a minor key."""
+    if is_minor(key) :
+        return MINOR_PROGRESSIONS
+    return COMMON_PROGRESSIONS
+
+def numeral_root(numeral) :
+    """Returns the scale degree (1 to 7) of the root of a roman numeral, ignoring any 7, "o" or secondary chord."""
+    return _NUMERAL_DEGREES[numeral.split("/")[0].rstrip("7o").upper()]
+
+def chord_name(key,numeral) :
+    """Returns the chord for a roman numeral in a key, e.g. "Dm" for ii and "D" for V/V in C. Upper case numerals are major, lower case minor, and a trailing "o" diminished."""
+    if "/" in numeral : #Secondary chord, built a fifth above the root of the chord it leads to
+        numeral,target = numeral.split("/")
+        root = numeral_root(target)
+        letter_index = _LETTERS.index(key[0])+root-1+4
+        number = degree_number(key,root)+7
+    else :
+        root = numeral_root(numeral)
+        letter_index = _LETTERS.index(key[0])+root-1
+        number = degree_number(key,root)
+    name = spell(letter_index,number).rstrip("-0123456789")
+    base = numeral.rstrip("7")
+    if base.endswith("o") :
+        return name + "dim"
+    if base == base.lower() :
+        return name + "m"
+    return name
+
+def chord_pitch_classes(chord) :
+    """Returns the pitch classes (0 for C to 11 for B) of the triad of a chord name such as "E", "Am" or "Bdim"."""
+    quality = chord.lstrip("ABCDEFG#b")
+    root = pitch_number(chord[:len(chord)-len(quality)]+"4")[0]
+    return [(root+interval)%12 for interval in _CHORD_INTERVALS[quality]]
+
+def chord_degrees(key,numeral) :
+    """Returns the scale degrees Mozart may use for a chord: the root, then the other chord tones from degree 0 to 8 in ascending order, leaving out any without a sample.
+    Chord tones are those of the chord named by chord_name, so the melody agrees with the accompaniment. Chord tones outside the scale, such as the G# of V in A minor, are not scale degrees and are left out."""
+    root = numeral_root(numeral)
+    lowest,highest = degree_range(key)
+    pitch_classes = chord_pitch_classes(chord_name(key,numeral))
+    others = [degree for degree in range(0,9) if degree != root and degree_number(key,degree)%12 in pitch_classes and lowest <= degree <= highest]
+    return [root] + others
+
+def chord_tone_classes(key,numeral) :
+    """Returns the chord tones of a numeral in a key as scale degrees modulo 7, so that a degree is a chord tone in any octave if degree%7 is in the set."""
+    return frozenset(degree%7 for degree in KEY_CHORD_DEGREES[key][numeral])
+
+def key_signature(key) :
+    """Returns the number of sharps (positive) or flats (negative) in the key signature of a key."""
+    count = 0
+    for degree in range(1,8) :
+        name = degree_name(key,degree)
+        count += name.count("#") - name[1:].count("b")
+    return count
+
+def staff_position(pitch) :
+    """Returns the position of a pitch in pixels below the top line (F5) of the treble staff. Accidentals do not change the position."""
+    octave = int(pitch.lstrip("ABCDEFG#b"))
+    steps = 7*octave + _LETTERS.index(pitch[0])
+    return 5*(7*5 + _LETTERS.index("F") - steps)
+
+def sample_pitch(pitch) :
+    """Returns the name of the piano sample for a pitch. Samples are named with sharps, so pitches spelled any other way use their enharmonic equivalent."""
+    return pitch_name(pitch_number(pitch)[0])
+
+def sample_chord(chord) :
+    """Returns the name of the chord sample for a chord, e.g. "A#m" for "Bbm". Chord samples are named with sharps."""
+    quality = chord.lstrip("ABCDEFG#b")
+    root = chord[:len(chord)-len(quality)]
+    return pitch_name(pitch_number(root+"4")[0])[:-1] + quality
+
+def _build_tables() :
+    """Computes the scale degree, chord, chord tone, key signature and staff position tables for every key."""
+    key_pitches = {}
+    key_chords = {}
+    key_chord_degrees = {}
+    key_signatures = {}
+    staff_positions = {}
+    for key in KEYS :
+        lowest,highest = degree_range(key)
+        key_pitches[key] = dict((degree,degree_name(key,degree)) for degree in range(lowest,highest+1))
+        numerals = MINOR_NUMERALS if is_minor(key) else MAJOR_NUMERALS
+        key_chords[key] = dict((numeral,chord_name(key,numeral)) for numeral in numerals)
+        key_chord_degrees[key] = dict((numeral,chord_degrees(key,numeral)) for numeral in numerals if "/" not in numeral)
+        key_signatures[key] = key_signature(key)
+        for pitch in key_pitches[key].values() :
+            staff_positions[pitch] = staff_position(pitch)
+    for number in range(LOWEST_SAMPLE,HIGHEST_SAMPLE+1) :
+        for flat in (False,True) :
+            staff_positions[pitch_name(number,flat)] = staff_position(pitch_name(number,flat))
+    return key_pitches,key_chords,key_chord_degrees,key_signatures,staff_positions
+
+_TABLE_NAMES = ["KEY_PITCHES","KEY_CHORDS","KEY_CHORD_DEGREES","KEY_SIGNATURES","STAFF_POSITIONS"]
+
+def _write_tables(path="theory_tables.py") :
+    """Writes the tables from _build_tables to a module as literals, so that importing theory does not compute them."""
+    lines = ['"""','filename: theory_tables.py','','Tables generated by theory._write_tables from theory._build_tables. Do not','edit by hand; change theory.py and run "python theory.py" to regenerate.','"""','']
+    for name,table in zip(_TABLE_NAMES,_build_tables()) :
+        if isinstance(next(iter(table.values())),dict) :
+            lines.append(name + " = {")
+            for key,row in table.items() :
+                lines.append("    " + repr(key) + " : " + repr(row) + ",")
+            lines.append("}")
+        else :
+            lines.append(name + " = " + repr(table))
+        lines.append("")
+    with open(path,"w") as f :
+        f.write("\n".join(lines))
+
+#For each key, scale degree -> pitch, roman numeral -> chord, roman numeral -> chord tone scale degrees, and the key signature. Staff position of every pitch.
+#Computed afresh when regenerating theory_tables.py, which may be missing or stale, and when it has not been generated yet.
+if __name__ == "__main__" :
+    KEY_PITCHES,KEY_CHORDS,KEY_CHORD_DEGREES,KEY_SIGNATURES,STAFF_POSITIONS = _build_tables()
+else :
+    try :
+        from theory_tables import KEY_PITCHES, KEY_CHORDS, KEY_CHORD_DEGREES, KEY_SIGNATURES, STAFF_POSITIONS
+    except ImportError :
+        KEY_PITCHES,KEY_CHORDS,KEY_CHORD_DEGREES,KEY_SIGNATURES,STAFF_POSITIONS = _build_tables()
+
+#Lines of the key signature, in the order sharps and flats are written
+SHARP_ORDER = ["F5","C5","G5","D5","A4","E5","B4"]
+FLAT_ORDER = ["B4","E5","A4","D5","G4","C5","F4"]
+
+if __name__ == "__main__":
+    _write_tables()
@@ -0,0 +1,91 @@
+"""
+filename: theory_tables.py
+
+Tables generated by theory._write_tables from theory._build_tables. Do not
+edit by hand; change theory.py and run "python theory.py" to regenerate.
+"""
+
+KEY_PITCHES = {
+    'C' : {0: 'B3', 1: 'C4', 2: 'D4', 3: 'E4', 4: 'F4', 5: 'G4', 6: 'A4', 7: 'B4', 8: 'C5', 9: 'D5', 10: 'E5', 11: 'F5', 12: 'G5'},
+    'G' : {-4: 'B3', -3: 'C4', -2: 'D4', -1: 'E4', 0: 'F#4', 1: 'G4', 2: 'A4', 3: 'B4', 4: 'C5', 5: 'D5', 6: 'E5', 7: 'F#5', 8: 'G5'},
+    'D' : {-1: 'B3', 0: 'C#4', 1: 'D4', 2: 'E4', 3: 'F#4', 4: 'G4', 5: 'A4', 6: 'B4', 7: 'C#5', 8: 'D5', 9: 'E5', 10: 'F#5', 11: 'G5'},
+    'A' : {-5: 'B3', -4: 'C#4', -3: 'D4', -2: 'E4', -1: 'F#4', 0: 'G#4', 1: 'A4', 2: 'B4', 3: 'C#5', 4: 'D5', 5: 'E5', 6: 'F#5', 7: 'G#5', 8: 'A5'},
+    'E' : {-2: 'B3', -1: 'C#4', 0: 'D#4', 1: 'E4', 2: 'F#4', 3: 'G#4', 4: 'A4', 5: 'B4', 6: 'C#5', 7: 'D#5', 8: 'E5', 9: 'F#5'},
+    'B' : {-6: 'B3', -5: 'C#4', -4: 'D#4', -3: 'E4', -2: 'F#4', -1: 'G#4', 0: 'A#4', 1: 'B4', 2: 'C#5', 3: 'D#5', 4: 'E5', 5: 'F#5', 6: 'G#5', 7: 'A#5'},
+    'F#' : {-3: 'B3', -2: 'C#4', -1: 'D#4', 0: 'E#4', 1: 'F#4', 2: 'G#4', 3: 'A#4', 4: 'B4', 5: 'C#5', 6: 'D#5', 7: 'E#5', 8: 'F#5'},
+    'Db' : {0: 'C4', 1: 'Db4', 2: 'Eb4', 3: 'F4', 4: 'Gb4', 5: 'Ab4', 6: 'Bb4', 7: 'C5', 8: 'Db5', 9: 'Eb5', 10: 'F5', 11: 'Gb5'},
+    'Ab' : {-4: 'C4', -3: 'Db4', -2: 'Eb4', -1: 'F4', 0: 'G4', 1: 'Ab4', 2: 'Bb4', 3: 'C5', 4: 'Db5', 5: 'Eb5', 6: 'F5', 7: 'G5', 8: 'Ab5'},
+    'Eb' : {-1: 'C4', 0: 'D4', 1: 'Eb4', 2: 'F4', 3: 'G4', 4: 'Ab4', 5: 'Bb4', 6: 'C5', 7: 'D5', 8: 'Eb5', 9: 'F5', 10: 'G5'},
+    'Bb' : {-5: 'C4', -4: 'D4', -3: 'Eb4', -2: 'F4', -1: 'G4', 0: 'A4', 1: 'Bb4', 2: 'C5', 3: 'D5', 4: 'Eb5', 5: 'F5', 6: 'G5', 7: 'A5', 8: 'Bb5'},
+    'F' : {-2: 'C4', -1: 'D4', 0: 'E4', 1: 'F4', 2: 'G4', 3: 'A4', 4: 'Bb4', 5: 'C5', 6: 'D5', 7: 'E5', 8: 'F5', 9: 'G5'},
+    'Am' : {-5: 'B3', -4: 'C4', -3: 'D4', -2: 'E4', -1: 'F4', 0: 'G4', 1: 'A4', 2: 'B4', 3: 'C5', 4: 'D5', 5: 'E5', 6: 'F5', 7: 'G5', 8: 'A5'},
+    'Em' : {-2: 'B3', -1: 'C4', 0: 'D4', 1: 'E4', 2: 'F#4', 3: 'G4', 4: 'A4', 5: 'B4', 6: 'C5', 7: 'D5', 8: 'E5', 9: 'F#5', 10: 'G5'},
+    'Bm' : {-6: 'B3', -5: 'C#4', -4: 'D4', -3: 'E4', -2: 'F#4', -1: 'G4', 0: 'A4', 1: 'B4', 2: 'C#5', 3: 'D5', 4: 'E5', 5: 'F#5', 6: 'G5', 7: 'A5'},
+    'F#m' : {-3: 'B3', -2: 'C#4', -1: 'D4', 0: 'E4', 1: 'F#4', 2: 'G#4', 3: 'A4', 4: 'B4', 5: 'C#5', 6: 'D5', 7: 'E5', 8: 'F#5'},
+    'C#m' : {0: 'B3', 1: 'C#4', 2: 'D#4', 3: 'E4', 4: 'F#4', 5: 'G#4', 6: 'A4', 7: 'B4', 8: 'C#5', 9: 'D#5', 10: 'E5', 11: 'F#5'},
+    'G#m' : {-4: 'B3', -3: 'C#4', -2: 'D#4', -1: 'E4', 0: 'F#4', 1: 'G#4', 2: 'A#4', 3: 'B4', 4: 'C#5', 5: 'D#5', 6: 'E5', 7: 'F#5', 8: 'G#5'},
+    'D#m' : {-1: 'B3', 0: 'C#4', 1: 'D#4', 2: 'E#4', 3: 'F#4', 4: 'G#4', 5: 'A#4', 6: 'B4', 7: 'C#5', 8: 'D#5', 9: 'E#5', 10: 'F#5'},
+    'Bbm' : {-5: 'C4', -4: 'Db4', -3: 'Eb4', -2: 'F4', -1: 'Gb4', 0: 'Ab4', 1: 'Bb4', 2: 'C5', 3: 'Db5', 4: 'Eb5', 5: 'F5', 6: 'Gb5', 7: 'Ab5', 8: 'Bb5'},
+    'Fm' : {-2: 'C4', -1: 'Db4', 0: 'Eb4', 1: 'F4', 2: 'G4', 3: 'Ab4', 4: 'Bb4', 5: 'C5', 6: 'Db5', 7: 'Eb5', 8: 'F5', 9: 'G5'},
+    'Cm' : {1: 'C4', 2: 'D4', 3: 'Eb4', 4: 'F4', 5: 'G4', 6: 'Ab4', 7: 'Bb4', 8: 'C5', 9: 'D5', 10: 'Eb5', 11: 'F5', 12: 'G5'},
+    'Gm' : {-3: 'C4', -2: 'D4', -1: 'Eb4', 0: 'F4', 1: 'G4', 2: 'A4', 3: 'Bb4', 4: 'C5', 5: 'D5', 6: 'Eb5', 7: 'F5', 8: 'G5'},
+    'Dm' : {0: 'C4', 1: 'D4', 2: 'E4', 3: 'F4', 4: 'G4', 5: 'A4', 6: 'Bb4', 7: 'C5', 8: 'D5', 9: 'E5', 10: 'F5', 11: 'G5'},
+}
+
+KEY_CHORDS = {
+    'C' : {'I': 'C', 'I7': 'C', 'ii': 'Dm', 'ii7': 'Dm', 'iii': 'Em', 'IV': 'F', 'iv': 'Fm', 'V': 'G', 'V7': 'G', 'vi': 'Am', 'viio': 'Bdim', 'V/ii': 'A', 'V/iii': 'B', 'V/IV': 'C', 'V/V': 'D', 'V/vi': 'E', 'V7/ii': 'A', 'V7/iii': 'B', 'V7/IV': 'C', 'V7/V': 'D', 'V7/vi': 'E'},
+    'G' : {'I': 'G', 'I7': 'G', 'ii': 'Am', 'ii7': 'Am', 'iii': 'Bm', 'IV': 'C', 'iv': 'Cm', 'V': 'D', 'V7': 'D', 'vi': 'Em', 'viio': 'F#dim', 'V/ii': 'E', 'V/iii': 'F#', 'V/IV': 'G', 'V/V': 'A', 'V/vi': 'B', 'V7/ii': 'E', 'V7/iii': 'F#', 'V7/IV': 'G', 'V7/V': 'A', 'V7/vi': 'B'},
+    'D' : {'I': 'D', 'I7': 'D', 'ii': 'Em', 'ii7': 'Em', 'iii': 'F#m', 'IV': 'G', 'iv': 'Gm', 'V': 'A', 'V7': 'A', 'vi': 'Bm', 'viio': 'C#dim', 'V/ii': 'B', 'V/iii': 'C#', 'V/IV': 'D', 'V/V': 'E', 'V/vi': 'F#', 'V7/ii': 'B', 'V7/iii': 'C#', 'V7/IV': 'D', 'V7/V': 'E', 'V7/vi': 'F#'},
+    'A' : {'I': 'A', 'I7': 'A', 'ii': 'Bm', 'ii7': 'Bm', 'iii': 'C#m', 'IV': 'D', 'iv': 'Dm', 'V': 'E', 'V7': 'E', 'vi': 'F#m', 'viio': 'G#dim', 'V/ii': 'F#', 'V/iii': 'G#', 'V/IV': 'A', 'V/V': 'B', 'V/vi': 'C#', 'V7/ii': 'F#', 'V7/iii': 'G#', 'V7/IV': 'A', 'V7/V': 'B', 'V7/vi': 'C#'},
+    'E' : {'I': 'E', 'I7': 'E', 'ii': 'F#m', 'ii7': 'F#m', 'iii': 'G#m', 'IV': 'A', 'iv': 'Am', 'V': 'B', 'V7': 'B', 'vi': 'C#m', 'viio': 'D#dim', 'V/ii': 'C#', 'V/iii': 'D#', 'V/IV': 'E', 'V/V': 'F#', 'V/vi': 'G#', 'V7/ii': 'C#', 'V7/iii': 'D#', 'V7/IV': 'E', 'V7/V': 'F#', 'V7/vi': 'G#'},
+    'B' : {'I': 'B', 'I7': 'B', 'ii': 'C#m', 'ii7': 'C#m', 'iii': 'D#m', 'IV': 'E', 'iv': 'Em', 'V': 'F#', 'V7': 'F#', 'vi': 'G#m', 'viio': 'A#dim', 'V/ii': 'G#', 'V/iii': 'A#', 'V/IV': 'B', 'V/V': 'C#', 'V/vi': 'D#', 'V7/ii': 'G#', 'V7/iii': 'A#', 'V7/IV': 'B', 'V7/V': 'C#', 'V7/vi': 'D#'},
+    'F#' : {'I': 'F#', 'I7': 'F#', 'ii': 'G#m', 'ii7': 'G#m', 'iii': 'A#m', 'IV': 'B', 'iv': 'Bm', 'V': 'C#', 'V7': 'C#', 'vi': 'D#m', 'viio': 'E#dim', 'V/ii': 'D#', 'V/iii': 'E#', 'V/IV': 'F#', 'V/V': 'G#', 'V/vi': 'A#', 'V7/ii': 'D#', 'V7/iii': 'E#', 'V7/IV': 'F#', 'V7/V': 'G#', 'V7/vi': 'A#'},
+    'Db' : {'I': 'Db', 'I7': 'Db', 'ii': 'Ebm', 'ii7': 'Ebm', 'iii': 'Fm', 'IV': 'Gb', 'iv': 'Gbm', 'V': 'Ab', 'V7': 'Ab', 'vi': 'Bbm', 'viio': 'Cdim', 'V/ii': 'Bb', 'V/iii': 'C', 'V/IV': 'Db', 'V/V': 'Eb', 'V/vi': 'F', 'V7/ii': 'Bb', 'V7/iii': 'C', 'V7/IV': 'Db', 'V7/V': 'Eb', 'V7/vi': 'F'},
+    'Ab' : {'I': 'Ab', 'I7': 'Ab', 'ii': 'Bbm', 'ii7': 'Bbm', 'iii': 'Cm', 'IV': 'Db', 'iv': 'Dbm', 'V': 'Eb', 'V7': 'Eb', 'vi': 'Fm', 'viio': 'Gdim', 'V/ii': 'F', 'V/iii': 'G', 'V/IV': 'Ab', 'V/V': 'Bb', 'V/vi': 'C', 'V7/ii': 'F', 'V7/iii': 'G', 'V7/IV': 'Ab', 'V7/V': 'Bb', 'V7/vi': 'C'},
+    'Eb' : {'I': 'Eb', 'I7': 'Eb', 'ii': 'Fm', 'ii7': 'Fm', 'iii': 'Gm', 'IV': 'Ab', 'iv': 'Abm', 'V': 'Bb', 'V7': 'Bb', 'vi': 'Cm', 'viio': 'Ddim', 'V/ii': 'C', 'V/iii': 'D', 'V/IV': 'Eb', 'V/V': 'F', 'V/vi': 'G', 'V7/ii': 'C', 'V7/iii': 'D', 'V7/IV': 'Eb', 'V7/V': 'F', 'V7/vi': 'G'},
+    'Bb' : {'I': 'Bb', 'I7': 'Bb', 'ii': 'Cm', 'ii7': 'Cm', 'iii': 'Dm', 'IV': 'Eb', 'iv': 'Ebm', 'V': 'F', 'V7': 'F', 'vi': 'Gm', 'viio': 'Adim', 'V/ii': 'G', 'V/iii': 'A', 'V/IV': 'Bb', 'V/V': 'C', 'V/vi': 'D', 'V7/ii': 'G', 'V7/iii': 'A', 'V7/IV': 'Bb', 'V7/V': 'C', 'V7/vi': 'D'},
+    'F' : {'I': 'F', 'I7': 'F', 'ii': 'Gm', 'ii7': 'Gm', 'iii': 'Am', 'IV': 'Bb', 'iv': 'Bbm', 'V': 'C', 'V7': 'C', 'vi': 'Dm', 'viio': 'Edim', 'V/ii': 'D', 'V/iii': 'E', 'V/IV': 'F', 'V/V': 'G', 'V/vi': 'A', 'V7/ii': 'D', 'V7/iii': 'E', 'V7/IV': 'F', 'V7/V': 'G', 'V7/vi': 'A'},
+    'Am' : {'i': 'Am', 'iio': 'Bdim', 'III': 'C', 'iv': 'Dm', 'IV': 'D', 'v': 'Em', 'V': 'E', 'V7': 'E', 'VI': 'F', 'VII': 'G'},
+    'Em' : {'i': 'Em', 'iio': 'F#dim', 'III': 'G', 'iv': 'Am', 'IV': 'A', 'v': 'Bm', 'V': 'B', 'V7': 'B', 'VI': 'C', 'VII': 'D'},
+    'Bm' : {'i': 'Bm', 'iio': 'C#dim', 'III': 'D', 'iv': 'Em', 'IV': 'E', 'v': 'F#m', 'V': 'F#', 'V7': 'F#', 'VI': 'G', 'VII': 'A'},
+    'F#m' : {'i': 'F#m', 'iio': 'G#dim', 'III': 'A', 'iv': 'Bm', 'IV': 'B', 'v': 'C#m', 'V': 'C#', 'V7': 'C#', 'VI': 'D', 'VII': 'E'},
+    'C#m' : {'i': 'C#m', 'iio': 'D#dim', 'III': 'E', 'iv': 'F#m', 'IV': 'F#', 'v': 'G#m', 'V': 'G#', 'V7': 'G#', 'VI': 'A', 'VII': 'B'},
+    'G#m' : {'i': 'G#m', 'iio': 'A#dim', 'III': 'B', 'iv': 'C#m', 'IV': 'C#', 'v': 'D#m', 'V': 'D#', 'V7': 'D#', 'VI': 'E', 'VII': 'F#'},
+    'D#m' : {'i': 'D#m', 'iio': 'E#dim', 'III': 'F#', 'iv': 'G#m', 'IV': 'G#', 'v': 'A#m', 'V': 'A#', 'V7': 'A#', 'VI': 'B', 'VII': 'C#'},
+    'Bbm' : {'i': 'Bbm', 'iio': 'Cdim', 'III': 'Db', 'iv': 'Ebm', 'IV': 'Eb', 'v': 'Fm', 'V': 'F', 'V7': 'F', 'VI': 'Gb', 'VII': 'Ab'},
+    'Fm' : {'i': 'Fm', 'iio': 'Gdim', 'III': 'Ab', 'iv': 'Bbm', 'IV': 'Bb', 'v': 'Cm', 'V': 'C', 'V7': 'C', 'VI': 'Db', 'VII': 'Eb'},
+    'Cm' : {'i': 'Cm', 'iio': 'Ddim', 'III': 'Eb', 'iv': 'Fm', 'IV': 'F', 'v': 'Gm', 'V': 'G', 'V7': 'G', 'VI': 'Ab', 'VII': 'Bb'},
+    'Gm' : {'i': 'Gm', 'iio': 'Adim', 'III': 'Bb', 'iv': 'Cm', 'IV': 'C', 'v': 'Dm', 'V': 'D', 'V7': 'D', 'VI': 'Eb', 'VII': 'F'},
+    'Dm' : {'i': 'Dm', 'iio': 'Edim', 'III': 'F', 'iv': 'Gm', 'IV': 'G', 'v': 'Am', 'V': 'A', 'V7': 'A', 'VI': 'Bb', 'VII': 'C'},
+}
+
+KEY_CHORD_DEGREES = {
+    'C' : {'I': [1, 3, 5, 8], 'I7': [1, 3, 5, 8], 'ii': [2, 4, 6], 'ii7': [2, 4, 6], 'iii': [3, 0, 5, 7], 'IV': [4, 1, 6, 8], 'iv': [4, 1, 8], 'V': [5, 0, 2, 7], 'V7': [5, 0, 2, 7], 'vi': [6, 1, 3, 8], 'viio': [7, 0, 2, 4]},
+    'G' : {'I': [1, 3, 5, 8], 'I7': [1, 3, 5, 8], 'ii': [2, 4, 6], 'ii7': [2, 4, 6], 'iii': [3, 0, 5, 7], 'IV': [4, 1, 6, 8], 'iv': [4, 1, 8], 'V': [5, 0, 2, 7], 'V7': [5, 0, 2, 7], 'vi': [6, 1, 3, 8], 'viio': [7, 0, 2, 4]},
+    'D' : {'I': [1, 3, 5, 8], 'I7': [1, 3, 5, 8], 'ii': [2, 4, 6], 'ii7': [2, 4, 6], 'iii': [3, 0, 5, 7], 'IV': [4, 1, 6, 8], 'iv': [4, 1, 8], 'V': [5, 0, 2, 7], 'V7': [5, 0, 2, 7], 'vi': [6, 1, 3, 8], 'viio': [7, 0, 2, 4]},
+    'A' : {'I': [1, 3, 5, 8], 'I7': [1, 3, 5, 8], 'ii': [2, 4, 6], 'ii7': [2, 4, 6], 'iii': [3, 0, 5, 7], 'IV': [4, 1, 6, 8], 'iv': [4, 1, 8], 'V': [5, 0, 2, 7], 'V7': [5, 0, 2, 7], 'vi': [6, 1, 3, 8], 'viio': [7, 0, 2, 4]},
+    'E' : {'I': [1, 3, 5, 8], 'I7': [1, 3, 5, 8], 'ii': [2, 4, 6], 'ii7': [2, 4, 6], 'iii': [3, 0, 5, 7], 'IV': [4, 1, 6, 8], 'iv': [4, 1, 8], 'V': [5, 0, 2, 7], 'V7': [5, 0, 2, 7], 'vi': [6, 1, 3, 8], 'viio': [7, 0, 2, 4]},
+    'B' : {'I': [1, 3, 5], 'I7': [1, 3, 5], 'ii': [2, 4, 6], 'ii7': [2, 4, 6], 'iii': [3, 0, 5, 7], 'IV': [4, 1, 6], 'iv': [4, 1], 'V': [5, 0, 2, 7], 'V7': [5, 0, 2, 7], 'vi': [6, 1, 3], 'viio': [7, 0, 2, 4]},
+    'F#' : {'I': [1, 3, 5, 8], 'I7': [1, 3, 5, 8], 'ii': [2, 4, 6], 'ii7': [2, 4, 6], 'iii': [3, 0, 5, 7], 'IV': [4, 1, 6, 8], 'iv': [4, 1, 8], 'V': [5, 0, 2, 7], 'V7': [5, 0, 2, 7], 'vi': [6, 1, 3, 8], 'viio': [7, 0, 2, 4]},
+    'Db' : {'I': [1, 3, 5, 8], 'I7': [1, 3, 5, 8], 'ii': [2, 4, 6], 'ii7': [2, 4, 6], 'iii': [3, 0, 5, 7], 'IV': [4, 1, 6, 8], 'iv': [4, 1, 8], 'V': [5, 0, 2, 7], 'V7': [5, 0, 2, 7], 'vi': [6, 1, 3, 8], 'viio': [7, 0, 2, 4]},
+    'Ab' : {'I': [1, 3, 5, 8], 'I7': [1, 3, 5, 8], 'ii': [2, 4, 6], 'ii7': [2, 4, 6], 'iii': [3, 0, 5, 7], 'IV': [4, 1, 6, 8], 'iv': [4, 1, 8], 'V': [5, 0, 2, 7], 'V7': [5, 0, 2, 7], 'vi': [6, 1, 3, 8], 'viio': [7, 0, 2, 4]},
+    'Eb' : {'I': [1, 3, 5, 8], 'I7': [1, 3, 5, 8], 'ii': [2, 4, 6], 'ii7': [2, 4, 6], 'iii': [3, 0, 5, 7], 'IV': [4, 1, 6, 8], 'iv': [4, 1, 8], 'V': [5, 0, 2, 7], 'V7': [5, 0, 2, 7], 'vi': [6, 1, 3, 8], 'viio': [7, 0, 2, 4]},
+    'Bb' : {'I': [1, 3, 5, 8], 'I7': [1, 3, 5, 8], 'ii': [2, 4, 6], 'ii7': [2, 4, 6], 'iii': [3, 0, 5, 7], 'IV': [4, 1, 6, 8], 'iv': [4, 1, 8], 'V': [5, 0, 2, 7], 'V7': [5, 0, 2, 7], 'vi': [6, 1, 3, 8], 'viio': [7, 0, 2, 4]},
+    'F' : {'I': [1, 3, 5, 8], 'I7': [1, 3, 5, 8], 'ii': [2, 4, 6], 'ii7': [2, 4, 6], 'iii': [3, 0, 5, 7], 'IV': [4, 1, 6, 8], 'iv': [4, 1, 8], 'V': [5, 0, 2, 7], 'V7': [5, 0, 2, 7], 'vi': [6, 1, 3, 8], 'viio': [7, 0, 2, 4]},
+    'Am' : {'i': [1, 3, 5, 8], 'iio': [2, 4, 6], 'III': [3, 0, 5, 7], 'iv': [4, 1, 6, 8], 'IV': [4, 1, 8], 'v': [5, 0, 2, 7], 'V': [5, 2], 'V7': [5, 2], 'VI': [6, 1, 3, 8], 'VII': [7, 0, 2, 4]},
+    'Em' : {'i': [1, 3, 5, 8], 'iio': [2, 4, 6], 'III': [3, 0, 5, 7], 'iv': [4, 1, 6, 8], 'IV': [4, 1, 8], 'v': [5, 0, 2, 7], 'V': [5, 2], 'V7': [5, 2], 'VI': [6, 1, 3, 8], 'VII': [7, 0, 2, 4]},
+    'Bm' : {'i': [1, 3, 5], 'iio': [2, 4, 6], 'III': [3, 0, 5, 7], 'iv': [4, 1, 6], 'IV': [4, 1], 'v': [5, 0, 2, 7], 'V': [5, 2], 'V7': [5, 2], 'VI': [6, 1, 3], 'VII': [7, 0, 2, 4]},
+    'F#m' : {'i': [1, 3, 5, 8], 'iio': [2, 4, 6], 'III': [3, 0, 5, 7], 'iv': [4, 1, 6, 8], 'IV': [4, 1, 8], 'v': [5, 0, 2, 7], 'V': [5, 2], 'V7': [5, 2], 'VI': [6, 1, 3, 8], 'VII': [7, 0, 2, 4]},
+    'C#m' : {'i': [1, 3, 5, 8], 'iio': [2, 4, 6], 'III': [3, 0, 5, 7], 'iv': [4, 1, 6, 8], 'IV': [4, 1, 8], 'v': [5, 0, 2, 7], 'V': [5, 2], 'V7': [5, 2], 'VI': [6, 1, 3, 8], 'VII': [7, 0, 2, 4]},
+    'G#m' : {'i': [1, 3, 5, 8], 'iio': [2, 4, 6], 'III': [3, 0, 5, 7], 'iv': [4, 1, 6, 8], 'IV': [4, 1, 8], 'v': [5, 0, 2, 7], 'V': [5, 2], 'V7': [5, 2], 'VI': [6, 1, 3, 8], 'VII': [7, 0, 2, 4]},
+    'D#m' : {'i': [1, 3, 5, 8], 'iio': [2, 4, 6], 'III': [3, 0, 5, 7], 'iv': [4, 1, 6, 8], 'IV': [4, 1, 8], 'v': [5, 0, 2, 7], 'V': [5, 2], 'V7': [5, 2], 'VI': [6, 1, 3, 8], 'VII': [7, 0, 2, 4]},
+    'Bbm' : {'i': [1, 3, 5, 8], 'iio': [2, 4, 6], 'III': [3, 0, 5, 7], 'iv': [4, 1, 6, 8], 'IV': [4, 1, 8], 'v': [5, 0, 2, 7], 'V': [5, 2], 'V7': [5, 2], 'VI': [6, 1, 3, 8], 'VII': [7, 0, 2, 4]},
+    'Fm' : {'i': [1, 3, 5, 8], 'iio': [2, 4, 6], 'III': [3, 0, 5, 7], 'iv': [4, 1, 6, 8], 'IV': [4, 1, 8], 'v': [5, 0, 2, 7], 'V': [5, 2], 'V7': [5, 2], 'VI': [6, 1, 3, 8], 'VII': [7, 0, 2, 4]},
+    'Cm' : {'i': [1, 3, 5, 8], 'iio': [2, 4, 6], 'III': [3, 5, 7], 'iv': [4, 1, 6, 8], 'IV': [4, 1, 8], 'v': [5, 2, 7], 'V': [5, 2], 'V7': [5, 2], 'VI': [6, 1, 3, 8], 'VII': [7, 2, 4]},
+    'Gm' : {'i': [1, 3, 5, 8], 'iio': [2, 4, 6], 'III': [3, 0, 5, 7], 'iv': [4, 1, 6, 8], 'IV': [4, 1, 8], 'v': [5, 0, 2, 7], 'V': [5, 2], 'V7': [5, 2], 'VI': [6, 1, 3, 8], 'VII': [7, 0, 2, 4]},
+    'Dm' : {'i': [1, 3, 5, 8], 'iio': [2, 4, 6], 'III': [3, 0, 5, 7], 'iv': [4, 1, 6, 8], 'IV': [4, 1, 8], 'v': [5, 0, 2, 7], 'V': [5, 2], 'V7': [5, 2], 'VI': [6, 1, 3, 8], 'VII': [7, 0, 2, 4]},
+}
+
+KEY_SIGNATURES = {'C': 0, 'G': 1, 'D': 2, 'A': 3, 'E': 4, 'B': 5, 'F#': 6, 'Db': -5, 'Ab': -4, 'Eb': -3, 'Bb': -2, 'F': -1, 'Am': 0, 'Em': 1, 'Bm': 2, 'F#m': 3, 'C#m': 4, 'G#m': 5, 'D#m': 6, 'Bbm': -5, 'Fm': -4, 'Cm': -3, 'Gm': -2, 'Dm': -1}
+
+STAFF_POSITIONS = {'B3': 55, 'C4': 50, 'D4': 45, 'E4': 40, 'F4': 35, 'G4': 30, 'A4': 25, 'B4': 20, 'C5': 15, 'D5': 10, 'E5': 5, 'F5': 0, 'G5': -5, 'F#4': 35, 'F#5': 0, 'C#4': 50, 'C#5': 15, 'G#4': 30, 'G#5': -5, 'A5': -10, 'D#4': 45, 'D#5': 10, 'A#4': 25, 'A#5': -10, 'E#4': 40, 'E#5': 5, 'Db4': 45, 'Eb4': 40, 'Gb4': 30, 'Ab4': 25, 'Bb4': 20, 'Db5': 10, 'Eb5': 5, 'Gb5': -5, 'Ab5': -10, 'Bb5': -15}